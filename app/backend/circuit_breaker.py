@@ -0,0 +1,77 @@
+import time
+
+from loguru import logger
+
+from app.backend.metrics import metrics
+
+
+class CircuitBreaker:
+    """Размыкатель для зависимости, которая может надолго отказать (БД, брокер).
+
+    closed — запросы идут как обычно. После failure_threshold отказов подряд — open:
+    запросы отклоняются сразу, не дожидаясь таймаутов. Через reset_seconds — half-open:
+    пропускается один пробный запрос; успех замыкает цепь, отказ снова размыкает.
+    Проба, которая не ответила за probe_seconds, считается отказом: зависший запрос
+    не должен блокировать следующие пробы.
+    """
+    CLOSED, HALF_OPEN, OPEN = 'closed', 'half-open', 'open'
+    # Значение метрики circuit_breaker_state
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float, probe_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.probe_seconds = probe_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.probe_started_at = 0.0
+        metrics.set('circuit_breaker_state', self.STATE_VALUES[self.state], breaker=name)
+
+    def transition(self, state: str) -> None:
+        if state == self.OPEN:
+            self.opened_at = time.monotonic()
+        self.state = state
+        metrics.set('circuit_breaker_state', self.STATE_VALUES[state], breaker=self.name)
+        metrics.inc('circuit_breaker_transitions_total', breaker=self.name, state=state)
+        logger.warning(f'Circuit breaker {self.name} is {state}')
+
+    def retry_after(self) -> int:
+        return max(1, round(self.reset_seconds - (time.monotonic() - self.opened_at)))
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == self.HALF_OPEN and self.probing and now - self.probe_started_at >= self.probe_seconds:
+            # Проба зависла: снова размыкаем, следующая будет через reset_seconds
+            self.probing = False
+            metrics.inc('circuit_breaker_failures_total', breaker=self.name)
+            self.transition(self.OPEN)
+        if self.state == self.OPEN and now - self.opened_at >= self.reset_seconds:
+            self.transition(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN and not self.probing:
+            self.probing = True
+            self.probe_started_at = now
+            return True
+        metrics.inc('circuit_breaker_rejected_total', breaker=self.name)
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.probing = False
+        if self.state != self.CLOSED:
+            self.transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.probing = False
+        metrics.inc('circuit_breaker_failures_total', breaker=self.name)
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+            self.transition(self.OPEN)
+
+    def release(self) -> None:
+        # Проба до зависимости не дошла или была отменена: результата нет, ждем следующую
+        self.probing = False
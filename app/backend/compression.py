@@ -0,0 +1,205 @@
+import gzip
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable
+
+from anyio import to_thread
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него отдаем только gzip
+    brotli = None
+
+
+# Ключ в scope, через который ответ из кэша приложения передает свой CachedBody
+CACHED_BODY_SCOPE_KEY = 'app.cached_body'
+# Тела больше этого размера сжимаются в пуле потоков, чтобы не блокировать event loop
+THREAD_COMPRESS_SIZE = 256 * 1024
+
+
+@dataclass(frozen=True)
+class CompressionRule:
+    minimum_size: int = 1024
+    gzip_level: int = 6
+    brotli_quality: int = 4
+    enabled: bool = True
+
+
+class CachedBody:
+    """Тело ответа вместе с уже сжатыми вариантами.
+
+    Кэши приложения хранят CachedBody вместо голых байтов, поэтому горячий ответ
+    сжимается один раз, а не на каждый запрос. Кэши с лимитом по байтам подписываются
+    в listeners и получают прирост размера, когда добавляется сжатый вариант.
+    """
+    __slots__ = ('body', 'variants', 'listeners')
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.variants: dict[tuple[str, int], bytes] = {}
+        self.listeners: list[Callable[[int], None]] = []
+
+    async def encode(self, encoding: str, rule: CompressionRule) -> bytes:
+        level = rule.brotli_quality if encoding == 'br' else rule.gzip_level
+        key = (encoding, level)
+        compressed = self.variants.get(key)
+        if compressed is None:
+            if len(self.body) >= THREAD_COMPRESS_SIZE:
+                compressed = await to_thread.run_sync(compress, self.body, encoding, level)
+            else:
+                compressed = compress(self.body, encoding, level)
+            # Пока сжатие шло в потоке, тот же вариант мог добавить параллельный запрос
+            if key in self.variants:
+                return self.variants[key]
+            self.variants[key] = compressed
+            for listener in self.listeners:
+                listener(len(compressed))
+        return compressed
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(variant) for variant in self.variants.values())
+
+
+class CachedBodyResponse(Response):
+    """Ответ из кэша приложения: передает CachedBody в CompressionMiddleware через scope."""
+    media_type = 'application/json'
+
+    def __init__(self, entry: CachedBody, status_code: int = 200, headers: dict | None = None):
+        self.entry = entry
+        super().__init__(content=entry.body, status_code=status_code, headers=headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        scope[CACHED_BODY_SCOPE_KEY] = self.entry
+        await super().__call__(scope, receive, send)
+
+
+def compress(body: bytes, encoding: str, level: int) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=level)
+    # mtime=0 делает результат детерминированным для одинаковых тел
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    accepted = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+
+class CompressionMiddleware:
+    """gzip/brotli-сжатие ответов с порогом размера и настройками по префиксу пути.
+
+    Сжатые варианты хранятся в LRU по хэшу тела, так что одинаковые ответы
+    (каталог, категории) сжимаются один раз. Потоковые ответы (SSE и т.п.)
+    пропускаются без изменений.
+    """
+
+    def __init__(self, app: ASGIApp,
+                 default_rule: CompressionRule = CompressionRule(),
+                 rules: dict[str, CompressionRule] | None = None,
+                 cache_entries: int = 256,
+                 cache_bytes: int = 64 * 1024 * 1024):
+        self.app = app
+        self.default_rule = default_rule
+        # Самый длинный префикс проверяется первым
+        self.rules = sorted((rules or {}).items(), key=lambda item: len(item[0]), reverse=True)
+        self.cache_entries = cache_entries
+        self.cache_bytes = cache_bytes
+        self.cache: OrderedDict[bytes, CachedBody] = OrderedDict()
+        self.cached_size = 0
+
+    def rule_for(self, path: str) -> CompressionRule:
+        for prefix, rule in self.rules:
+            if path.startswith(prefix):
+                return rule
+        return self.default_rule
+
+    def cached_body(self, body: bytes) -> CachedBody:
+        digest = hashlib.blake2b(body, digest_size=16).digest()
+        entry = self.cache.get(digest)
+        if entry is not None:
+            self.cache.move_to_end(digest)
+            return entry
+        entry = CachedBody(body)
+        entry.listeners.append(self.grow)
+        self.cache[digest] = entry
+        self.cached_size += entry.size
+        return entry
+
+    def grow(self, delta: int) -> None:
+        self.cached_size += delta
+
+    def evict(self) -> None:
+        # Размер ведется нарастающим итогом: вставка, вытеснение и новые варианты через grow
+        while self.cache and (len(self.cache) > self.cache_entries or self.cached_size > self.cache_bytes):
+            _, entry = self.cache.popitem(last=False)
+            entry.listeners.remove(self.grow)
+            self.cached_size -= entry.size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get('accept-encoding', ''))
+        rule = self.rule_for(scope['path'])
+        if encoding is None or not rule.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Message | None = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message, passthrough
+            if message['type'] == 'http.response.start':
+                start_message = message
+                headers = Headers(raw=message['headers'])
+                passthrough = ('content-encoding' in headers
+                               or headers.get('content-type', '').startswith('text/event-stream'))
+                if passthrough:
+                    await send(message)
+                return
+            if passthrough or message['type'] != 'http.response.body':
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            if message.get('more_body', False) or len(body) < rule.minimum_size:
+                # Потоковый или маленький ответ отдаем как есть
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            entry = scope.get(CACHED_BODY_SCOPE_KEY)
+            if entry is None or entry.body != body:
+                entry = self.cached_body(body)
+            compressed = await entry.encode(encoding, rule)
+            self.evict()
+
+            headers = MutableHeaders(raw=start_message['headers'])
+            headers['Content-Encoding'] = encoding
+            headers['Content-Length'] = str(len(compressed))
+            headers.add_vary_header('Accept-Encoding')
+            await send(start_message)
+            await send({'type': 'http.response.body', 'body': compressed})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,13 +1,74 @@
 from typing import AsyncGenerator, Annotated
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import Depends
+from sqlalchemy.orm import Session
+from fastapi import Depends, HTTPException, Request, status
 
+from app.backend.circuit_breaker import CircuitBreaker
 from app.backend.db import async_session_maker
+from settings import DB_BREAKER_FAILURES, DB_BREAKER_PROBE_SECONDS, DB_BREAKER_RESET_SECONDS
 
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
-    async with async_session_maker() as session:
-        yield session
+# Ключ в scope: ответ 503 из-за недоступной БД, его можно заменить устаревшим из кэша
+DB_UNAVAILABLE_SCOPE_KEY = 'app.db_unavailable'
+# Класс 08 — ошибки соединения; 57P01-57P03 — сервер останавливается или еще
+# не готов (failover); 53300 — исчерпан лимит соединений
+UNAVAILABLE_SQLSTATES = ('08', '57P01', '57P02', '57P03', '53300')
+
+db_breaker = CircuitBreaker('db', DB_BREAKER_FAILURES, DB_BREAKER_RESET_SECONDS, DB_BREAKER_PROBE_SECONDS)
+
+
+@event.listens_for(Session, 'after_begin')
+def _mark_connected(session, transaction, connection):
+    # Сессия получила соединение — значит, БД ответила
+    session.info['connected'] = True
+
+
+def is_db_unavailable(ex: BaseException) -> bool:
+    # Ошибки самого запроса (IntegrityError и т.п.) — не повод размыкать цепь
+    if isinstance(ex, (OSError, PoolTimeoutError, OperationalError, InterfaceError)):
+        return True
+    if isinstance(ex, DBAPIError):
+        sqlstate = getattr(ex.orig, 'sqlstate', None) or ''
+        return ex.connection_invalidated or sqlstate.startswith(UNAVAILABLE_SQLSTATES)
+    return False
+
+
+def db_unavailable(request: Request) -> HTTPException:
+    request.scope[DB_UNAVAILABLE_SCOPE_KEY] = True
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail='Database is temporarily unavailable',
+        headers={'Retry-After': str(db_breaker.retry_after())}
+    )
+
+
+async def get_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    # Пока цепь разомкнута, запрос не ждет таймаута пула, а сразу получает 503
+    if not db_breaker.allow():
+        raise db_unavailable(request)
+    is_probe = db_breaker.state == db_breaker.HALF_OPEN
+    recorded = False
+    try:
+        async with async_session_maker() as session:
+            try:
+                yield session
+            except Exception as ex:
+                if is_db_unavailable(ex):
+                    db_breaker.record_failure()
+                    recorded = True
+                    raise db_unavailable(request) from ex
+                raise
+            finally:
+                # Сессия получила соединение — значит, БД ответила
+                if not recorded and session.info.get('connected'):
+                    db_breaker.record_success()
+                    recorded = True
+    finally:
+        # Отмена запроса (CancelledError — BaseException) не должна оставить пробу занятой
+        if is_probe and not recorded:
+            db_breaker.release()
 
 
 DBSessionDep = Annotated[AsyncSession, Depends(get_db)]
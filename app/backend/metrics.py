@@ -0,0 +1,54 @@
+from collections import defaultdict
+
+
+def metric_key(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{key}="{value}"' for key, value in sorted(labels.items())) + '}'
+
+
+class Summary:
+    __slots__ = ('count', 'total', 'max', 'last')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.last = value
+
+    def as_dict(self) -> dict:
+        return {'count': self.count, 'sum': round(self.total, 6), 'max': round(self.max, 6),
+                'last': round(self.last, 6), 'avg': round(self.total / self.count, 6) if self.count else 0.0}
+
+
+class Metrics:
+    # Метрики воркера в памяти: счетчики, текущие значения и сводки длительностей
+    def __init__(self):
+        self.counters: dict[str, float] = defaultdict(float)
+        self.gauges: dict[str, float] = {}
+        self.summaries: dict[str, Summary] = defaultdict(Summary)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        self.counters[metric_key(name, labels)] += value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        self.gauges[metric_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        self.summaries[metric_key(name, labels)].observe(value)
+
+    def snapshot(self) -> dict:
+        return {
+            'counters': dict(self.counters),
+            'gauges': dict(self.gauges),
+            'summaries': {key: summary.as_dict() for key, summary in self.summaries.items()},
+        }
+
+
+metrics = Metrics()
@@ -0,0 +1,124 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from starlette.routing import compile_path
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    return f'{os.path.basename(code.co_filename)}:{getattr(code, "co_qualname", code.co_name)}'
+
+
+class SamplingProfiler:
+    # Статистический профайлер: отдельный поток раз в interval снимает стек
+    # потока event loop'а (или всех потоков). Пока профилирование не запущено,
+    # потока нет и накладных расходов нет
+    def __init__(self, interval: float, thread_ids: set[int] | None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        # Для режима по маршруту: стеки пишутся, только пока идет подходящий запрос
+        self.in_flight = 0
+        self.gated = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            if self.gated and not self.in_flight:
+                continue
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_name(frame))
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+    def collapsed(self) -> str:
+        # collapsed-формат для flamegraph.pl / speedscope: "a;b;c <число сэмплов>"
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class RouteCapture:
+    def __init__(self, route: str, requests: int):
+        self.regex, _, _ = compile_path(route)
+        self.remaining = requests
+        self.done = asyncio.Event()
+
+
+class ProfilerState:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.profiler: SamplingProfiler | None = None
+        self.capture: RouteCapture | None = None
+
+    async def profile_for(self, seconds: float, interval: float, all_threads: bool) -> SamplingProfiler:
+        self.profiler = SamplingProfiler(interval, None if all_threads else {threading.get_ident()})
+        self.profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self.profiler.stop()
+        return self.profiler
+
+    async def profile_requests(self, route: str, requests: int, timeout: float,
+                               interval: float, all_threads: bool) -> SamplingProfiler:
+        profiler = SamplingProfiler(interval, None if all_threads else {threading.get_ident()})
+        profiler.gated = True
+        self.profiler = profiler
+        self.capture = RouteCapture(route, requests)
+        profiler.start()
+        try:
+            await asyncio.wait_for(self.capture.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.capture = None
+            profiler.stop()
+        return profiler
+
+
+profiler_state = ProfilerState()
+
+
+class ProfilerMiddleware:
+    # Пока захват по маршруту не включен, стоимость — одна проверка атрибута
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        capture = profiler_state.capture
+        if capture is None or scope['type'] != 'http' or capture.remaining <= 0 \
+                or not capture.regex.match(scope['path']):
+            await self.app(scope, receive, send)
+            return
+        profiler = profiler_state.profiler
+        capture.remaining -= 1
+        profiler.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.in_flight -= 1
+            if capture.remaining <= 0 and not profiler.in_flight:
+                capture.done.set()
+
+
+def profile_filename() -> str:
+    return f'profile-{os.getpid()}-{int(time.time())}.folded'
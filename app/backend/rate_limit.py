@@ -0,0 +1,118 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.backend.db import async_session_maker
+from app.models.rate_limits import RateLimitBucket
+from settings import BCRYPT_MAX_CONCURRENCY, RATE_LIMIT_BACKEND, TRUSTED_PROXY_HOPS
+
+
+# Сколько ключей держит один воркер; самые давно не использованные вытесняются
+MAX_LOCAL_BUCKETS = 100_000
+
+
+class LocalRateLimiter:
+    # Token bucket в памяти воркера: rate токенов в секунду, не больше burst
+    def __init__(self, rate: float, burst: int, max_keys: int = MAX_LOCAL_BUCKETS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def acquire(self, key: str) -> float:
+        # 0 — запрос пропущен, иначе через сколько секунд появится токен
+        now = time.monotonic()
+        tokens, updated = self.buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+        return 0.0 if allowed else (1 - tokens) / self.rate
+
+
+class PostgresRateLimiter:
+    # Общие для всех воркеров корзины: пополнение и списание одним upsert'ом
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+
+    async def acquire(self, key: str) -> float:
+        async with async_session_maker() as session:
+            tokens = await session.scalar(text(
+                'INSERT INTO rate_limit_buckets AS b (key, tokens, updated_at) '
+                'VALUES (:key, :burst - 1, now()) '
+                'ON CONFLICT (key) DO UPDATE SET '
+                '    tokens = least(:burst, b.tokens + extract(epoch FROM now() - b.updated_at) * :rate) - 1, '
+                '    updated_at = now() '
+                'WHERE least(:burst, b.tokens + extract(epoch FROM now() - b.updated_at) * :rate) >= 1 '
+                'RETURNING tokens'), {'key': key, 'burst': self.burst, 'rate': self.rate})
+            await session.commit()
+        return 0.0 if tokens is not None else 1 / self.rate
+
+
+def make_rate_limiter(rate: float, burst: int) -> LocalRateLimiter | PostgresRateLimiter:
+    if RATE_LIMIT_BACKEND == 'postgres':
+        return PostgresRateLimiter(rate, burst)
+    return LocalRateLimiter(rate, burst)
+
+
+async def purge_idle_buckets(session: AsyncSession) -> int:
+    # Корзина, не трогавшаяся час, заведомо полна: строка не нужна
+    deleted = await session.execute(delete(RateLimitBucket)
+                                    .where(RateLimitBucket.updated_at < datetime.now(timezone.utc) - timedelta(hours=1)))
+    await session.commit()
+    return deleted.rowcount
+
+
+def client_ip(request: Request) -> str:
+    # nginx дописывает адрес клиента в конец X-Forwarded-For ($proxy_add_x_forwarded_for),
+    # левые элементы может подделать сам клиент, поэтому берем адрес, добавленный
+    # нашим последним доверенным прокси
+    forwarded_for = request.headers.get('x-forwarded-for')
+    if forwarded_for and TRUSTED_PROXY_HOPS:
+        hops = [hop.strip() for hop in forwarded_for.split(',') if hop.strip()]
+        if hops:
+            return hops[-min(TRUSTED_PROXY_HOPS, len(hops))]
+    return request.client.host if request.client else 'unknown'
+
+
+def too_many_requests(retry_after: float, detail: str = 'Too many login attempts') -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={'Retry-After': str(max(1, math.ceil(retry_after)))}
+    )
+
+
+class AdmissionLimiter:
+    # Глобальный предел одновременных проверок пароля на воркер: лишние
+    # запросы сразу получают 429, а не копятся в очереди к bcrypt
+    def __init__(self, limit: int, retry_after: float = 1.0):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.retry_after = retry_after
+
+    async def run(self, func, *args):
+        if self.semaphore.locked():
+            raise too_many_requests(self.retry_after, 'Server is busy, try again later')
+        async with self.semaphore:
+            return await run_in_threadpool(func, *args)
+
+    async def run_in(self, executor, func, *args):
+        # То же, но в заданном executor'е (например, пуле процессов)
+        if self.semaphore.locked():
+            raise too_many_requests(self.retry_after, 'Server is busy, try again later')
+        async with self.semaphore:
+            return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+password_admission = AdmissionLimiter(BCRYPT_MAX_CONCURRENCY)
@@ -0,0 +1,125 @@
+import logging
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from uuid import uuid4
+
+import orjson
+from loguru import logger
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class BoundedQueueSink:
+    # Sink для loguru: запись в очередь без ожидания, файл пишет отдельный поток.
+    # Если диск не успевает и очередь полна — запись теряется, а не тормозит запрос
+    def __init__(self, path: str, max_bytes: int, backup_count: int, queue_size: int):
+        self.queue: queue.Queue[bytes] = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self.handler.setFormatter(logging.Formatter('%(message)s'))
+        self.writer = threading.Thread(target=self._write, name='log-writer', daemon=True)
+        self.writer.start()
+
+    def __call__(self, message) -> None:
+        record = message.record
+        entry = {
+            'time': record['time'].isoformat(),
+            'level': record['level'].name,
+            'message': record['message'],
+            **record['extra'],
+        }
+        if record['exception'] is not None:
+            entry['exception'] = repr(record['exception'].value)
+        try:
+            self.queue.put_nowait(orjson.dumps(entry, default=str))
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self) -> None:
+        while True:
+            line = self.queue.get()
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                line = orjson.dumps({'level': 'WARNING', 'message': 'log records dropped', 'dropped': dropped}) \
+                    + b'\n' + line
+            self.handler.emit(logging.makeLogRecord({'msg': line.decode()}))
+
+
+# Заполняется зависимостью get_current_user, чтобы middleware знал пользователя
+_request_user: ContextVar[dict | None] = ContextVar('request_user', default=None)
+
+
+def remember_user(user_id: int) -> None:
+    holder = _request_user.get()
+    if holder is not None:
+        holder['user_id'] = user_id
+
+
+class RequestLogMiddleware:
+    # Одна JSON-запись на запрос: шаблон маршрута, статус, длительность, пользователь.
+    # Успешные быстрые запросы сэмплируются, ошибки и медленные пишутся всегда
+    def __init__(self, app: ASGIApp, sample_rate: float = 1.0, slow_ms: float = 500):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.templates: dict = {}
+
+    def route_template(self, scope: Scope) -> str:
+        endpoint = scope.get('endpoint')
+        if endpoint is None:
+            return '<unmatched>'
+        if not self.templates and scope.get('router') is not None:
+            self.templates = {route.endpoint: route.path for route in scope['router'].routes
+                              if hasattr(route, 'endpoint')}
+        return self.templates.get(endpoint, scope['path'])
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+        response_started = False
+        holder = {}
+        token = _request_user.set(holder)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, response_started
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                response_started = True
+            await send(message)
+
+        error = None
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as ex:
+            error = ex
+            if not response_started:
+                await JSONResponse(content={'success': False}, status_code=500)(scope, receive, send)
+        finally:
+            _request_user.reset(token)
+
+        duration_ms = (time.perf_counter() - started) * 1000
+        if status_code < 400 and error is None and duration_ms < self.slow_ms \
+                and random.random() >= self.sample_rate:
+            return
+        record = logger.bind(request_id=uuid4().hex,
+                             method=scope['method'],
+                             route=self.route_template(scope),
+                             status=status_code,
+                             duration_ms=round(duration_ms, 2),
+                             user_id=holder.get('user_id'))
+        if error is not None:
+            record.error(f'Request failed: {error!r}')
+        elif status_code >= 500:
+            record.error('Request failed')
+        elif status_code >= 400:
+            record.warning('Request rejected')
+        else:
+            record.info('Request served')
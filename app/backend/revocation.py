@@ -0,0 +1,119 @@
+import hashlib
+import math
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.tokens import RevokedToken
+from app.models.user import User
+from settings import ACCESS_TOKEN_MINUTES, REVOCATION_BLOOM_CAPACITY
+
+
+# Запас на транзакции, закоммиченные позже, чем проставлен их now():
+# повторно перечитываем последние секунды при каждой синхронизации
+SYNC_OVERLAP = timedelta(seconds=10)
+
+
+class BloomFilter:
+    # Быстрый отрицательный ответ для denylist'а jti: подавляющее большинство
+    # токенов не отозвано, и проверка не трогает ни хэш-таблицу, ни БД
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class TokenRevocations:
+    # Локальная копия отзывов на каждом воркере: user_id -> tokens_valid_after
+    # и отозванные jti (bloom + точное множество). Синхронизируется из Postgres
+    # инкрементально, проверка токена обходится без запроса к БД
+    def __init__(self, capacity: int = REVOCATION_BLOOM_CAPACITY,
+                 token_lifetime: timedelta = timedelta(minutes=ACCESS_TOKEN_MINUTES)):
+        self.capacity = capacity
+        self.token_lifetime = token_lifetime
+        self.valid_after: dict[int, float] = {}
+        self.denied: dict[str, float] = {}
+        self.bloom = BloomFilter(capacity)
+        self.users_cursor: datetime | None = None
+        self.tokens_cursor: datetime | None = None
+
+    def is_revoked(self, user_id: int, issued_at: float | None, jti: str | None) -> bool:
+        # issued_at — время выпуска с миллисекундами: токен, выпущенный в ту же секунду,
+        # но до отзыва, должен отсекаться
+        valid_after = self.valid_after.get(user_id)
+        if valid_after is not None and (issued_at is None or issued_at < valid_after):
+            return True
+        return jti is not None and jti in self.bloom and jti in self.denied
+
+    def revoke_user(self, user_id: int, valid_after: datetime) -> None:
+        self.valid_after[user_id] = max(self.valid_after.get(user_id, 0.0), valid_after.timestamp())
+
+    def deny(self, jti: str, expires_at: datetime) -> None:
+        if jti not in self.denied:
+            self.bloom.add(jti)
+        self.denied[jti] = expires_at.timestamp()
+
+    def prune(self) -> None:
+        # Отзывы старше срока жизни токена больше ничего не отсекают
+        now = time.time()
+        horizon = now - self.token_lifetime.total_seconds()
+        self.valid_after = {user_id: ts for user_id, ts in self.valid_after.items() if ts > horizon}
+        expired = [jti for jti, expires_at in self.denied.items() if expires_at < now]
+        if not expired:
+            return
+        for jti in expired:
+            del self.denied[jti]
+        # Из bloom-фильтра удалять нельзя: пересобираем по точному множеству
+        self.bloom = BloomFilter(max(self.capacity, len(self.denied) * 2))
+        for jti in self.denied:
+            self.bloom.add(jti)
+
+    async def sync(self, session: AsyncSession) -> None:
+        # Первый проход забирает только еще действующие отзывы, дальше — изменения с прошлого курсора
+        now = datetime.now(timezone.utc)
+        users_since = self.users_cursor - SYNC_OVERLAP if self.users_cursor else now - self.token_lifetime
+        users = await session.execute(select(User.id, User.tokens_valid_after)
+                                      .where(User.tokens_valid_after > users_since))
+        users_cursor = now
+        for user_id, valid_after in users:
+            self.revoke_user(user_id, valid_after)
+            users_cursor = max(users_cursor, valid_after)
+
+        tokens_query = select(RevokedToken.jti, RevokedToken.expires_at, RevokedToken.revoked_at)
+        if self.tokens_cursor:
+            tokens_query = tokens_query.where(RevokedToken.revoked_at > self.tokens_cursor - SYNC_OVERLAP)
+        else:
+            tokens_query = tokens_query.where(RevokedToken.expires_at > now)
+        tokens = await session.execute(tokens_query)
+        tokens_cursor = now
+        for jti, expires_at, revoked_at in tokens:
+            self.deny(jti, expires_at)
+            tokens_cursor = max(tokens_cursor, revoked_at)
+
+        self.users_cursor = users_cursor
+        self.tokens_cursor = tokens_cursor
+        self.prune()
+
+
+async def purge_expired_tokens(session: AsyncSession) -> int:
+    deleted = await session.execute(delete(RevokedToken).where(RevokedToken.expires_at < datetime.now(timezone.utc)))
+    await session.commit()
+    return deleted.rowcount
+
+
+token_revocations = TokenRevocations()
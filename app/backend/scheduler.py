@@ -0,0 +1,237 @@
+import asyncio
+import hashlib
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.backend.db import dedicated_engine
+from app.backend.metrics import metrics
+from settings import SCHEDULER_ELECTION_SECONDS
+
+
+def parse_cron_field(expression: str, low: int, high: int) -> set[int]:
+    values = set()
+    for part in expression.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/')
+            step = int(step)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = map(int, part.split('-'))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f'Invalid cron field: {expression}')
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class Cron:
+    """Cron-выражение из пяти полей: минута, час, день месяца, месяц, день недели (0 или 7 — воскресенье).
+
+    Время — UTC. Как и в обычном cron, если заданы и день месяца, и день недели,
+    достаточно совпадения любого из них.
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f'Cron expression must have 5 fields: {expression}')
+        self.expression = expression
+        self.minutes = parse_cron_field(fields[0], 0, 59)
+        self.hours = parse_cron_field(fields[1], 0, 23)
+        self.days = parse_cron_field(fields[2], 1, 31)
+        self.months = parse_cron_field(fields[3], 1, 12)
+        self.weekdays = {day % 7 for day in parse_cron_field(fields[4], 0, 7)}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def day_matches(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        # isoweekday: понедельник = 1 ... воскресенье = 7
+        weekday = moment.isoweekday() % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment: datetime) -> datetime:
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 4)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self.day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f'Cron expression never fires: {self.expression}')
+
+
+class Job:
+    def __init__(self, name: str, func: Callable[[], Awaitable], seconds: float | None,
+                 cron: str | None, jitter: float, leader: bool):
+        if (seconds is None) == (cron is None):
+            raise ValueError(f'Job {name} needs exactly one of seconds or cron')
+        self.name = name
+        self.func = func
+        self.seconds = seconds
+        self.cron = Cron(cron) if cron else None
+        self.jitter = jitter
+        # leader=True — один воркер на весь кластер; False — на каждом воркере (локальные кэши)
+        self.leader = leader
+        self.lock_key = int.from_bytes(hashlib.blake2b(f'scheduler:{name}'.encode(), digest_size=8).digest(),
+                                       'big', signed=True)
+        self.is_leader = not leader
+        self.running = False
+        self.last_started_at: datetime | None = None
+        self.last_duration: float | None = None
+        self.last_error: str | None = None
+
+    def next_delay(self) -> float:
+        if self.cron is not None:
+            now = datetime.now(timezone.utc)
+            delay = (self.cron.next_after(now) - now).total_seconds()
+        else:
+            delay = self.seconds
+        # Разброс, чтобы воркеры и задачи не стартовали одновременно
+        return delay + random.uniform(0, self.jitter)
+
+    def status(self) -> dict:
+        return {
+            'name': self.name,
+            'schedule': self.cron.expression if self.cron else f'every {self.seconds}s',
+            'leader_only': self.leader,
+            'is_leader': self.is_leader,
+            'running': self.running,
+            'last_started_at': self.last_started_at,
+            'last_duration': self.last_duration,
+            'last_error': self.last_error,
+        }
+
+
+class Scheduler:
+    """Периодические задачи приложения.
+
+    Задачи с leader=True выполняет ровно один воркер в кластере: тот, кто держит
+    сессионный pg_try_advisory_lock на выделенном соединении. Если воркер
+    умирает, соединение закрывается, блокировка освобождается и задачу
+    подхватывает другой воркер на следующем раунде выборов.
+    """
+
+    def __init__(self, election_seconds: float = 10):
+        self.election_seconds = election_seconds
+        self.jobs: dict[str, Job] = {}
+        self.tasks: list[asyncio.Task] = []
+        self.running_tasks: set[asyncio.Task] = set()
+        self.connection: AsyncConnection | None = None
+        # Первый раунд выборов прошел: лидерские задачи могут стартовать сразу
+        self.elected = asyncio.Event()
+
+    def job(self, name: str, *, seconds: float | None = None, cron: str | None = None,
+            jitter: float = 0, leader: bool = True):
+        def register(func: Callable[[], Awaitable]):
+            self.jobs[name] = Job(name, func, seconds, cron, jitter, leader)
+            return func
+        return register
+
+    async def start(self) -> None:
+        if any(job.leader for job in self.jobs.values()):
+            self.tasks.append(asyncio.create_task(self.elect()))
+        for job in self.jobs.values():
+            self.tasks.append(asyncio.create_task(self.tick(job)))
+
+    async def stop(self) -> None:
+        for task in [*self.tasks, *self.running_tasks]:
+            task.cancel()
+        await asyncio.gather(*self.tasks, *self.running_tasks, return_exceptions=True)
+        self.tasks.clear()
+        await self.drop_connection()
+
+    async def drop_connection(self) -> None:
+        for job in self.jobs.values():
+            if job.leader:
+                job.is_leader = False
+                metrics.set('scheduler_leader', 0, job=job.name)
+        if self.connection is not None:
+            try:
+                # Сессионные advisory-блокировки переживают ROLLBACK: соединение нужно
+                # именно разорвать, иначе блокировки останутся за ним и лидера не будет
+                await self.connection.invalidate()
+                await self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+    async def elect(self) -> None:
+        while True:
+            try:
+                if self.connection is None:
+                    self.connection = await dedicated_engine.connect()
+                    await self.connection.execution_options(isolation_level='AUTOCOMMIT')
+                # Заодно проверка, что соединение (а с ним и блокировки) живо
+                await self.connection.execute(text('SELECT 1'))
+                for job in self.jobs.values():
+                    if job.leader and not job.is_leader:
+                        job.is_leader = await self.connection.scalar(text('SELECT pg_try_advisory_lock(:key)'),
+                                                                     {'key': job.lock_key})
+                        metrics.set('scheduler_leader', int(job.is_leader), job=job.name)
+                        if job.is_leader:
+                            logger.info(f'Scheduler: this worker now runs {job.name}')
+            except Exception as ex:
+                logger.error(f'Scheduler leader election failed: {ex}')
+                await self.drop_connection()
+            self.elected.set()
+            await asyncio.sleep(self.election_seconds)
+
+    async def tick(self, job: Job) -> None:
+        # Интервальные задачи первый раз запускаются сразу после старта, cron — по расписанию
+        delay = random.uniform(0, job.jitter) if job.cron is None else job.next_delay()
+        while True:
+            await asyncio.sleep(delay)
+            delay = job.next_delay()
+            if job.leader:
+                await self.elected.wait()
+            if not job.is_leader:
+                continue
+            if job.running:
+                # Предыдущий запуск еще идет: пропускаем, а не запускаем второй параллельно
+                metrics.inc('scheduler_skipped_total', job=job.name)
+                continue
+            task = asyncio.create_task(self.execute(job))
+            self.running_tasks.add(task)
+            task.add_done_callback(self.running_tasks.discard)
+
+    async def execute(self, job: Job) -> None:
+        job.running = True
+        job.last_started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        try:
+            await job.func()
+            job.last_error = None
+            metrics.inc('scheduler_runs_total', job=job.name)
+        except Exception as ex:
+            job.last_error = repr(ex)
+            metrics.inc('scheduler_failures_total', job=job.name)
+            logger.error(f'Scheduled job {job.name} failed: {ex}')
+        finally:
+            job.running = False
+            job.last_duration = time.perf_counter() - started
+            metrics.observe('scheduler_run_seconds', job.last_duration, job=job.name)
+
+    def status(self) -> list[dict]:
+        return [job.status() for job in self.jobs.values()]
+
+
+scheduler = Scheduler(SCHEDULER_ELECTION_SECONDS)
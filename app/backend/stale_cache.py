@@ -0,0 +1,101 @@
+import time
+from collections import OrderedDict
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.backend.compression import CACHED_BODY_SCOPE_KEY, CachedBody, CachedBodyResponse
+from app.backend.db_depends import DB_UNAVAILABLE_SCOPE_KEY
+from app.backend.metrics import metrics
+
+
+# RFC 7234: ответ устарел и отдан, потому что свежий получить не удалось
+STALE_WARNING = '110 - "Response is Stale"'
+
+
+class StaleCacheMiddleware:
+    """Последний удачный ответ на каждый GET по заданным префиксам пути.
+
+    Если запрос завершился 503 из-за недоступной БД (разомкнутый размыкатель в
+    db_depends), вместо ошибки отдается сохраненный ответ с заголовками Warning и
+    Age. Запоминаются только JSON-ответы 200 без потоковой передачи и без
+    Authorization, то есть общие для всех клиентов. Ставится внутрь
+    CompressionMiddleware: сжатые варианты CachedBody переиспользуются.
+    """
+
+    def __init__(self, app: ASGIApp, prefixes: tuple[str, ...],
+                 max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.app = app
+        self.prefixes = prefixes
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache: OrderedDict[str, tuple[CachedBody, float]] = OrderedDict()
+        self.cached_size = 0
+
+    def grow(self, delta: int) -> None:
+        # Сжатые варианты добавляются в CachedBody позже, уже после store
+        self.cached_size += delta
+
+    def forget(self, entry: CachedBody) -> None:
+        entry.listeners.remove(self.grow)
+        self.cached_size -= entry.size
+
+    def store(self, key: str, entry: CachedBody) -> None:
+        previous = self.cache.pop(key, None)
+        if previous is not None:
+            self.forget(previous[0])
+        entry.listeners.append(self.grow)
+        self.cached_size += entry.size
+        self.cache[key] = (entry, time.time())
+        while self.cache and (len(self.cache) > self.max_entries or self.cached_size > self.max_bytes):
+            _, (evicted, _) = self.cache.popitem(last=False)
+            self.forget(evicted)
+        metrics.set('stale_cache_entries', len(self.cache))
+        metrics.set('stale_cache_bytes', self.cached_size)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or scope['method'] != 'GET' or not scope['path'].startswith(self.prefixes) \
+                or 'authorization' in Headers(scope=scope):
+            await self.app(scope, receive, send)
+            return
+
+        key = scope['path'] + '?' + scope['query_string'].decode('latin-1')
+        start_message: Message | None = None
+        passthrough = False
+        stale: tuple[CachedBody, float] | None = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start_message, passthrough, stale
+            if message['type'] == 'http.response.start':
+                if message['status'] == 503 and scope.get(DB_UNAVAILABLE_SCOPE_KEY):
+                    stale = self.cache.get(key)
+                if stale is not None:
+                    return
+                content_type = Headers(raw=message['headers']).get('content-type', '')
+                if message['status'] != 200 or not content_type.startswith('application/json'):
+                    passthrough = True
+                    await send(message)
+                    return
+                start_message = message
+                return
+            if stale is not None:
+                return
+            if passthrough or message['type'] != 'http.response.body':
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            if not message.get('more_body', False):
+                entry = scope.get(CACHED_BODY_SCOPE_KEY)
+                self.store(key, entry if entry is not None and entry.body == body else CachedBody(body))
+            passthrough = True
+            await send(start_message)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+        if stale is not None:
+            entry, stored_at = stale
+            metrics.inc('stale_responses_total')
+            response = CachedBodyResponse(entry, headers={'Warning': STALE_WARNING,
+                                                          'Age': str(int(time.time() - stored_at))})
+            await response(scope, receive, send)
@@ -0,0 +1,41 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from loguru import logger
+from sqlalchemy import text
+
+from app.backend.db import engine
+from app.backend.metrics import metrics
+
+
+async def preconnect_db(connections: int) -> None:
+    # Соединения открываются одновременно и возвращаются в пул: первые запросы не платят
+    # за TCP, аутентификацию и инициализацию диалекта (первое соединение — самое дорогое)
+    async def ping():
+        async with engine.connect() as connection:
+            await connection.execute(text('SELECT 1'))
+    await asyncio.gather(*(ping() for _ in range(connections)))
+
+
+async def run_step(name: str, step: Callable[[], Awaitable], timeout: float) -> float | None:
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(step(), timeout)
+    except Exception as ex:
+        # Прогрев не обязателен: недоступная БД или брокер не должны мешать воркеру стартовать
+        logger.warning(f'Warm-up step {name} failed: {ex!r}')
+        metrics.inc('startup_warmup_failures_total', step=name)
+        return None
+    duration = time.perf_counter() - started
+    metrics.set('startup_warmup_seconds', duration, step=name)
+    return duration
+
+
+async def warm_up(steps: dict[str, Callable[[], Awaitable]], timeout: float) -> dict[str, float | None]:
+    """Прогрев воркера до приема запросов. Шаги независимы и идут параллельно.
+
+    Возвращает длительность каждого шага в секундах (None — шаг не удался).
+    """
+    durations = await asyncio.gather(*(run_step(name, step, timeout) for name, step in steps.items()))
+    return dict(zip(steps, durations))
@@ -1,32 +1,90 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+import time
+# Отсчет до импорта приложения: время импорта попадает в метрики и лог старта
+IMPORT_STARTED = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
 
 
 from loguru import logger
-from uuid import uuid4
 
-from app.routers import category, products, auth, permission, comments
+from app.backend.compression import CompressionMiddleware, CompressionRule
+from app.backend.metrics import metrics
+from app.backend.profiler import ProfilerMiddleware
+from app.backend.request_log import BoundedQueueSink, RequestLogMiddleware
+from app.backend.scheduler import scheduler
+from app.backend.stale_cache import StaleCacheMiddleware
+from app.backend.warmup import preconnect_db, warm_up
+from app.routers import category, products, auth, permission, comments, orders, admin
+from app.services.rabbitmq.utils import channel_pool
+from settings import (LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_QUEUE_SIZE,
+                      LOG_SAMPLE_RATE, LOG_SLOW_MS, STALE_CACHE_BYTES, STALE_CACHE_ENTRIES,
+                      WARMUP_DB_CONNECTIONS, WARMUP_TIMEOUT_SECONDS)
+
+
+# JSON-записи в info.log с ротацией по размеру; очередь ограничена и при
+# медленном диске записи отбрасываются, а не задерживают ответы
+logger.add(BoundedQueueSink(LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_QUEUE_SIZE), level='INFO')
+
+async def warm_broker() -> None:
+    # Соединение и канал остаются в пуле: первое письмо не ждет подключения к RabbitMQ
+    async with channel_pool.acquire():
+        pass
+
+
+async def warm_passwords() -> None:
+    # passlib выбирает и проверяет backend bcrypt при первом хэше — то есть на первом входе
+    await run_in_threadpool(auth.bcrypt_context.handler().get_backend)
+
+
+async def warm_openapi() -> None:
+    # Схема строится при первом /docs или /openapi.json и дальше кэшируется в app
+    app.openapi()
 
 
-logger.add('info.log', format='Log: [{extra[log_id]}:{time} - {level} - {message}]', level='INFO', enqueue=True)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    import_seconds = time.perf_counter() - IMPORT_STARTED
+    metrics.set('startup_import_seconds', import_seconds)
+    durations = await warm_up({
+        'db': lambda: preconnect_db(WARMUP_DB_CONNECTIONS),
+        'broker': warm_broker,
+        'passwords': warm_passwords,
+        'openapi': warm_openapi,
+    }, WARMUP_TIMEOUT_SECONDS)
+    ready_seconds = time.perf_counter() - IMPORT_STARTED
+    metrics.set('startup_ready_seconds', ready_seconds)
+    steps = ', '.join(f'{name} {"failed" if seconds is None else f"{seconds * 1000:.0f} ms"}'
+                      for name, seconds in durations.items())
+    logger.info(f'Worker ready in {ready_seconds * 1000:.0f} ms: import {import_seconds * 1000:.0f} ms, {steps}')
+    # Задачи регистрируются роутерами при импорте, здесь только запуск
+    await scheduler.start()
+    yield
+    await scheduler.stop()
 
-app = FastAPI()
 
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+# Внутренний слой: при недоступной БД каталог и категории отдаются из последних
+# удачных ответов (Warning/Age), а не ошибкой 503
+app.add_middleware(StaleCacheMiddleware, prefixes=('/products', '/category'),
+                   max_entries=STALE_CACHE_ENTRIES, max_bytes=STALE_CACHE_BYTES)
+app.add_middleware(CompressionMiddleware,
+                   default_rule=CompressionRule(minimum_size=1024),
+                   rules={
+                       # Каталог большой и хорошо сжимается, его варианты кэшируются
+                       '/products': CompressionRule(minimum_size=1024, gzip_level=6, brotli_quality=5),
+                       '/category': CompressionRule(minimum_size=1024, gzip_level=6, brotli_quality=5),
+                       '/comments': CompressionRule(minimum_size=2048, gzip_level=5, brotli_quality=4),
+                       # Ответы auth маленькие и уникальные: сжимать нечего
+                       '/auth': CompressionRule(enabled=False),
+                   })
 
-@app.middleware('http')
-async def log_middleware(request: Request, call_next):
-    log_id = str(uuid4())
-    with logger.contextualize(log_id=log_id):
-        try:
-            response = await call_next(request)
-            if response.status_code in [401, 402, 403, 404]:
-                logger.warning(f'Request to {request.url.path} failed')
-            else:
-                logger.info(f'Successfully accessed to {request.url.path}')
-        except Exception as ex:
-            logger.error(f'Request to {request.url.path} failed: {ex}')
-            response = JSONResponse(content={'success': False}, status_code=500)
-        return response
+# Захват профиля по маршруту (/admin/profile?route=...); в покое — одна проверка
+app.add_middleware(ProfilerMiddleware)
+# Добавлен последним — внешний слой, меряет время вместе со сжатием
+app.add_middleware(RequestLogMiddleware, sample_rate=LOG_SAMPLE_RATE, slow_ms=LOG_SLOW_MS)
 
 
 @app.get("/")
@@ -39,3 +97,5 @@ app.include_router(products.router)
 app.include_router(auth.router)
 app.include_router(permission.router)
 app.include_router(comments.router)
+app.include_router(orders.router)
+app.include_router(admin.router)
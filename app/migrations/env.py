@@ -8,7 +8,7 @@ from sqlalchemy.ext.asyncio import async_engine_from_config
 from alembic import context
 
 from app.backend.db import Base
-from app.models import category, products, user, comments
+from app.models import category, products, user, comments, orders, jobs, tokens, rate_limits, events, rankings, recommendations
 from settings import POSTGRES_DB, POSTGRES_PASSWORD, POSTGRES_USER
 
 # this is the Alembic Config object, which provides
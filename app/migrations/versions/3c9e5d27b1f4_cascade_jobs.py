@@ -0,0 +1,60 @@
+"""Add cascade jobs and materialize product visibility
+
+Revision ID: 3c9e5d27b1f4
+Revises: a47d9e0b2c18
+Create Date: 2026-10-19 12:31:27.503118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9e5d27b1f4'
+down_revision: Union[str, None] = 'a47d9e0b2c18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('cascade_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.Enum('category', 'supplier', name='cascade_kind'), nullable=True),
+    sa.Column('target_id', sa.Integer(), nullable=True),
+    sa.Column('status', sa.Enum('pending', 'running', 'done', 'failed', name='job_status'), nullable=True),
+    sa.Column('processed_products', sa.Integer(), nullable=True),
+    sa.Column('processed_comments', sa.Integer(), nullable=True),
+    sa.Column('error', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_cascade_jobs_id'), 'cascade_jobs', ['id'], unique=False)
+    op.create_index('ix_cascade_jobs_status', 'cascade_jobs', ['status'], unique=False)
+    op.create_index('ix_products_category_active', 'products', ['category_id', 'id'], unique=False,
+                    postgresql_where=sa.text('is_active'))
+    op.create_index('ix_products_supplier_active', 'products', ['supplier_id', 'id'], unique=False,
+                    postgresql_where=sa.text('is_active'))
+    # Видимость теперь хранится в products.is_active: товары уже удаленных
+    # категорий и поставщиков скрываем сразу, каталог больше не джойнит categories
+    op.execute("""
+        UPDATE products SET is_active = false
+        WHERE is_active AND (
+            category_id IN (SELECT id FROM categories WHERE is_active IS NOT TRUE)
+            OR supplier_id IN (SELECT id FROM users WHERE is_active IS NOT TRUE))
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_supplier_active', table_name='products', postgresql_where=sa.text('is_active'))
+    op.drop_index('ix_products_category_active', table_name='products', postgresql_where=sa.text('is_active'))
+    op.drop_index('ix_cascade_jobs_status', table_name='cascade_jobs')
+    op.drop_index(op.f('ix_cascade_jobs_id'), table_name='cascade_jobs')
+    op.drop_table('cascade_jobs')
+    sa.Enum('pending', 'running', 'done', 'failed', name='job_status').drop(op.get_bind())
+    sa.Enum('category', 'supplier', name='cascade_kind').drop(op.get_bind())
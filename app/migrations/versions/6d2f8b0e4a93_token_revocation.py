@@ -0,0 +1,43 @@
+"""Add token revocation: tokens_valid_after and jti denylist
+
+Revision ID: 6d2f8b0e4a93
+Revises: 3c9e5d27b1f4
+Create Date: 2026-10-19 13:05:52.774190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d2f8b0e4a93'
+down_revision: Union[str, None] = '3c9e5d27b1f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('tokens_valid_after', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_users_tokens_valid_after', 'users', ['tokens_valid_after'], unique=False,
+                    postgresql_where=sa.text('tokens_valid_after IS NOT NULL'))
+    op.create_table('revoked_tokens',
+    sa.Column('jti', sa.String(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('revoked_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('jti')
+    )
+    op.create_index('ix_revoked_tokens_revoked_at', 'revoked_tokens', ['revoked_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_revoked_tokens_revoked_at', table_name='revoked_tokens')
+    op.drop_table('revoked_tokens')
+    op.drop_index('ix_users_tokens_valid_after', table_name='users',
+                  postgresql_where=sa.text('tokens_valid_after IS NOT NULL'))
+    op.drop_column('users', 'tokens_valid_after')
@@ -0,0 +1,56 @@
+"""Comment keyset pagination indexes and product grade histogram
+
+Revision ID: 8f3c2a61d4e7
+Revises: 5b1e7f3a9c2d
+Create Date: 2026-10-19 11:02:17.530941
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f3c2a61d4e7'
+down_revision: Union[str, None] = '5b1e7f3a9c2d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_comments_product_active_dt', 'comments',
+                    ['product_id', 'is_active', sa.text('comment_dt DESC'), sa.text('id DESC')], unique=False)
+    op.create_index('ix_comments_active_dt', 'comments',
+                    [sa.text('comment_dt DESC'), sa.text('id DESC')], unique=False,
+                    postgresql_where=sa.text('is_active'))
+    op.create_table('product_grade_histograms',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('grade_0', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('grade_1', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('grade_2', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('grade_3', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('grade_4', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('grade_5', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+    # Начальное заполнение гистограмм по уже существующим активным комментариям
+    op.execute("""
+        INSERT INTO product_grade_histograms (product_id, grade_0, grade_1, grade_2, grade_3, grade_4, grade_5)
+        SELECT product_id,
+               count(*) FILTER (WHERE grade = 0), count(*) FILTER (WHERE grade = 1),
+               count(*) FILTER (WHERE grade = 2), count(*) FILTER (WHERE grade = 3),
+               count(*) FILTER (WHERE grade = 4), count(*) FILTER (WHERE grade = 5)
+        FROM comments
+        WHERE is_active AND product_id IS NOT NULL
+        GROUP BY product_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('product_grade_histograms')
+    op.drop_index('ix_comments_active_dt', table_name='comments', postgresql_where=sa.text('is_active'))
+    op.drop_index('ix_comments_product_active_dt', table_name='comments')
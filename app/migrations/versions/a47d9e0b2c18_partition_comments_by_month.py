@@ -0,0 +1,128 @@
+"""Partition comments by month and add comments archive
+
+Revision ID: a47d9e0b2c18
+Revises: 8f3c2a61d4e7
+Create Date: 2026-10-19 11:48:03.204415
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a47d9e0b2c18'
+down_revision: Union[str, None] = '8f3c2a61d4e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Старую таблицу переименовываем, сиквенс id переиспользуем в новой
+    op.execute('ALTER SEQUENCE comments_id_seq OWNED BY NONE')
+    op.drop_index('ix_comments_active_dt', table_name='comments', postgresql_where=sa.text('is_active'))
+    op.drop_index('ix_comments_product_active_dt', table_name='comments')
+    op.drop_index(op.f('ix_comments_id'), table_name='comments')
+    op.rename_table('comments', 'comments_legacy')
+    op.execute('ALTER TABLE comments_legacy RENAME CONSTRAINT comments_pkey TO comments_legacy_pkey')
+
+    op.execute("""
+        CREATE TABLE comments (
+            id integer NOT NULL DEFAULT nextval('comments_id_seq'),
+            user_id integer REFERENCES users (id) ON DELETE CASCADE,
+            product_id integer REFERENCES products (id),
+            comment varchar,
+            comment_dt timestamp with time zone NOT NULL DEFAULT now(),
+            grade integer,
+            is_active boolean,
+            PRIMARY KEY (id, comment_dt)
+        ) PARTITION BY RANGE (comment_dt)
+    """)
+    op.execute('ALTER SEQUENCE comments_id_seq OWNED BY comments.id')
+    # Секции по месяцам от самого старого комментария до трех месяцев вперед;
+    # дальше их заранее создает ensure_comment_partitions
+    op.execute("""
+        DO $$
+        DECLARE
+            month date := date_trunc('month', coalesce((SELECT min(comment_dt) FROM comments_legacy), now()))::date;
+            last_month date := (date_trunc('month', now()) + interval '3 months')::date;
+        BEGIN
+            WHILE month <= last_month LOOP
+                EXECUTE format('CREATE TABLE %I PARTITION OF comments FOR VALUES FROM (%L) TO (%L)',
+                               'comments_y' || to_char(month, 'YYYY') || 'm' || to_char(month, 'MM'),
+                               month, (month + interval '1 month')::date);
+                month := (month + interval '1 month')::date;
+            END LOOP;
+        END $$
+    """)
+    op.execute('CREATE TABLE comments_default PARTITION OF comments DEFAULT')
+    op.create_index(op.f('ix_comments_id'), 'comments', ['id'], unique=False)
+    op.create_index('ix_comments_product_active_dt', 'comments',
+                    ['product_id', 'is_active', sa.text('comment_dt DESC'), sa.text('id DESC')], unique=False)
+    op.create_index('ix_comments_active_dt', 'comments',
+                    [sa.text('comment_dt DESC'), sa.text('id DESC')], unique=False,
+                    postgresql_where=sa.text('is_active'))
+    op.create_index('ix_comments_inactive', 'comments', ['comment_dt'], unique=False,
+                    postgresql_where=sa.text('NOT is_active'))
+
+    op.create_table('comments_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('product_id', sa.Integer(), nullable=True),
+    sa.Column('comment', sa.String(), nullable=True),
+    sa.Column('comment_dt', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('grade', sa.Integer(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    # Активные комментарии — в секции, удаленные — сразу в архив
+    op.execute("""
+        INSERT INTO comments (id, user_id, product_id, comment, comment_dt, grade, is_active)
+        SELECT id, user_id, product_id, comment, coalesce(comment_dt, now()), grade, is_active
+        FROM comments_legacy WHERE is_active
+    """)
+    op.execute("""
+        INSERT INTO comments_archive (id, user_id, product_id, comment, comment_dt, grade)
+        SELECT id, user_id, product_id, comment, comment_dt, grade
+        FROM comments_legacy WHERE is_active IS NOT TRUE
+    """)
+    op.drop_table('comments_legacy')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('ALTER SEQUENCE comments_id_seq OWNED BY NONE')
+    op.rename_table('comments', 'comments_partitioned')
+    op.execute('ALTER TABLE comments_partitioned RENAME CONSTRAINT comments_pkey TO comments_partitioned_pkey')
+    op.create_table('comments',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('comments_id_seq')"), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('product_id', sa.Integer(), nullable=True),
+    sa.Column('comment', sa.String(), nullable=True),
+    sa.Column('comment_dt', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('grade', sa.Integer(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute('ALTER SEQUENCE comments_id_seq OWNED BY comments.id')
+    op.execute("""
+        INSERT INTO comments (id, user_id, product_id, comment, comment_dt, grade, is_active)
+        SELECT id, user_id, product_id, comment, comment_dt, grade, is_active FROM comments_partitioned
+        UNION ALL
+        SELECT id, user_id, product_id, comment, comment_dt, grade, false FROM comments_archive
+    """)
+    op.drop_table('comments_archive')
+    op.execute('DROP TABLE comments_partitioned CASCADE')
+    op.create_index(op.f('ix_comments_id'), 'comments', ['id'], unique=False)
+    op.create_index('ix_comments_product_active_dt', 'comments',
+                    ['product_id', 'is_active', sa.text('comment_dt DESC'), sa.text('id DESC')], unique=False)
+    op.create_index('ix_comments_active_dt', 'comments',
+                    [sa.text('comment_dt DESC'), sa.text('id DESC')], unique=False,
+                    postgresql_where=sa.text('is_active'))
@@ -0,0 +1,35 @@
+"""Create shared rate limit buckets
+
+Revision ID: b85e3f1a0c62
+Revises: 9a4c1e6f2b75
+Create Date: 2026-10-19 14:02:40.318865
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b85e3f1a0c62'
+down_revision: Union[str, None] = '9a4c1e6f2b75'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # UNLOGGED: корзины легко теряются при сбое, зато записи не идут в WAL
+    op.create_table('rate_limit_buckets',
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('tokens', sa.Float(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('key'),
+    prefixes=['UNLOGGED']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('rate_limit_buckets')
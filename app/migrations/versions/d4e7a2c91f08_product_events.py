@@ -0,0 +1,90 @@
+"""Product versions and change-event outbox
+
+Revision ID: d4e7a2c91f08
+Revises: b85e3f1a0c62
+Create Date: 2026-10-19 20:05:12.530174
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e7a2c91f08'
+down_revision: Union[str, None] = 'b85e3f1a0c62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TRACKED_COLUMNS = ('name', 'slug', 'description', 'price', 'image_url', 'stock',
+                   'supplier_id', 'category_id', 'rating', 'is_active')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('version', sa.BigInteger(), server_default='1', nullable=False))
+    op.create_table('product_events',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=True),
+    sa.Column('version', sa.BigInteger(), nullable=True),
+    sa.Column('event', sa.String(), nullable=True),
+    sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    new_values = ', '.join(f'NEW.{name}' for name in TRACKED_COLUMNS)
+    old_values = ', '.join(f'OLD.{name}' for name in TRACKED_COLUMNS)
+    # Версия меняется только при реальном изменении полей, пустые UPDATE событий не дают
+    op.execute(f"""
+        CREATE FUNCTION products_bump_version() RETURNS trigger AS $$
+        BEGIN
+            IF ({new_values}) IS DISTINCT FROM ({old_values}) THEN
+                NEW.version := OLD.version + 1;
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute('CREATE TRIGGER products_bump_version BEFORE UPDATE ON products '
+               'FOR EACH ROW EXECUTE FUNCTION products_bump_version()')
+    # Событие пишется в той же транзакции, что и изменение: любое изменение товара
+    # (сервис, заказы, импорт, каскадные задачи, рейтинг) попадает в outbox
+    op.execute("""
+        CREATE FUNCTION products_record_event() RETURNS trigger AS $$
+        DECLARE
+            changed jsonb;
+            kind text;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                kind := 'created';
+                changed := to_jsonb(NEW) - 'version';
+            ELSIF NEW.version = OLD.version THEN
+                RETURN NULL;
+            ELSE
+                SELECT coalesce(jsonb_object_agg(n.key, n.value), '{}'::jsonb) INTO changed
+                FROM jsonb_each(to_jsonb(NEW) - 'version') n
+                JOIN jsonb_each(to_jsonb(OLD)) o USING (key)
+                WHERE n.value IS DISTINCT FROM o.value;
+                kind := CASE WHEN OLD.is_active AND NOT NEW.is_active THEN 'deleted' ELSE 'updated' END;
+            END IF;
+            INSERT INTO product_events (product_id, version, event, payload)
+            VALUES (NEW.id, NEW.version, kind, changed);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute('CREATE TRIGGER products_record_event AFTER INSERT OR UPDATE ON products '
+               'FOR EACH ROW EXECUTE FUNCTION products_record_event()')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DROP TRIGGER products_record_event ON products')
+    op.execute('DROP FUNCTION products_record_event()')
+    op.execute('DROP TRIGGER products_bump_version ON products')
+    op.execute('DROP FUNCTION products_bump_version()')
+    op.drop_table('product_events')
+    op.drop_column('products', 'version')
@@ -0,0 +1,35 @@
+"""Precomputed product rankings
+
+Revision ID: e61b9d3f5a27
+Revises: d4e7a2c91f08
+Create Date: 2026-10-19 20:41:08.214593
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e61b9d3f5a27'
+down_revision: Union[str, None] = 'd4e7a2c91f08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('product_rankings',
+    sa.Column('kind', sa.Enum('top-rated', 'most-rated', name='ranking_kind'), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('items', sa.Text(), nullable=True),
+    sa.Column('refreshed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('kind', 'category_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('product_rankings')
+    sa.Enum('top-rated', 'most-rated', name='ranking_kind').drop(op.get_bind())
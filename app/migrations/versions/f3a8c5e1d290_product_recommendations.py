@@ -0,0 +1,36 @@
+"""Item-item product recommendations
+
+Revision ID: f3a8c5e1d290
+Revises: e61b9d3f5a27
+Create Date: 2026-10-19 21:12:47.903311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a8c5e1d290'
+down_revision: Union[str, None] = 'e61b9d3f5a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('product_recommendations',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('related_ids', postgresql.ARRAY(sa.Integer()), nullable=True),
+    sa.Column('scores', postgresql.ARRAY(sa.Float()), nullable=True),
+    sa.Column('computed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('product_recommendations')
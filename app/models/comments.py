@@ -1,16 +1,59 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, func
 
 from app.backend.db import Base
 from datetime import date, datetime, timezone
 
 
+# Оценки комментариев: от 0 до 5 включительно
+GRADES = range(6)
+
+
 class Comment(Base):
+    # Таблица секционирована по месяцам comment_dt (секции создает comments_maintenance),
+    # поэтому comment_dt входит в первичный ключ
     __tablename__ = 'comments'
+    # Индексы под keyset-пагинацию по (comment_dt, id) в порядке убывания
+    __table_args__ = (
+        Index('ix_comments_product_active_dt', 'product_id', 'is_active', 'comment_dt', 'id',
+              postgresql_ops={'comment_dt': 'DESC', 'id': 'DESC'}),
+        Index('ix_comments_active_dt', 'comment_dt', 'id',
+              postgresql_ops={'comment_dt': 'DESC', 'id': 'DESC'},
+              postgresql_where='is_active'),
+        # Архивация ищет удаленные комментарии, их немного
+        Index('ix_comments_inactive', 'comment_dt', postgresql_where='NOT is_active'),
+        {'postgresql_partition_by': 'RANGE (comment_dt)'},
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'))
     product_id = Column(Integer, ForeignKey('products.id'))
     comment = Column(String)
-    comment_dt = Column(DateTime(timezone=True), default=datetime.now)
+    comment_dt = Column(DateTime(timezone=True), primary_key=True, default=datetime.now, server_default=func.now())
     grade = Column(Integer)
     is_active = Column(Boolean, default=True)
+
+
+class ArchivedComment(Base):
+    # Удаленные (is_active = false) комментарии, перенесенные из горячей таблицы
+    __tablename__ = 'comments_archive'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'))
+    product_id = Column(Integer, ForeignKey('products.id'))
+    comment = Column(String)
+    comment_dt = Column(DateTime(timezone=True))
+    grade = Column(Integer)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ProductGradeHistogram(Base):
+    # Число активных комментариев с каждой оценкой, обновляется инкрементально при записи
+    __tablename__ = 'product_grade_histograms'
+
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    grade_0 = Column(Integer, default=0, server_default='0', nullable=False)
+    grade_1 = Column(Integer, default=0, server_default='0', nullable=False)
+    grade_2 = Column(Integer, default=0, server_default='0', nullable=False)
+    grade_3 = Column(Integer, default=0, server_default='0', nullable=False)
+    grade_4 = Column(Integer, default=0, server_default='0', nullable=False)
+    grade_5 = Column(Integer, default=0, server_default='0', nullable=False)
@@ -0,0 +1,18 @@
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, func
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.backend.db import Base
+
+
+class ProductEvent(Base):
+    # Outbox изменений товаров: строки пишет триггер products_record_event в той же
+    # транзакции, что и изменение, а relay публикует их в RabbitMQ и удаляет
+    __tablename__ = 'product_events'
+
+    id = Column(BigInteger, primary_key=True)
+    product_id = Column(Integer)
+    version = Column(BigInteger)
+    event = Column(String)
+    # Для created — товар целиком, для updated/deleted — только изменившиеся поля
+    payload = Column(JSONB)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index, func, Enum as SQLAlchemyEnum
+from enum import Enum
+
+from app.backend.db import Base
+
+
+class CascadeKind(str, Enum):
+    CATEGORY = 'category'
+    SUPPLIER = 'supplier'
+
+
+class JobStatus(str, Enum):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+
+class CascadeJob(Base):
+    # Фоновое каскадное soft-удаление товаров (и их комментариев) пачками
+    __tablename__ = 'cascade_jobs'
+    __table_args__ = (Index('ix_cascade_jobs_status', 'status'),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(SQLAlchemyEnum(CascadeKind, name='cascade_kind', values_callable=lambda e: [field.value for field in e]))
+    target_id = Column(Integer)
+    status = Column(SQLAlchemyEnum(JobStatus, name='job_status', values_callable=lambda e: [field.value for field in e]),
+                    default=JobStatus.PENDING)
+    processed_products = Column(Integer, default=0)
+    processed_comments = Column(Integer, default=0)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,41 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index, Enum as SQLAlchemyEnum
+from sqlalchemy.orm import relationship
+from enum import Enum
+
+from app.backend.db import Base
+from datetime import datetime
+
+
+class OrderStatus(str, Enum):
+    RESERVED = 'reserved'
+    PAID = 'paid'
+    CANCELLED = 'cancelled'
+    EXPIRED = 'expired'
+
+
+class Order(Base):
+    __tablename__ = 'orders'
+    # Индекс для sweeper'а: ищет просроченные резервы
+    __table_args__ = (Index('ix_orders_status_reserved_until', 'status', 'reserved_until'),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), index=True)
+    status = Column(SQLAlchemyEnum(OrderStatus, name='order_status', values_callable=lambda e: [field.value for field in e]),
+                    default=OrderStatus.RESERVED)
+    total = Column(Integer)
+    created_at = Column(DateTime(timezone=True), default=datetime.now)
+    reserved_until = Column(DateTime(timezone=True))
+
+    items = relationship('OrderItem', back_populates='order')
+
+
+class OrderItem(Base):
+    __tablename__ = 'order_items'
+
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey('orders.id', ondelete='CASCADE'), index=True)
+    product_id = Column(Integer, ForeignKey('products.id'))
+    quantity = Column(Integer)
+    price = Column(Integer)
+
+    order = relationship('Order', back_populates='items')
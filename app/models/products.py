@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, String, Boolean, Float, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 
 from app.backend.db import Base
@@ -6,6 +6,11 @@ from app.backend.db import Base
 
 class Product(Base):
     __tablename__ = 'products'
+    # Каскадные задачи выбирают активные товары категории/поставщика пачками по id
+    __table_args__ = (
+        Index('ix_products_category_active', 'category_id', 'id', postgresql_where=text('is_active')),
+        Index('ix_products_supplier_active', 'supplier_id', 'id', postgresql_where=text('is_active')),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
@@ -18,6 +23,9 @@ class Product(Base):
     category_id = Column(Integer, ForeignKey('categories.id'))
     rating = Column(Float, default=0.0)
     is_active = Column(Boolean, default=True)
+    # Растет на каждом изменении (триггер products_bump_version); по нему потребители
+    # событий упорядочивают изменения товара и отбрасывают дубли
+    version = Column(BigInteger, default=1, server_default='1', nullable=False)
 
     category = relationship('Category', back_populates='products')
     
\ No newline at end of file
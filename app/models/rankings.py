@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, DateTime, Text, PrimaryKeyConstraint, func, Enum as SQLAlchemyEnum
+from enum import Enum
+
+from app.backend.db import Base
+
+
+class RankingKind(str, Enum):
+    TOP_RATED = 'top-rated'
+    MOST_RATED = 'most-rated'
+
+
+class ProductRanking(Base):
+    # Готовые топ-N списки: одна строка на вид рейтинга и категорию (0 — весь каталог).
+    # items — уже сериализованный JSON-массив товаров, отдается как есть
+    __tablename__ = 'product_rankings'
+    __table_args__ = (PrimaryKeyConstraint('kind', 'category_id'),)
+
+    kind = Column(SQLAlchemyEnum(RankingKind, name='ranking_kind', values_callable=lambda e: [field.value for field in e]))
+    category_id = Column(Integer)
+    items = Column(Text)
+    refreshed_at = Column(DateTime(timezone=True), server_default=func.now())
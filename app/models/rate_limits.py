@@ -0,0 +1,12 @@
+from sqlalchemy import Column, String, Float, DateTime, func
+
+from app.backend.db import Base
+
+
+class RateLimitBucket(Base):
+    # Token bucket, общий для всех воркеров (RATE_LIMIT_BACKEND=postgres)
+    __tablename__ = 'rate_limit_buckets'
+
+    key = Column(String, primary_key=True)
+    tokens = Column(Float)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
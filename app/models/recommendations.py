@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, func
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from app.backend.db import Base
+
+
+class ProductRecommendation(Base):
+    # Похожие товары по оценкам покупателей ("также оценили"): id по убыванию сходства.
+    # Пересчитывается целиком пакетной задачей
+    __tablename__ = 'product_recommendations'
+
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    related_ids = Column(ARRAY(Integer))
+    scores = Column(ARRAY(Float))
+    computed_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, func
+
+from app.backend.db import Base
+
+
+class RevokedToken(Base):
+    # Denylist отдельных access-токенов по jti; строки живут до истечения токена
+    __tablename__ = 'revoked_tokens'
+    __table_args__ = (Index('ix_revoked_tokens_revoked_at', 'revoked_at'),)
+
+    jti = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'))
+    expires_at = Column(DateTime(timezone=True))
+    revoked_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class RefreshToken(Base):
+    # Непрозрачные refresh-токены; в БД лежит только sha256 от значения.
+    # Все токены одной цепочки ротаций делят family_id
+    __tablename__ = 'refresh_tokens'
+    __table_args__ = (Index('ix_refresh_tokens_family_id', 'family_id'),
+                      Index('ix_refresh_tokens_expires_at', 'expires_at'))
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), index=True)
+    token_hash = Column(String, unique=True)
+    family_id = Column(String)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True))
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
@@ -1,5 +1,5 @@
 from app.backend.db import Base
-from sqlalchemy import Column, Integer, String, Boolean, Enum as SQLAlchemyEnum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Index, text, Enum as SQLAlchemyEnum
 from enum import Enum
 
 
@@ -10,6 +10,8 @@ class UserRole(str, Enum):
 
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (Index('ix_users_tokens_valid_after', 'tokens_valid_after',
+                            postgresql_where=text('tokens_valid_after IS NOT NULL')),)
     
     id = Column(Integer, primary_key=True, index=True)
     first_name = Column(String)
@@ -20,3 +22,5 @@ class User(Base):
     user_role = Column(SQLAlchemyEnum(UserRole, name='user_role', values_callable=lambda e: [field.value for field in e]),
                        default=UserRole.IS_CUSTOMER)
     is_active = Column(Boolean, default=True)
+    # Токены, выпущенные раньше этого момента, считаются отозванными
+    tokens_valid_after = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,64 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from starlette import status
+
+from app.backend.metrics import metrics
+from app.backend.profiler import profile_filename, profiler_state
+from app.backend.scheduler import scheduler
+from .auth import CurrentUserDep
+
+
+# Верхние пределы, чтобы забытый запрос не профилировал воркер бесконечно
+MAX_PROFILE_SECONDS = 120
+MAX_PROFILE_REQUESTS = 10_000
+
+
+router = APIRouter(prefix='/admin', tags=['admin 🛠️'])
+
+
+def require_admin(get_user) -> None:
+    if get_user.user_role != 'is_admin':
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have admin permission"
+        )
+
+
+@router.get('/profile', response_class=PlainTextResponse)
+async def profile(get_user: CurrentUserDep,
+                  seconds: float = Query(10, gt=0, le=MAX_PROFILE_SECONDS),
+                  route: str | None = Query(None, description='Шаблон пути, например /products/{category_slug}'),
+                  requests: int = Query(100, gt=0, le=MAX_PROFILE_REQUESTS),
+                  interval_ms: float = Query(5, ge=1, le=1000),
+                  all_threads: bool = False) -> PlainTextResponse:
+    require_admin(get_user)
+    if profiler_state.lock.locked():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail='Profiler is already running on this worker'
+        )
+    # Без route — профиль воркера за seconds секунд; с route — следующие
+    # requests запросов по этому маршруту, но не дольше seconds
+    async with profiler_state.lock:
+        if route is None:
+            profiler = await profiler_state.profile_for(seconds, interval_ms / 1000, all_threads)
+        else:
+            profiler = await profiler_state.profile_requests(route, requests, seconds,
+                                                             interval_ms / 1000, all_threads)
+    return PlainTextResponse(profiler.collapsed(), headers={
+        'Content-Disposition': f'attachment; filename="{profile_filename()}"',
+        'X-Profile-Samples': str(profiler.samples),
+    })
+
+
+@router.get('/jobs')
+async def scheduled_jobs(get_user: CurrentUserDep) -> list[dict]:
+    # Состояние задач планировщика на этом воркере
+    require_admin(get_user)
+    return scheduler.status()
+
+
+@router.get('/metrics')
+async def worker_metrics(get_user: CurrentUserDep) -> dict:
+    require_admin(get_user)
+    return metrics.snapshot()
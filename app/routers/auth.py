@@ -1,20 +1,49 @@
 import asyncio
 from contextlib import asynccontextmanager
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, Request, status, HTTPException
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy import select, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from passlib.context import CryptContext
 import jwt
 
 from typing import Annotated
 from datetime import datetime, timedelta, timezone
+from uuid import uuid4
 
+from app.backend.db import async_session_maker
 from app.backend.db_depends import DBSessionDep
-from app.schemas import CreateUser, OutputUser, OutputToken, GetUser
+from app.backend.request_log import remember_user
+from app.backend.rate_limit import (client_ip, make_rate_limiter, password_admission,
+                                    purge_idle_buckets, too_many_requests)
+from app.backend.revocation import purge_expired_tokens, token_revocations
+from app.backend.scheduler import scheduler
+from app.schemas import CreateUser, OutputModel, OutputUser, OutputToken, GetUser, RefreshTokenRequest
+from app.models.tokens import RevokedToken
 from app.models.user import User, UserRole
 from app.services.rabbitmq.email_consumer import consume_email_queue
 from app.services.rabbitmq.email_producer import send_welcome_email
-from settings import SECRET_KEY, ALGORITHM
+from app.services.tokens import (issue_refresh_token, purge_expired_refresh_tokens,
+                                 revoke_refresh_token, rotate_refresh_token)
+from settings import (SECRET_KEY, ALGORITHM, ACCESS_TOKEN_MINUTES, REVOCATION_SYNC_SECONDS, RATE_LIMIT_BACKEND,
+                      LOGIN_IP_RATE_PER_MINUTE, LOGIN_IP_BURST, LOGIN_USER_RATE_PER_MINUTE, LOGIN_USER_BURST)
+
+
+@scheduler.job('sync_token_revocations', seconds=REVOCATION_SYNC_SECONDS, leader=False)
+async def sync_token_revocations():
+    # Инкрементально подтягиваем отзывы, сделанные другими воркерами: память у каждого своя
+    async with async_session_maker() as session:
+        await token_revocations.sync(session)
+
+
+@scheduler.job('purge_expired_tokens', cron='*/15 * * * *', jitter=60)
+async def purge_tokens():
+    # Истекшие jti, refresh-токены и простаивающие корзины лимитов
+    async with async_session_maker() as session:
+        await purge_expired_tokens(session)
+        await purge_expired_refresh_tokens(session)
+        if RATE_LIMIT_BACKEND == 'postgres':
+            await purge_idle_buckets(session)
 
 
 async def startup_event():
@@ -32,11 +61,16 @@ router = APIRouter(prefix='/auth', tags=['auth 🔐'], lifespan=lifespan)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+# Лимиты попыток входа: отдельно по IP клиента и по имени пользователя
+login_ip_limiter = make_rate_limiter(LOGIN_IP_RATE_PER_MINUTE / 60, LOGIN_IP_BURST)
+login_user_limiter = make_rate_limiter(LOGIN_USER_RATE_PER_MINUTE / 60, LOGIN_USER_BURST)
 
 
 async def authenticate_user(db: DBSessionDep, username: str, password: str) -> User:
     user = await db.scalar(select(User).where(User.username == username))
-    if not user or not bcrypt_context.verify(password, user.hashed_password) or user.is_active == False:
+    # bcrypt уходит в пул потоков и ограничен по числу одновременных проверок
+    if not user or not await password_admission.run(bcrypt_context.verify, password, user.hashed_password) \
+            or user.is_active == False:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Invalid authentication credentials',
@@ -46,11 +80,16 @@ async def authenticate_user(db: DBSessionDep, username: str, password: str) -> U
 
 
 async def create_access_token(username: str, user_id: int, user_role: UserRole, expires_delta: timedelta) -> str:
+    issued_at = datetime.now(timezone.utc)
     payload = {
         'sub': username,
         'id': user_id,
         'user_role': user_role.value,
-        'exp': datetime.now(timezone.utc) + expires_delta
+        'jti': uuid4().hex,
+        'iat': int(issued_at.timestamp()),
+        # iat по стандарту — целые секунды; для сравнения с моментом отзыва нужна точность выше
+        'iat_ms': int(issued_at.timestamp() * 1000),
+        'exp': issued_at + expires_delta
     }
     
     # Преобразование datetime в timestamp (количество секунд с начала эпохи)
@@ -90,6 +129,15 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> Get
                 detail='Token expired!'
             )
 
+        # Отзыв проверяется по локальной копии, без запроса к БД
+        issued_at = payload['iat_ms'] / 1000 if 'iat_ms' in payload else payload.get('iat')
+        if token_revocations.is_revoked(user_id, issued_at, payload.get('jti')):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail='Token revoked'
+            )
+
+        remember_user(user_id)
         return GetUser.model_validate({
             'username': username,
             'id': user_id,
@@ -100,7 +148,7 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> Get
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Token expired!'
         )
-    except jwt.exceptions:
+    except jwt.InvalidTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Could not validate user'
@@ -116,22 +164,80 @@ async def read_current_user(user: CurrentUserDep) -> GetUser:
 
 @router.post('/token', summary='Get access token')
 async def login(db: DBSessionDep,
+                request: Request,
                 form_data: Annotated[OAuth2PasswordRequestForm, Depends()]) -> OutputToken:
+    retry_after = await login_ip_limiter.acquire(f'login:ip:{client_ip(request)}')
+    if not retry_after:
+        retry_after = await login_user_limiter.acquire(f'login:user:{form_data.username.lower()}')
+    if retry_after:
+        raise too_many_requests(retry_after)
     user = await authenticate_user(db, form_data.username, form_data.password)
-    token = await create_access_token(user.username, user.id, user.user_role, expires_delta=timedelta(minutes=20))
+    token = await create_access_token(user.username, user.id, user.user_role, expires_delta=timedelta(minutes=ACCESS_TOKEN_MINUTES))
+    refresh_token = await issue_refresh_token(db, user.id)
+    await db.commit()
     
     return {
         'access_token': token,
-        'token_type': 'bearer'
+        'token_type': 'bearer',
+        'refresh_token': refresh_token
+    }
+
+
+@router.post('/refresh', summary='Renew access token with refresh token')
+async def refresh(db: DBSessionDep, request: RefreshTokenRequest) -> OutputToken:
+    # bcrypt здесь не участвует: проверка refresh-токена — один sha256 и один UPDATE
+    user, refresh_token = await rotate_refresh_token(db, request.refresh_token)
+    token = await create_access_token(user.username, user.id, user.user_role, expires_delta=timedelta(minutes=ACCESS_TOKEN_MINUTES))
+    return {
+        'access_token': token,
+        'token_type': 'bearer',
+        'refresh_token': refresh_token
+    }
+
+
+@router.post('/refresh/revoke', summary='Revoke refresh token')
+async def revoke_refresh(db: DBSessionDep, request: RefreshTokenRequest) -> OutputModel:
+    if not await revoke_refresh_token(db, request.refresh_token):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Refresh token not found'
+        )
+    return {
+        'status_code': status.HTTP_200_OK,
+        'message': 'Refresh token revoked'
+    }
+
+
+@router.post('/logout', summary='Revoke current access token')
+async def logout(db: DBSessionDep,
+                 user: CurrentUserDep,
+                 token: Annotated[str, Depends(oauth2_scheme)]) -> OutputModel:
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    if payload.get('jti') is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Token can not be revoked'
+        )
+    expires_at = datetime.fromtimestamp(payload['exp'], timezone.utc)
+    await db.execute(pg_insert(RevokedToken)
+                     .values(jti=payload['jti'], user_id=user.id, expires_at=expires_at)
+                     .on_conflict_do_nothing(index_elements=[RevokedToken.jti]))
+    await db.commit()
+    # Этот воркер видит отзыв сразу, остальные — после ближайшей синхронизации
+    token_revocations.deny(payload['jti'], expires_at)
+    return {
+        'status_code': status.HTTP_200_OK,
+        'message': 'Token revoked'
     }
 
 
 @router.post('/', status_code=status.HTTP_201_CREATED, summary='Create new user')
 async def create_user(db: DBSessionDep, create_user: CreateUser) -> OutputUser:
-    await db.execute(insert(User).values(**create_user.model_dump(exclude={'password'}),
-                                         hashed_password=bcrypt_context.hash(create_user.password)))
+    user = await db.execute(insert(User).values(**create_user.model_dump(exclude={'password'}),
+                                                hashed_password=bcrypt_context.hash(create_user.password))
+                                        .returning(User.email, User.username))
+    user = user.one()
     await db.commit()
-    user = await db.scalar(select(User).where(User.username == create_user.username))
     asyncio.create_task(send_welcome_email(user.email, user.username))
     return {
         'status_code': status.HTTP_201_CREATED,
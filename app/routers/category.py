@@ -3,8 +3,10 @@ from sqlalchemy import insert, select, update
 from slugify import slugify
 
 from app.backend.db_depends import DBSessionDep
-from app.schemas import CreateCategory, GetCategory, OutputCategory, UpdateCategory
+from app.schemas import CreateCategory, GetCategory, OutputCascade, OutputCategory, UpdateCategory
 from app.models.category import Category
+from app.models.jobs import CascadeKind
+from app.services.cascade import enqueue_cascade, start_cascade_job
 from .auth import CurrentUserDep
 
 
@@ -51,17 +53,17 @@ async def update_category(db: DBSessionDep,
             status_code=status.HTTP_403_FORBIDDEN,
             detail='You must be admin user for this'
         )
-    category = await db.scalar(select(Category).where(Category.id == category_id))
-    if category is None:
+    updated = await db.scalar(update(Category)
+                              .where(Category.id == category_id)
+                              .values(**update_category.model_dump(exclude_none=True),
+                                      slug=slugify(update_category.name))
+                              .returning(Category.id)
+                              .execution_options(synchronize_session=False))
+    if updated is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='There is no category found'
         )
-
-    await db.execute(update(Category)
-                    .where(Category.id == category.id)
-                    .values(**update_category.model_dump(exclude_none=True),
-                            slug=slugify(update_category.name)))
     await db.commit()
     
     return {
@@ -70,24 +72,31 @@ async def update_category(db: DBSessionDep,
     }
     
 
-@router.delete('/', response_model=OutputCategory)
+@router.delete('/', response_model=OutputCascade)
 async def delete_category(db: DBSessionDep,
                           category_id: int,
-                          get_user: CurrentUserDep) -> OutputCategory:
+                          get_user: CurrentUserDep) -> OutputCascade:
     if get_user.user_role != 'is_admin':
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail='You must be admin user for this'
         )
-    category = await db.scalar(select(Category).where(Category.id == category_id))
-    if category is None:
+    deleted = await db.scalar(update(Category)
+                              .where(Category.id == category_id)
+                              .values(is_active=False)
+                              .returning(Category.id)
+                              .execution_options(synchronize_session=False))
+    if deleted is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='There is no category found'
         )
-    category.is_active = False
+    # Товары и комментарии категории деактивируются фоновой задачей пачками
+    job_id = await enqueue_cascade(db, CascadeKind.CATEGORY, category_id)
     await db.commit()
+    start_cascade_job(job_id)
     return {
         'status_code': status.HTTP_200_OK,
-        'message': 'Category delete is successful'
+        'message': 'Category delete is successful',
+        'job_id': job_id
     }
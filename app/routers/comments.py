@@ -1,47 +1,81 @@
-from fastapi import APIRouter, status, HTTPException
-from sqlalchemy import select, insert
-from sqlalchemy import func
+from fastapi import APIRouter, status, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from loguru import logger
+from sqlalchemy import select, insert, update
 
+from app.backend.db import async_session_maker, fetch_rows
 from app.backend.db_depends import DBSessionDep
-from app.schemas import CreateComment, GetComment, OutputModel
+from app.backend.scheduler import scheduler
+from app.schemas import CommentPage, CreateComment, OutputModel, ProductCommentPage
 from app.models import *
-from app.models.comments import Comment
+from app.models.comments import ArchivedComment, Comment, ProductGradeHistogram
+from app.services.comments import (HISTOGRAM_COLUMNS, apply_grade_change, fetch_comment_page,
+                                   histogram_counts, rating_from_histogram)
+from app.services.comments_maintenance import (archive_inactive_comments, ensure_comment_partitions,
+                                               recompute_product_ratings)
+from app.services.rankings import start_rankings_update
 from .auth import CurrentUserDep
+from settings import COMMENT_MAINTENANCE_SECONDS, RATING_RECOMPUTE_CRON
+
+
+@scheduler.job('maintain_comments', seconds=COMMENT_MAINTENANCE_SECONDS, jitter=60)
+async def maintain_comments():
+    # Создание секций на месяцы вперед и перенос удаленных комментариев в архив
+    async with async_session_maker() as session:
+        created = await ensure_comment_partitions(session)
+        if created:
+            logger.info(f'Created comment partitions: {", ".join(created)}')
+        while await archive_inactive_comments(session):
+            pass
+
+
+@scheduler.job('recompute_product_ratings', cron=RATING_RECOMPUTE_CRON, jitter=60)
+async def recompute_ratings():
+    # Страховка от расхождений инкрементальных гистограмм (ручные правки, сбои)
+    async with async_session_maker() as session:
+        fixed = await recompute_product_ratings(session)
+        if fixed:
+            logger.warning(f'Rating recompute fixed {fixed} grade histograms')
 
 
 router = APIRouter(prefix='/comments', tags=['comments 💬'])
 
 
-@router.get('/')
-async def all_comments(db: DBSessionDep) -> list[GetComment]:
-    comments = await db.scalars(select(Comment).where(Comment.is_active == True))
-    comments = comments.all()
-    if not comments:
+@router.get('/', response_model=CommentPage)
+async def all_comments(db: DBSessionDep,
+                       limit: int = Query(20, ge=1, le=100),
+                       cursor: str | None = None) -> ORJSONResponse:
+    page = await fetch_comment_page(db, limit, cursor)
+    if not page['items'] and cursor is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='There are no comments'
         )
-    return comments
+    return ORJSONResponse(page)
 
 
-@router.get('/detail/{product_id}')
-async def comment_detail(db: DBSessionDep, product_id: int) -> list[GetComment]:
-    product = await db.scalar(select(Product).where(Product.id == product_id,
-                                                    Product.is_active == True))
-    if product is None:
+@router.get('/detail/{product_id}', response_model=ProductCommentPage)
+async def comment_detail(db: DBSessionDep,
+                         product_id: int,
+                         limit: int = Query(20, ge=1, le=100),
+                         cursor: str | None = None) -> ORJSONResponse:
+    # Проверка товара и гистограмма оценок одним запросом
+    product = await fetch_rows(db, select(Product.id, *HISTOGRAM_COLUMNS)
+                               .outerjoin(ProductGradeHistogram, ProductGradeHistogram.product_id == Product.id)
+                               .where(Product.id == product_id, Product.is_active == True))
+    if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='There is no product found'
         )
-    comment_list = await db.scalars(select(Comment).where(Comment.product_id == product_id,
-                                                              Comment.is_active == True))
-    comment_list = comment_list.all()
-    if not comment_list:
+    page = await fetch_comment_page(db, limit, cursor, product_id=product_id)
+    if not page['items'] and cursor is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='There are no product comments'
         )
-    return comment_list
+    page['histogram'] = histogram_counts(product[0])
+    return ORJSONResponse(page)
 
 
 @router.post('/', status_code=status.HTTP_201_CREATED)
@@ -68,13 +102,19 @@ async def add_comment(db: DBSessionDep,
                                                 product_id=create_comment.product_id,
                                                 comment=create_comment.comment,
                                                 grade=create_comment.grade))
+        histogram = await apply_grade_change(db, product.id, added=create_comment.grade)
     else:
+        histogram = None
+        if comment.is_active:
+            histogram = await apply_grade_change(db, product.id, added=create_comment.grade, removed=comment.grade)
         comment.comment = create_comment.comment
         comment.grade = create_comment.grade
-    product_comments_avg_grade = await db.scalar(select(func.avg(Comment.grade))
-                                                    .where(Comment.product_id == create_comment.product_id))
-    product.rating = product_comments_avg_grade
+    # Рейтинг считается по гистограмме, без агрегата по всем комментариям товара
+    if histogram is not None:
+        product.rating = rating_from_histogram(histogram)
     await db.commit()
+    if histogram is not None:
+        start_rankings_update(create_comment.product_id)
     return {
         'status_code': status.HTTP_201_CREATED,
         'message': 'Comment added successful'
@@ -91,6 +131,11 @@ async def delete_comment(db: DBSessionDep,
             detail='You must be admin user for this action'
         )
     comment_delete = await db.scalar(select(Comment).where(Comment.id == comment_id))
+    if comment_delete is None and await db.scalar(select(ArchivedComment.id).where(ArchivedComment.id == comment_id)):
+        return {
+            'status_code': status.HTTP_200_OK,
+            'message': 'Comment has already been deleted'
+        }
     if comment_delete is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -102,7 +147,12 @@ async def delete_comment(db: DBSessionDep,
             'message': 'Comment has already been deleted'
         }
     comment_delete.is_active = False
+    histogram = await apply_grade_change(db, comment_delete.product_id, removed=comment_delete.grade)
+    await db.execute(update(Product)
+                     .where(Product.id == comment_delete.product_id)
+                     .values(rating=rating_from_histogram(histogram)))
     await db.commit()
+    start_rankings_update(comment_delete.product_id)
     return {
         'status_code': status.HTTP_200_OK,
         'message': 'Comment delete is successful'
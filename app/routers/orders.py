@@ -0,0 +1,46 @@
+from fastapi import APIRouter, status, Depends
+
+from app.backend.db import async_session_maker
+from app.backend.scheduler import scheduler
+from app.schemas import CreateOrder, GetOrder, OutputModel
+from app.services.orders import OrderService
+from .auth import CurrentUserDep
+from settings import RESERVATION_SWEEP_SECONDS
+
+
+@scheduler.job('sweep_expired_reservations', seconds=RESERVATION_SWEEP_SECONDS, jitter=5)
+async def sweep_expired_reservations():
+    # Возвращаем на склад товары из неоплаченных заказов с истекшим резервом
+    async with async_session_maker() as session:
+        while await OrderService(session).release_expired():
+            pass
+
+
+router = APIRouter(prefix='/orders', tags=['orders 🛒'])
+
+
+@router.post('/', status_code=status.HTTP_201_CREATED)
+async def checkout(create_order: CreateOrder,
+                   get_user: CurrentUserDep,
+                   service: OrderService = Depends()) -> GetOrder:
+    return await service.checkout(items=create_order.items, get_user=get_user)
+
+
+@router.get('/')
+async def my_orders(get_user: CurrentUserDep, service: OrderService = Depends()) -> list[GetOrder]:
+    return await service.get_user_orders(get_user=get_user)
+
+
+@router.get('/{order_id}')
+async def order_detail(order_id: int, get_user: CurrentUserDep, service: OrderService = Depends()) -> GetOrder:
+    return await service.get_order(order_id=order_id, get_user=get_user)
+
+
+@router.post('/{order_id}/pay')
+async def pay_order(order_id: int, get_user: CurrentUserDep, service: OrderService = Depends()) -> OutputModel:
+    return await service.pay_order(order_id=order_id, get_user=get_user)
+
+
+@router.post('/{order_id}/cancel')
+async def cancel_order(order_id: int, get_user: CurrentUserDep, service: OrderService = Depends()) -> OutputModel:
+    return await service.cancel_order(order_id=order_id, get_user=get_user)
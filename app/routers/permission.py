@@ -1,11 +1,19 @@
 from fastapi import APIRouter, HTTPException
-from sqlalchemy import select, update
+from sqlalchemy import case, func, literal, select, update
 from starlette import status
 
 from app.backend.db_depends import DBSessionDep
-from app.models.user import User
+from app.backend.revocation import token_revocations
+from app.backend.scheduler import scheduler
+from app.models.jobs import CascadeJob, CascadeKind
+from app.models.user import User, UserRole
+from app.services.cascade import enqueue_cascade, resume_cascade_jobs, start_cascade_job
 from .auth import CurrentUserDep
-from app.schemas import OutputModel
+from app.schemas import GetCascadeJob, OutputCascade, OutputModel
+
+
+# Дорабатываем каскадные задачи, прерванные рестартом или упавшим воркером
+scheduler.job('resume_cascade_jobs', seconds=60, jitter=10)(resume_cascade_jobs)
 
 
 router = APIRouter(prefix='/permission', tags=['permission 🧑💻'])
@@ -18,22 +26,29 @@ async def supplier_permission(db: DBSessionDep, get_user: CurrentUserDep, user_i
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You don't have admin permission"
         )
-    user = await db.scalar(select(User).where(User.id == user_id))
-    
-    if not user or not user.is_active:
+    # Смена роли одним UPDATE ... RETURNING: проверка существования и переключение вместе.
+    # Токены со старой ролью отзываются через tokens_valid_after
+    changed = await db.execute(update(User)
+                               .where(User.id == user_id, User.is_active == True)
+                               .values(user_role=case((User.user_role == UserRole.IS_SUPPLIER,
+                                                       literal(UserRole.IS_CUSTOMER, User.user_role.type)),
+                                                      else_=literal(UserRole.IS_SUPPLIER, User.user_role.type)),
+                                       tokens_valid_after=func.now())
+                               .returning(User.user_role, User.tokens_valid_after)
+                               .execution_options(synchronize_session=False))
+    changed = changed.first()
+    if changed is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='User not found'
         )
-    if user.user_role.value == 'is_supplier':
-        await db.execute(update(User).where(User.id == user_id).values(user_role='is_customer'))
-        await db.commit()
+    await db.commit()
+    token_revocations.revoke_user(user_id, changed.tokens_valid_after)
+    if changed.user_role == UserRole.IS_CUSTOMER:
         return {
             'status_code': status.HTTP_200_OK,
             'message': 'User is no longer supplier'
         }
-    await db.execute(update(User).where(User.id == user_id).values(user_role='is_supplier'))
-    await db.commit()
     return {
         'status_code': status.HTTP_200_OK,
         'message': 'User is now supplier'
@@ -41,32 +56,65 @@ async def supplier_permission(db: DBSessionDep, get_user: CurrentUserDep, user_i
 
 
 @router.delete('/delete')
-async def delete_user(db: DBSessionDep, get_user: CurrentUserDep, user_id: int) -> OutputModel:
+async def delete_user(db: DBSessionDep, get_user: CurrentUserDep, user_id: int) -> OutputCascade:
     if get_user.user_role != 'is_admin':
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You don't have admin permission"
         )
-    user = await db.scalar(select(User).where(User.id == user_id))
-    
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail='User not found'
-        )
-    if user.is_admin:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can't delete admin user"
-        )
-    if not user.is_active:
+    deleted = await db.execute(update(User)
+                                .where(
+                                  User.id == user_id,
+                                  User.is_active == True,
+                                  User.user_role.is_distinct_from(UserRole.IS_ADMIN))
+                                .values(is_active=False, tokens_valid_after=func.now())
+                                .returning(User.id, User.user_role, User.tokens_valid_after)
+                                .execution_options(synchronize_session=False))
+    deleted = deleted.first()
+    if deleted is None:
+        # Причину отказа ищем только на этом пути
+        user = await db.execute(select(User.user_role, User.is_active).where(User.id == user_id))
+        user = user.first()
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='User not found'
+            )
+        if user.user_role == UserRole.IS_ADMIN:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You can't delete admin user"
+            )
         return {
             'status_code': status.HTTP_200_OK,
             'message': 'User has already been deleted'
         }
-    await db.execute(update(User).where(User.id == user_id).values(is_active=False))
+    job_id = None
+    if deleted.user_role == UserRole.IS_SUPPLIER:
+        # Товары поставщика и комментарии к ним деактивируются фоновой задачей пачками
+        job_id = await enqueue_cascade(db, CascadeKind.SUPPLIER, user_id)
     await db.commit()
+    token_revocations.revoke_user(user_id, deleted.tokens_valid_after)
+    if job_id is not None:
+        start_cascade_job(job_id)
     return {
         'status_code': status.HTTP_200_OK,
-        'message': 'User is deleted'
+        'message': 'User is deleted',
+        'job_id': job_id
     }
+
+
+@router.get('/jobs/{job_id}')
+async def cascade_job_progress(db: DBSessionDep, get_user: CurrentUserDep, job_id: int) -> GetCascadeJob:
+    if get_user.user_role != 'is_admin':
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have admin permission"
+        )
+    job = await db.scalar(select(CascadeJob).where(CascadeJob.id == job_id))
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Job not found'
+        )
+    return job
@@ -1,29 +1,205 @@
-from fastapi import APIRouter, status, Depends
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, status, Depends, HTTPException, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from loguru import logger
+from sqlalchemy import select
 
-from app.schemas import CreateProduct, GetProduct, OutputProduct, UpdateProduct
+from app.schemas import (CreateProduct, GetProduct, OutputBulkUpdate, OutputImage, OutputImport, OutputProduct,
+                         StockPriceChange, UpdateProduct)
 from app.models import *
+from app.models.rankings import ProductRanking, RankingKind
 from .auth import CurrentUserDep
-from app.services.products import ProductService
+from app.backend.compression import CachedBodyResponse
+from app.backend.db import async_session_maker, fetch_rows
+from app.backend.db_depends import DBSessionDep
+from app.backend.scheduler import scheduler
+from app.services.catalog_snapshot import catalog_snapshots
+from app.services.images import ProductImageService, shutdown_image_executor
+from app.services.products import ProductService, listing_filters
+from app.services.product_import import ProductImportService
+from app.services.product_stream import Subscriber, product_stream, sse_message
+from app.services.rankings import refresh_rankings
+from app.services.recommendations import rebuild_recommendations
+from app.services.rabbitmq.product_events import RELAY_BATCH_SIZE, relay_product_events
+from settings import (CATALOG_SNAPSHOT_PATH, CATALOG_SNAPSHOT_SECONDS, CATALOG_SNAPSHOT_CHECK_SECONDS,
+                      PRODUCT_EVENTS_RELAY_SECONDS, RANKING_REFRESH_SECONDS, RECOMMENDATIONS_CRON,
+                      SSE_KEEPALIVE_SECONDS, SSE_MAX_CLIENTS)
 
 
-router = APIRouter(prefix='/products', tags=['products 📦'])
+# Сколько товаров можно отслеживать одним потоком SSE
+MAX_STREAM_PRODUCTS = 100
 
 
-@router.get('/')
-async def all_products(service: ProductService = Depends()) -> list[GetProduct]:
-    return await service.get_all_products()
+async def maintain_catalog_snapshot():
+    # Пересборка устаревшего снапшота (одним воркером на хост) и подхват нового файла
+    if await catalog_snapshots.rebuild_if_stale(CATALOG_SNAPSHOT_SECONDS):
+        logger.info('Catalog snapshot rebuilt')
+    catalog_snapshots.refresh()
 
 
-@router.get('/{category_slug}')
-async def product_by_category(category_slug: str, service: ProductService = Depends()) -> list[GetProduct]:
-    return await service.get_products_by_category(category_slug)
+if CATALOG_SNAPSHOT_PATH:
+    # Файл снапшота свой на каждом хосте, поэтому задача не лидерская: на каждом воркере
+    scheduler.job('catalog_snapshot', seconds=CATALOG_SNAPSHOT_CHECK_SECONDS, leader=False)(maintain_catalog_snapshot)
+
+
+@scheduler.job('relay_product_events', seconds=PRODUCT_EVENTS_RELAY_SECONDS)
+async def relay_events():
+    # Один публикатор на кластер — порядок событий товара сохраняется и в брокере
+    async with async_session_maker() as session:
+        while await relay_product_events(session) == RELAY_BATCH_SIZE:
+            pass
+
+
+@scheduler.job('refresh_rankings', seconds=RANKING_REFRESH_SECONDS, jitter=30)
+async def refresh_all_rankings():
+    # Полная пересборка топов; между запусками их поддерживают инкрементальные обновления
+    async with async_session_maker() as session:
+        for kind in RankingKind:
+            await refresh_rankings(session, kind)
+        await session.commit()
+
+
+@scheduler.job('rebuild_recommendations', cron=RECOMMENDATIONS_CRON, jitter=300)
+async def recompute_recommendations():
+    products = await rebuild_recommendations()
+    logger.info(f'Recommendations rebuilt for {products} products')
+
+
+@asynccontextmanager
+async def lifespan(router: APIRouter):
+    # Одна подписка на события товаров на воркер, дальше раздача клиентам SSE в памяти
+    consumer = asyncio.create_task(product_stream.run())
+    yield
+    consumer.cancel()
+    shutdown_image_executor()
+
+
+router = APIRouter(prefix='/products', tags=['products 📦'], lifespan=lifespan)
+
+
+async def snapshot_listing(category_slug: str | None, min_price: int | None,
+                           max_price: int | None, min_rating: float | None) -> CachedBodyResponse | None:
+    # Ответ из снапшота каталога, если он загружен; иначе None и запрос идет в БД
+    snapshot = catalog_snapshots.current
+    if snapshot is None:
+        return None
+    # Первая сборка тела и фильтрация — проход по большому массиву, поэтому в пуле потоков
+    body = await run_in_threadpool(snapshot.listing, category_slug, min_price, max_price, min_rating)
+    if body is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Category not found'
+        )
+    return CachedBodyResponse(body)
+
+
+# Списки отдаются строками из Core-запроса напрямую в orjson, минуя валидацию Pydantic;
+# response_model остается для схемы OpenAPI. При загруженном снапшоте — готовыми байтами из него
+@router.get('/', response_model=list[GetProduct])
+async def all_products(service: ProductService = Depends(),
+                       min_price: int | None = Query(None, ge=0),
+                       max_price: int | None = Query(None, ge=0),
+                       min_rating: float | None = Query(None, ge=0, le=5)) -> ORJSONResponse:
+    response = await snapshot_listing(None, min_price, max_price, min_rating)
+    if response is not None:
+        if response.body == b'[]':
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='There are no products'
+            )
+        return response
+    return ORJSONResponse(await service.get_all_products(*listing_filters(min_price, max_price, min_rating)))
+
+
+@router.get('/{category_slug}', response_model=list[GetProduct])
+async def product_by_category(category_slug: str,
+                              service: ProductService = Depends(),
+                              min_price: int | None = Query(None, ge=0),
+                              max_price: int | None = Query(None, ge=0),
+                              min_rating: float | None = Query(None, ge=0, le=5)) -> ORJSONResponse:
+    response = await snapshot_listing(category_slug, min_price, max_price, min_rating)
+    if response is not None:
+        return response
+    return ORJSONResponse(await service.get_products_by_category(category_slug,
+                                                                 *listing_filters(min_price, max_price, min_rating)))
     
 
+async def stream_events(subscriber: Subscriber, initial: list[dict]):
+    try:
+        yield b'retry: 3000\n\n'
+        for product in initial:
+            yield sse_message('product', product)
+        while True:
+            try:
+                message = await asyncio.wait_for(subscriber.queue.get(), SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                # Комментарий SSE: держит соединение живым через прокси
+                yield b': keepalive\n\n'
+                continue
+            if message is None:
+                # Клиент не успевал читать: просим переподключиться и перечитать состояние
+                yield sse_message('reset', {'reason': 'slow consumer'})
+                return
+            yield message
+    finally:
+        product_stream.unsubscribe(subscriber)
+
+
+@router.get('/events/stream')
+async def product_stream_events(
+        db: DBSessionDep,
+        ids: list[int] = Query(min_length=1, max_length=MAX_STREAM_PRODUCTS)) -> StreamingResponse:
+    # Остатки и цены выбранных товаров: сначала текущее состояние, затем изменения.
+    # У каждого события есть version — клиент отбрасывает то, что старее уже показанного
+    if product_stream.clients >= SSE_MAX_CLIENTS:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail='Too many event stream clients'
+        )
+    # Подписка до чтения состояния: изменение между ними не потеряется
+    subscriber = product_stream.subscribe(set(ids))
+    try:
+        initial = await fetch_rows(db, select(Product.id, Product.version, Product.stock, Product.price,
+                                              Product.is_active)
+                                   .where(Product.id.in_(set(ids))))
+    except BaseException:
+        product_stream.unsubscribe(subscriber)
+        raise
+    return StreamingResponse(stream_events(subscriber, initial), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@router.get('/top/{kind}', response_model=list[GetProduct])
+async def top_products(db: DBSessionDep, kind: RankingKind, category_slug: str | None = None) -> Response:
+    # Один запрос по первичному ключу; список уже сериализован при пересчете
+    scope = 0 if category_slug is None else \
+        select(Category.id).where(Category.slug == category_slug).scalar_subquery()
+    items = await db.scalar(select(ProductRanking.items)
+                            .where(ProductRanking.kind == kind, ProductRanking.category_id == scope))
+    if items is None:
+        if category_slug is not None and await db.scalar(select(Category.id)
+                                                          .where(Category.slug == category_slug)) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='Category not found'
+            )
+        items = '[]'
+    return Response(items, media_type='application/json')
+
+
 @router.get('/detail/{product_slug}')
 async def product_detail(product_slug: str, service: ProductService = Depends()) -> GetProduct:
     return await service.get_product_details(product_slug)
 
 
+@router.get('/detail/{product_slug}/related', response_model=list[GetProduct])
+async def related_products(product_slug: str, service: ProductService = Depends()) -> ORJSONResponse:
+    # "Покупатели также оценили": готовые рекомендации из пакетной задачи
+    return ORJSONResponse(await service.get_related_products(product_slug))
+
+
 @router.post('/', status_code=status.HTTP_201_CREATED, response_model=OutputProduct)
 async def create_product(create_product: CreateProduct,
                          get_user: CurrentUserDep,
@@ -31,6 +207,28 @@ async def create_product(create_product: CreateProduct,
     return await service.create_product(create_product=create_product, get_user=get_user)
 
 
+@router.post('/import', status_code=status.HTTP_201_CREATED, response_model=OutputImport)
+async def import_products(file: UploadFile,
+                          get_user: CurrentUserDep,
+                          service: ProductImportService = Depends()) -> OutputImport:
+    return await service.import_products(upload=file, get_user=get_user)
+
+
+@router.post('/images', status_code=status.HTTP_201_CREATED, response_model=OutputImage)
+async def upload_image(file: UploadFile,
+                       get_user: CurrentUserDep,
+                       product_slug: str | None = Query(None, description='Сделать изображение image_url товара'),
+                       service: ProductImageService = Depends()) -> OutputImage:
+    return await service.upload_image(upload=file, get_user=get_user, product_slug=product_slug)
+
+
+@router.patch('/bulk', response_model=OutputBulkUpdate)
+async def bulk_update_stock_price(changes: list[StockPriceChange],
+                                  get_user: CurrentUserDep,
+                                  service: ProductService = Depends()) -> OutputBulkUpdate:
+    return await service.bulk_update_stock_price(changes=changes, get_user=get_user)
+
+
 @router.put('/detail/{product_slug}', response_model=OutputProduct)
 async def update_product_model(product_slug: str,
                                update_product_model: UpdateProduct,
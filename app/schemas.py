@@ -1,5 +1,6 @@
 from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
+from typing import Literal
 
 
 class OutputModel(BaseModel):
@@ -15,6 +16,11 @@ class OutputCategory(OutputModel):
     pass
 
 
+class OutputCascade(OutputModel):
+    # id фоновой задачи каскадного удаления; None, если удалять было нечего
+    job_id: int | None = None
+
+
 class OutputUser(OutputModel):
     pass
 
@@ -22,6 +28,11 @@ class OutputUser(OutputModel):
 class OutputToken(BaseModel):
     access_token: str
     token_type: str = 'bearer'
+    refresh_token: str | None = None
+
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 
 class CreateProduct(BaseModel):
@@ -33,6 +44,24 @@ class CreateProduct(BaseModel):
     category_id: int
 
 
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+
+class OutputImport(OutputModel):
+    imported: int
+    rejected: int
+    errors: list[ImportRowError]
+
+
+class OutputImage(OutputModel):
+    hash: str
+    original: str
+    # {'small': {'webp': url, 'jpeg': url}, ...}
+    thumbnails: dict[str, dict[str, str]]
+
+
 class UpdateProduct(CreateProduct):
     name: str | None = None
     description: str | None = None
@@ -42,6 +71,23 @@ class UpdateProduct(CreateProduct):
     category_id: int
 
 
+class StockPriceChange(BaseModel):
+    slug: str
+    stock: int | None = None
+    price: int | None = None
+    mode: Literal['absolute', 'delta'] = 'absolute'
+
+
+class RejectedChange(BaseModel):
+    slug: str
+    reason: str
+
+
+class OutputBulkUpdate(OutputModel):
+    updated: int
+    rejected: list[RejectedChange]
+
+
 class GetProduct(CreateProduct):
     slug: str
     rating: float
@@ -91,3 +137,50 @@ class GetComment(CreateComment):
     user_id: int
     comment_dt: datetime
     # is_active: bool
+
+
+class CommentPage(BaseModel):
+    items: list[GetComment]
+    next_cursor: str | None
+
+
+class ProductCommentPage(CommentPage):
+    # histogram[grade] — число активных комментариев с этой оценкой
+    histogram: list[int]
+
+
+class CartItem(BaseModel):
+    product_id: int
+    quantity: int = Field(gt=0)
+
+
+class CreateOrder(BaseModel):
+    items: list[CartItem] = Field(min_length=1)
+
+
+class GetOrderItem(BaseModel):
+    product_id: int
+    quantity: int
+    price: int
+
+
+class GetOrder(BaseModel):
+    id: int
+    status: str
+    total: int
+    created_at: datetime
+    reserved_until: datetime
+    items: list[GetOrderItem]
+
+
+class GetCascadeJob(BaseModel):
+    id: int
+    kind: str
+    target_id: int
+    status: str
+    processed_products: int
+    processed_comments: int
+    error: str | None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: datetime | None
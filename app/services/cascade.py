@@ -0,0 +1,137 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from loguru import logger
+from sqlalchemy import delete, exists, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.backend.db import async_session_maker
+from app.models import *
+from app.models.comments import Comment, ProductGradeHistogram
+from app.models.jobs import CascadeJob, CascadeKind, JobStatus
+from settings import CASCADE_BATCH_SIZE
+
+
+# Задача в статусе running без прогресса дольше этого времени считается брошенной
+STALE_JOB_AFTER = timedelta(minutes=5)
+# Пауза перед повтором, если оставшиеся товары заблокированы другими транзакциями
+LOCKED_RETRY_SECONDS = 1
+# Ссылки на запущенные задачи, чтобы их не собрал сборщик мусора
+_running_jobs: set[asyncio.Task] = set()
+
+
+async def enqueue_cascade(session: AsyncSession, kind: CascadeKind, target_id: int) -> int:
+    return await session.scalar(insert(CascadeJob)
+                                .values(kind=kind, target_id=target_id, status=JobStatus.PENDING,
+                                        processed_products=0, processed_comments=0)
+                                .returning(CascadeJob.id))
+
+
+async def claim_job(session: AsyncSession, job_id: int) -> CascadeJob | None:
+    # Один воркер забирает задачу; брошенную (воркер умер) можно перезабрать
+    job = await session.execute(update(CascadeJob)
+                                .where(
+                                    CascadeJob.id == job_id,
+                                    or_(CascadeJob.status == JobStatus.PENDING,
+                                        (CascadeJob.status == JobStatus.RUNNING)
+                                        & (CascadeJob.updated_at < datetime.now(timezone.utc) - STALE_JOB_AFTER)))
+                                .values(status=JobStatus.RUNNING, updated_at=datetime.now(timezone.utc))
+                                .returning(CascadeJob.kind, CascadeJob.target_id))
+    job = job.first()
+    await session.commit()
+    return job
+
+
+def owner_column(kind: CascadeKind):
+    return Product.category_id if kind == CascadeKind.CATEGORY else Product.supplier_id
+
+
+async def deactivate_batch(session: AsyncSession, job_id: int, kind: CascadeKind, target_id: int) -> int:
+    batch = select(Product.id) \
+        .where(owner_column(kind) == target_id, Product.is_active == True) \
+        .order_by(Product.id) \
+        .limit(CASCADE_BATCH_SIZE) \
+        .with_for_update(skip_locked=True)
+    product_ids = await session.scalars(update(Product)
+                                        .where(Product.id.in_(batch.scalar_subquery()))
+                                        .values(is_active=False)
+                                        .returning(Product.id)
+                                        .execution_options(synchronize_session=False))
+    product_ids = product_ids.all()
+    if not product_ids:
+        return 0
+    comments = await session.execute(update(Comment)
+                                      .where(Comment.product_id.in_(product_ids), Comment.is_active == True)
+                                      .values(is_active=False)
+                                      .execution_options(synchronize_session=False))
+    # Гистограммы считают только активные комментарии
+    await session.execute(delete(ProductGradeHistogram).where(ProductGradeHistogram.product_id.in_(product_ids)))
+    await session.execute(update(CascadeJob)
+                          .where(CascadeJob.id == job_id)
+                          .values(processed_products=CascadeJob.processed_products + len(product_ids),
+                                  processed_comments=CascadeJob.processed_comments + comments.rowcount,
+                                  updated_at=datetime.now(timezone.utc)))
+    await session.commit()
+    return len(product_ids)
+
+
+async def has_active_products(session: AsyncSession, job_id: int, kind: CascadeKind, target_id: int) -> bool:
+    # Без SKIP LOCKED: пустая пачка значит лишь, что оставшиеся строки заняты
+    # (оформление заказа, массовое обновление цен), а не что их нет
+    remaining = await session.scalar(select(exists().where(owner_column(kind) == target_id,
+                                                           Product.is_active == True)))
+    if remaining:
+        # Ожидание — тоже прогресс: задачу не должен перезабрать другой воркер
+        await session.execute(update(CascadeJob)
+                              .where(CascadeJob.id == job_id)
+                              .values(updated_at=datetime.now(timezone.utc)))
+    await session.commit()
+    return remaining
+
+
+async def run_cascade_job(job_id: int) -> None:
+    # Каждая пачка — отдельная короткая транзакция, блокировки держатся недолго
+    async with async_session_maker() as session:
+        job = await claim_job(session, job_id)
+        if job is None:
+            return
+        try:
+            while True:
+                while await deactivate_batch(session, job_id, job.kind, job.target_id):
+                    await asyncio.sleep(0)
+                if not await has_active_products(session, job_id, job.kind, job.target_id):
+                    break
+                await asyncio.sleep(LOCKED_RETRY_SECONDS)
+            status = JobStatus.DONE
+            error = None
+        except Exception as ex:
+            await session.rollback()
+            logger.error(f'Cascade job {job_id} failed: {ex}')
+            status = JobStatus.FAILED
+            error = str(ex)
+        await session.execute(update(CascadeJob)
+                              .where(CascadeJob.id == job_id)
+                              .values(status=status, error=error,
+                                      updated_at=datetime.now(timezone.utc),
+                                      finished_at=datetime.now(timezone.utc)))
+        await session.commit()
+
+
+def start_cascade_job(job_id: int) -> None:
+    task = asyncio.create_task(run_cascade_job(job_id))
+    _running_jobs.add(task)
+    task.add_done_callback(_running_jobs.discard)
+
+
+async def resume_cascade_jobs() -> None:
+    # Подбираем задачи, не доведенные до конца (например, после рестарта воркера)
+    async with async_session_maker() as session:
+        job_ids = await session.scalars(select(CascadeJob.id)
+                                        .where(CascadeJob.status.in_([JobStatus.PENDING, JobStatus.RUNNING]))
+                                        .order_by(CascadeJob.id))
+        job_ids = job_ids.all()
+    for job_id in job_ids:
+        try:
+            await run_cascade_job(job_id)
+        except Exception as ex:
+            logger.error(f'Cascade job {job_id} could not be resumed: {ex}')
@@ -0,0 +1,224 @@
+import fcntl
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+
+import orjson
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+
+from app.backend.compression import CachedBody
+from app.backend.db import engine
+from app.models import *
+from app.services.products import PRODUCT_LIST_COLUMNS
+from settings import CATALOG_SNAPSHOT_PATH
+
+
+# Формат файла: MAGIC, числовые колонки (выровнены по 8 байт), блок строк,
+# JSON-заголовок, длина заголовка (8 байт) и снова MAGIC. Строки — готовый JSON
+# товара с запятой в конце, поэтому любой диапазон строк — почти готовый ответ
+MAGIC = b'CATSNAP1'
+COLUMNS = (('product_id', 'q'), ('price', 'q'), ('stock', 'q'), ('category_id', 'q'), ('rating', 'd'))
+LIST_KEYS = tuple(column.key for column in PRODUCT_LIST_COLUMNS)
+STREAM_CHUNK = 10_000
+# Сколько готовых тел ответов (каталог, категории) держит один снапшот
+MAX_CACHED_BODIES = 512
+
+
+def append_rows(rows, columns: dict[str, array], offsets: array, rows_file) -> None:
+    chunk = []
+    for row in rows:
+        line = orjson.dumps({key: row[key] for key in LIST_KEYS}) + b','
+        chunk.append(line)
+        offsets.append(offsets[-1] + len(line))
+        columns['product_id'].append(row['id'])
+        columns['price'].append(row['price'] or 0)
+        columns['stock'].append(row['stock'] or 0)
+        columns['category_id'].append(row['category_id'] or 0)
+        columns['rating'].append(row['rating'] or 0.0)
+    rows_file.write(b''.join(chunk))
+
+
+def assemble(path: str, categories: list[dict], columns: dict[str, array], offsets: array, rows_path: str) -> None:
+    category_column = columns['category_id']
+    header = {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'products': len(category_column),
+        # Товары отсортированы по category_id: у каждой категории свой непрерывный диапазон
+        'categories': [{**category,
+                        'start': bisect_left(category_column, category['id']),
+                        'end': bisect_right(category_column, category['id'])} for category in categories],
+        'sections': {},
+    }
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(MAGIC)
+        for name, values in [*columns.items(), ('row_offsets', offsets)]:
+            header['sections'][name] = [file.tell(), len(values), values.typecode]
+            values.tofile(file)
+        header['rows'] = [file.tell(), offsets[-1]]
+        with open(rows_path, 'rb') as rows_file:
+            while block := rows_file.read(1024 * 1024):
+                file.write(block)
+        encoded = json.dumps(header).encode()
+        file.write(encoded)
+        file.write(struct.pack('<Q', len(encoded)))
+        file.write(MAGIC)
+        file.flush()
+        os.fsync(file.fileno())
+    # Атомарная замена: читатели видят либо старый файл целиком, либо новый
+    os.replace(tmp_path, path)
+    os.remove(rows_path)
+
+
+async def build_catalog_snapshot(path: str) -> None:
+    columns = {name: array(typecode) for name, typecode in COLUMNS}
+    offsets = array('Q', [0])
+    rows_path = f'{path}.rows.tmp'
+    async with engine.connect() as connection:
+        categories = await connection.execute(select(Category.id, Category.slug, Category.parent_id))
+        categories = [dict(category) for category in categories.mappings()]
+        result = await connection.stream(select(Product.id, *PRODUCT_LIST_COLUMNS)
+                                         .where(Product.is_active == True, Product.stock > 0)
+                                         .order_by(Product.category_id, Product.id))
+        with open(rows_path, 'wb') as rows_file:
+            async for rows in result.mappings().partitions(STREAM_CHUNK):
+                # Сериализация пачки — в пуле потоков, event loop воркера не блокируется
+                await run_in_threadpool(append_rows, rows, columns, offsets, rows_file)
+    await run_in_threadpool(assemble, path, categories, columns, offsets, rows_path)
+
+
+class CatalogSnapshot:
+    """Снапшот каталога, отображенный в память только для чтения.
+
+    Страницы файла общие для всех воркеров хоста; объект неизменяем, поэтому
+    запрос, взявший ссылку на снапшот, видит согласованные данные до конца.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as file:
+            self.mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self.mm)
+        if view[:8] != MAGIC or view[-8:] != MAGIC:
+            raise ValueError(f'{path} is not a catalog snapshot')
+        header_size = struct.unpack('<Q', view[-16:-8])[0]
+        header = json.loads(bytes(view[-16 - header_size:-16]))
+        self.generated_at = datetime.fromisoformat(header['generated_at'])
+        self.columns = {name: view[offset:offset + count * array(typecode).itemsize].cast(typecode)
+                        for name, (offset, count, typecode) in header['sections'].items()}
+        rows_offset, rows_size = header['rows']
+        self.rows = view[rows_offset:rows_offset + rows_size]
+        self.categories = {category['slug']: category for category in header['categories']}
+        self.children: dict[int, list[dict]] = {}
+        for category in header['categories']:
+            if category['parent_id'] is not None:
+                self.children.setdefault(category['parent_id'], []).append(category)
+        self.bodies: dict[str, CachedBody] = {}
+        # listing() вызывается из пула потоков: кэш тел общий для всех потоков
+        self.bodies_lock = threading.Lock()
+
+    def ranges_for(self, category_slug: str | None) -> list[tuple[int, int]] | None:
+        if category_slug is None:
+            return [(0, len(self.columns['category_id']))]
+        category = self.categories.get(category_slug)
+        if category is None:
+            return None
+        # Как и в ProductService: сама категория и ее прямые подкатегории
+        return [(item['start'], item['end']) for item in [category, *self.children.get(category['id'], [])]]
+
+    def render(self, indexes_or_ranges) -> bytes:
+        offsets = self.columns['row_offsets']
+        parts = [self.rows[offsets[start]:offsets[end] - 1] for start, end in indexes_or_ranges if end > start]
+        return b'[' + b','.join(parts) + b']'
+
+    def listing(self, category_slug: str | None = None, min_price: int | None = None,
+                max_price: int | None = None, min_rating: float | None = None) -> CachedBody | None:
+        ranges = self.ranges_for(category_slug)
+        if ranges is None:
+            return None
+        if min_price is None and max_price is None and min_rating is None:
+            key = category_slug or ''
+            with self.bodies_lock:
+                body = self.bodies.get(key)
+            if body is None:
+                # Сборка тела — вне блокировки; два потока могут собрать одно и то же, сохранится первое
+                rendered = CachedBody(self.render(ranges))
+                with self.bodies_lock:
+                    body = self.bodies.get(key)
+                    if body is None:
+                        if len(self.bodies) >= MAX_CACHED_BODIES:
+                            self.bodies.pop(next(iter(self.bodies)))
+                        body = self.bodies[key] = rendered
+            return body
+        return CachedBody(self.render(self.filter_ranges(ranges, min_price, max_price, min_rating)))
+
+    def filter_ranges(self, ranges: list[tuple[int, int]], min_price: int | None, max_price: int | None,
+                      min_rating: float | None) -> list[tuple[int, int]]:
+        # Фильтры проверяются по колонкам векторно, JSON строк не разбирается. numpy — только
+        # здесь: веб-воркер не загружает его при старте. Массивы — без копирования поверх mmap
+        import numpy as np
+
+        price = np.asarray(self.columns['price'])
+        rating = np.asarray(self.columns['rating'])
+        selected = []
+        for start, end in ranges:
+            mask = np.ones(end - start, dtype=bool)
+            if min_price is not None:
+                mask &= price[start:end] >= min_price
+            if max_price is not None:
+                mask &= price[start:end] <= max_price
+            if min_rating is not None:
+                mask &= rating[start:end] >= min_rating
+            # Подходящие строки склеиваются в непрерывные диапазоны: render копирует их целиком
+            edges = np.flatnonzero(np.diff(mask, prepend=False, append=False)) + start
+            selected.extend(zip(edges[0::2].tolist(), edges[1::2].tolist()))
+        return selected
+
+
+class SnapshotHolder:
+    # Текущий снапшот воркера; замена — одно присваивание ссылки
+    def __init__(self, path: str):
+        self.path = path
+        self.current: CatalogSnapshot | None = None
+        self.file_key: tuple[int, int] | None = None
+
+    def refresh(self) -> bool:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        file_key = (stat.st_ino, stat.st_mtime_ns)
+        if file_key == self.file_key:
+            return False
+        self.current = CatalogSnapshot(self.path)
+        self.file_key = file_key
+        return True
+
+    def is_stale(self, max_age: float) -> bool:
+        try:
+            return time.time() - os.stat(self.path).st_mtime > max_age
+        except FileNotFoundError:
+            return True
+
+    async def rebuild_if_stale(self, max_age: float) -> bool:
+        # Строит один воркер на хосте: остальные не получат flock и просто подхватят файл
+        if not self.is_stale(max_age):
+            return False
+        with open(f'{self.path}.lock', 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            if not self.is_stale(max_age):
+                return False
+            await build_catalog_snapshot(self.path)
+            return True
+
+
+catalog_snapshots = SnapshotHolder(CATALOG_SNAPSHOT_PATH)
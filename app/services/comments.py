@@ -0,0 +1,75 @@
+import base64
+from datetime import datetime
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.backend.db import fetch_rows
+from app.models.comments import GRADES, Comment, ProductGradeHistogram
+
+
+# Колонки для списков комментариев: совпадают с полями GetComment
+COMMENT_LIST_COLUMNS = (Comment.id, Comment.user_id, Comment.product_id,
+                        Comment.comment, Comment.comment_dt, Comment.grade)
+HISTOGRAM_COLUMNS = tuple(getattr(ProductGradeHistogram, f'grade_{grade}') for grade in GRADES)
+
+
+def encode_cursor(comment_dt: datetime, comment_id: int) -> str:
+    return base64.urlsafe_b64encode(f'{comment_dt.isoformat()}|{comment_id}'.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        comment_dt, comment_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(comment_dt), int(comment_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Invalid cursor'
+        )
+
+
+async def fetch_comment_page(session: AsyncSession, limit: int, cursor: str | None,
+                             product_id: int | None = None) -> dict:
+    # Keyset-пагинация: (comment_dt, id) < курсора, без OFFSET, поэтому каждая страница —
+    # короткий проход по индексу независимо от глубины
+    query = select(*COMMENT_LIST_COLUMNS).where(Comment.is_active == True)
+    if product_id is not None:
+        query = query.where(Comment.product_id == product_id)
+    if cursor is not None:
+        query = query.where(tuple_(Comment.comment_dt, Comment.id) < decode_cursor(cursor))
+    rows = await fetch_rows(session, query.order_by(Comment.comment_dt.desc(), Comment.id.desc())
+                                          .limit(limit + 1))
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['comment_dt'], rows[-1]['id'])
+    return {'items': rows, 'next_cursor': next_cursor}
+
+
+def histogram_counts(row: dict) -> list[int]:
+    # Для товара без комментариев строки гистограммы нет: внешний join вернет NULL
+    return [row[column.key] or 0 for column in HISTOGRAM_COLUMNS]
+
+
+def rating_from_histogram(counts: list[int]) -> float:
+    total = sum(counts)
+    return sum(grade * count for grade, count in zip(GRADES, counts)) / total if total else 0.0
+
+
+async def apply_grade_change(session: AsyncSession, product_id: int,
+                             added: int | None = None, removed: int | None = None) -> list[int]:
+    # Инкрементальное обновление гистограммы одним upsert'ом; возвращает новые счетчики
+    deltas = {}
+    if added is not None:
+        deltas[f'grade_{added}'] = deltas.get(f'grade_{added}', 0) + 1
+    if removed is not None:
+        deltas[f'grade_{removed}'] = deltas.get(f'grade_{removed}', 0) - 1
+    table = ProductGradeHistogram.__table__
+    query = pg_insert(table).values(product_id=product_id, **{name: max(delta, 0) for name, delta in deltas.items()})
+    query = query.on_conflict_do_update(index_elements=[table.c.product_id],
+                                        set_={name: table.c[name] + delta for name, delta in deltas.items()})
+    result = await session.execute(query.returning(*HISTOGRAM_COLUMNS))
+    return list(result.one())
@@ -0,0 +1,131 @@
+from datetime import date, datetime, timezone
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+# На сколько месяцев вперед держим готовые секции comments
+PARTITION_MONTHS_AHEAD = 3
+# Сколько удаленных комментариев переносим в архив за одну транзакцию
+ARCHIVE_BATCH_SIZE = 1000
+# Диапазон id товаров, пересчитываемый за одну транзакцию
+RATING_BATCH_SIZE = 5000
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'comments_y{month.year}m{month.month:02d}'
+
+
+async def create_comment_partition(session: AsyncSession, name: str, month: date) -> None:
+    bounds = {'start': month, 'end': add_months(month, 1)}
+    values = f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    stray = await session.scalar(text('SELECT EXISTS (SELECT 1 FROM comments_default '
+                                      'WHERE comment_dt >= :start AND comment_dt < :end)'), bounds)
+    if not stray:
+        await session.execute(text(f'CREATE TABLE {name} PARTITION OF comments {values}'))
+        return
+    # Секция по умолчанию уже содержит строки этого месяца: с ней CREATE ... PARTITION OF
+    # падает. Отсоединяем ее, создаем секцию, переносим строки и присоединяем обратно —
+    # все в одной транзакции, читатели видят либо старое, либо новое разбиение
+    await session.execute(text('ALTER TABLE comments DETACH PARTITION comments_default'))
+    await session.execute(text(f'CREATE TABLE {name} PARTITION OF comments {values}'))
+    await session.execute(text(
+        'WITH moved AS ('
+        '    DELETE FROM comments_default WHERE comment_dt >= :start AND comment_dt < :end '
+        '    RETURNING id, user_id, product_id, comment, comment_dt, grade, is_active'
+        ') '
+        'INSERT INTO comments (id, user_id, product_id, comment, comment_dt, grade, is_active) '
+        'SELECT id, user_id, product_id, comment, comment_dt, grade, is_active FROM moved'), bounds)
+    await session.execute(text('ALTER TABLE comments ATTACH PARTITION comments_default DEFAULT'))
+
+
+async def ensure_comment_partitions(session: AsyncSession, months_ahead: int = PARTITION_MONTHS_AHEAD) -> list[str]:
+    # Заранее создаем секции на текущий и следующие месяцы, чтобы вставки
+    # не попадали в секцию по умолчанию
+    today = datetime.now(timezone.utc).date()
+    current = date(today.year, today.month, 1)
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        name = partition_name(month)
+        exists = await session.scalar(text('SELECT to_regclass(:name) IS NOT NULL'), {'name': name})
+        if exists:
+            continue
+        # Каждая секция — своя транзакция: ошибка одной не мешает остальным и архивации
+        try:
+            await create_comment_partition(session, name, month)
+            await session.commit()
+        except DBAPIError as ex:
+            await session.rollback()
+            logger.error(f'Failed to create comment partition {name}: {ex!r}')
+            continue
+        created.append(name)
+    await session.commit()
+    return created
+
+
+async def archive_inactive_comments(session: AsyncSession, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    # Перенос удаленных комментариев в архив одним запросом на пачку:
+    # горячие секции остаются маленькими, vacuum по ним дешевый
+    moved = await session.execute(text(
+        'WITH moved AS ('
+        '    DELETE FROM comments WHERE (id, comment_dt) IN ('
+        '        SELECT id, comment_dt FROM comments WHERE NOT is_active '
+        '        LIMIT :batch_size FOR UPDATE SKIP LOCKED)'
+        '    RETURNING id, user_id, product_id, comment, comment_dt, grade'
+        ') '
+        'INSERT INTO comments_archive (id, user_id, product_id, comment, comment_dt, grade, archived_at) '
+        'SELECT id, user_id, product_id, comment, comment_dt, grade, now() FROM moved'), {'batch_size': batch_size})
+    await session.commit()
+    return moved.rowcount
+
+
+async def recompute_product_ratings(session: AsyncSession, batch_size: int = RATING_BATCH_SIZE) -> int:
+    # Сверка инкрементальных гистограмм с комментариями и пересчет рейтинга
+    # диапазонами id товаров. Строки гистограмм диапазона блокируются до агрегации:
+    # параллельный add_comment дождется коммита и добавит свою дельту поверх
+    last_id = await session.scalar(text('SELECT max(id) FROM products')) or 0
+    fixed = 0
+    for start in range(0, last_id + 1, batch_size):
+        bounds = {'start': start, 'end': start + batch_size}
+        await session.execute(text('SELECT product_id FROM product_grade_histograms '
+                                   'WHERE product_id >= :start AND product_id < :end '
+                                   'ORDER BY product_id FOR UPDATE'), bounds)
+        result = await session.execute(text(
+            'INSERT INTO product_grade_histograms (product_id, grade_0, grade_1, grade_2, grade_3, grade_4, grade_5) '
+            'SELECT p.id, '
+            '       count(c.id) FILTER (WHERE c.grade = 0), count(c.id) FILTER (WHERE c.grade = 1), '
+            '       count(c.id) FILTER (WHERE c.grade = 2), count(c.id) FILTER (WHERE c.grade = 3), '
+            '       count(c.id) FILTER (WHERE c.grade = 4), count(c.id) FILTER (WHERE c.grade = 5) '
+            'FROM products p LEFT JOIN comments c ON c.product_id = p.id AND c.is_active '
+            'WHERE p.id >= :start AND p.id < :end '
+            'GROUP BY p.id '
+            # Нулевые строки заводим только взамен существующих, а не для каждого товара
+            'HAVING count(c.id) > 0 OR p.id IN (SELECT product_id FROM product_grade_histograms '
+            '                                   WHERE product_id >= :start AND product_id < :end) '
+            'ON CONFLICT (product_id) DO UPDATE SET '
+            '    grade_0 = excluded.grade_0, grade_1 = excluded.grade_1, grade_2 = excluded.grade_2, '
+            '    grade_3 = excluded.grade_3, grade_4 = excluded.grade_4, grade_5 = excluded.grade_5 '
+            'WHERE (product_grade_histograms.grade_0, product_grade_histograms.grade_1, '
+            '       product_grade_histograms.grade_2, product_grade_histograms.grade_3, '
+            '       product_grade_histograms.grade_4, product_grade_histograms.grade_5) '
+            '    IS DISTINCT FROM (excluded.grade_0, excluded.grade_1, excluded.grade_2, '
+            '                      excluded.grade_3, excluded.grade_4, excluded.grade_5)'), bounds)
+        fixed += result.rowcount
+        await session.execute(text(
+            'UPDATE products p SET rating = r.rating '
+            'FROM (SELECT product_id, '
+            '             coalesce((grade_1 + 2 * grade_2 + 3 * grade_3 + 4 * grade_4 + 5 * grade_5)::float '
+            '                      / nullif(grade_0 + grade_1 + grade_2 + grade_3 + grade_4 + grade_5, 0), 0) AS rating '
+            '      FROM product_grade_histograms '
+            '      WHERE product_id >= :start AND product_id < :end) r '
+            'WHERE p.id = r.product_id AND p.rating IS DISTINCT FROM r.rating'), bounds)
+        await session.commit()
+    return fixed
@@ -0,0 +1,96 @@
+"""Обработка изображений в процессах ProcessPoolExecutor.
+
+Модуль импортируется дочерними процессами, поэтому зависит только от Pillow и
+стандартной библиотеки: приложение, БД и настройки в процессах не нужны.
+Pillow импортируется внутри функций: веб-воркеру нужны только пути к файлам.
+"""
+import io
+import os
+import tempfile
+import warnings
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+
+ORIGINAL_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+
+
+def shard_path(digest: str) -> str:
+    # Двухуровневое дерево каталогов, чтобы в одном каталоге не было миллионов файлов
+    return os.path.join(digest[:2], digest[2:4], digest)
+
+
+def thumbnail_paths(digest: str, sizes: dict[str, int]) -> dict[str, dict[str, str]]:
+    base = os.path.join('thumbs', shard_path(digest))
+    return {name: {'webp': f'{base}_{size}.webp', 'jpeg': f'{base}_{size}.jpg'} for name, size in sizes.items()}
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    # Одинаковые загрузки параллельно пишут одинаковые файлы: os.replace делает это безопасным.
+    # Имя временного файла уникально и между репликами с общим томом (PID у них совпадают)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        # mkstemp создает файл с правами 0600, а раздает его nginx
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def encode(image: 'Image.Image', image_format: str) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    if image_format == 'JPEG':
+        if image.mode != 'RGB':
+            # Прозрачность в JPEG невозможна: подкладываем белый фон
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+            image = background
+        image.save(buffer, 'JPEG', quality=85, optimize=True, progressive=True)
+    else:
+        image.save(buffer, 'WEBP', quality=80, method=4)
+    return buffer.getvalue()
+
+
+def process_image(data: bytes, digest: str, root: str, sizes: dict[str, int], max_pixels: int) -> dict:
+    """Проверяет изображение, сохраняет оригинал и уменьшенные копии WebP и JPEG.
+
+    Возвращает пути относительно root. ValueError — файл не является поддерживаемым
+    изображением или слишком велик по числу пикселей.
+    """
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', Image.DecompressionBombWarning)
+        try:
+            image = Image.open(io.BytesIO(data))
+            image_format = image.format
+            if image_format not in ORIGINAL_EXTENSIONS:
+                raise ValueError(f'Unsupported image format: {image_format}')
+            image.load()
+        except (OSError, Image.DecompressionBombError, Image.DecompressionBombWarning) as ex:
+            raise ValueError(f'Invalid image: {ex}')
+    original = os.path.join('originals', f'{shard_path(digest)}.{ORIGINAL_EXTENSIONS[image_format]}')
+    write_atomic(os.path.join(root, original), data)
+
+    # Поворот по EXIF, затем метаданные (в том числе геометки) в копии не попадают
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or 'A' in image.getbands() else 'RGB')
+    thumbnails = thumbnail_paths(digest, sizes)
+    for name, size in sizes.items():
+        thumbnail = image.copy()
+        # thumbnail() сохраняет пропорции и не увеличивает маленькие изображения
+        thumbnail.thumbnail((size, size), Image.Resampling.LANCZOS)
+        write_atomic(os.path.join(root, thumbnails[name]['webp']), encode(thumbnail, 'WEBP'))
+        write_atomic(os.path.join(root, thumbnails[name]['jpeg']), encode(thumbnail, 'JPEG'))
+    return {'original': original, 'thumbnails': thumbnails, 'width': image.width, 'height': image.height}
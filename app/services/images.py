@@ -0,0 +1,144 @@
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import Depends, HTTPException, UploadFile, status
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.backend.db_depends import get_db
+from app.backend.rate_limit import AdmissionLimiter
+from app.models import *
+from app.routers.auth import CurrentUserDep
+from app.schemas import OutputImage
+from app.services.image_processing import ORIGINAL_EXTENSIONS, process_image, shard_path, thumbnail_paths
+from settings import (IMAGE_MAX_BYTES, IMAGE_MAX_PENDING, IMAGE_MAX_PIXELS, IMAGE_PROCESS_WORKERS,
+                      MEDIA_ROOT, MEDIA_URL)
+
+
+# Стороны квадрата, в который вписывается уменьшенная копия
+THUMBNAIL_SIZES = {'small': 160, 'medium': 480, 'large': 1024}
+# Эта копия становится image_url товара: JPEG открывается везде
+PRODUCT_IMAGE_SIZE = 'medium'
+READ_CHUNK = 1024 * 1024
+
+image_admission = AdmissionLimiter(IMAGE_MAX_PENDING)
+_executor: ProcessPoolExecutor | None = None
+
+
+def image_executor() -> ProcessPoolExecutor:
+    # spawn, а не fork: у воркера есть потоки (лог, профилировщик), форк с ними небезопасен
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_PROCESS_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+def shutdown_image_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def discard_image_executor(executor: ProcessPoolExecutor) -> None:
+    # Процесс пула умер (например, OOM на большом изображении) — пул сломан навсегда,
+    # следующая загрузка создаст новый. Проверка, чтобы не закрыть уже пересозданный пул
+    global _executor
+    if _executor is executor:
+        _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def media_url(path: str) -> str:
+    return f'{MEDIA_URL}/{path}'
+
+
+def stored_image(digest: str) -> dict | None:
+    # Дедупликация: такое содержимое уже загружали — файлы на месте, обработка не нужна
+    thumbnails = thumbnail_paths(digest, THUMBNAIL_SIZES)
+    if not all(os.path.exists(os.path.join(MEDIA_ROOT, path))
+               for variants in thumbnails.values() for path in variants.values()):
+        return None
+    for extension in ORIGINAL_EXTENSIONS.values():
+        original = os.path.join('originals', f'{shard_path(digest)}.{extension}')
+        if os.path.exists(os.path.join(MEDIA_ROOT, original)):
+            return {'original': original, 'thumbnails': thumbnails}
+    return None
+
+
+class ProductImageService:
+    def __init__(self, session: AsyncSession = Depends(get_db)):
+        self.session = session
+
+    async def read_upload(self, upload: UploadFile) -> tuple[bytes, str]:
+        digest = hashlib.sha256()
+        chunks, size = [], 0
+        while chunk := await upload.read(READ_CHUNK):
+            size += len(chunk)
+            if size > IMAGE_MAX_BYTES:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f'Image must not exceed {IMAGE_MAX_BYTES} bytes'
+                )
+            digest.update(chunk)
+            chunks.append(chunk)
+        if not size:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail='Empty file'
+            )
+        return b''.join(chunks), digest.hexdigest()
+
+    async def upload_image(self, upload: UploadFile, get_user: CurrentUserDep,
+                           product_slug: str | None = None) -> OutputImage:
+        if get_user.user_role == 'is_customer':
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail='You are not authorized to use this method'
+            )
+        data, digest = await self.read_upload(upload)
+        stored = stored_image(digest)
+        if stored is None:
+            # Декодирование и ресайз — в пуле процессов, event loop воркера свободен
+            executor = image_executor()
+            try:
+                stored = await image_admission.run_in(executor, process_image, data, digest,
+                                                      MEDIA_ROOT, THUMBNAIL_SIZES, IMAGE_MAX_PIXELS)
+            except ValueError as ex:
+                raise HTTPException(
+                    status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                    detail=str(ex)
+                )
+            except BrokenProcessPool:
+                discard_image_executor(executor)
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail='Image processing failed, try again later'
+                )
+        thumbnails = {name: {kind: media_url(path) for kind, path in variants.items()}
+                      for name, variants in stored['thumbnails'].items()}
+        if product_slug is not None:
+            query = (update(Product)
+                     .where(Product.slug == product_slug, Product.is_active == True)
+                     .values(image_url=thumbnails[PRODUCT_IMAGE_SIZE]['jpeg'])
+                     .returning(Product.id)
+                     .execution_options(synchronize_session=False))
+            if get_user.user_role != 'is_admin':
+                query = query.where(Product.supplier_id == get_user.id)
+            if await self.session.scalar(query) is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail='There is no product found'
+                )
+            await self.session.commit()
+        return {
+            'status_code': status.HTTP_201_CREATED,
+            'message': 'Image uploaded',
+            'hash': digest,
+            'original': media_url(stored['original']),
+            'thumbnails': thumbnails
+        }
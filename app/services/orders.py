@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import Integer, column, func, insert, select, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.backend.db_depends import get_db
+from app.models import *
+from app.models.orders import Order, OrderItem, OrderStatus
+from app.schemas import CartItem, GetUser, OutputModel
+from settings import ORDER_RESERVATION_MINUTES
+
+
+# Сколько просроченных заказов sweeper освобождает за одну транзакцию
+SWEEP_BATCH_SIZE = 500
+
+
+def merge_cart(items: list[CartItem]) -> list[tuple[int, int]]:
+    # Одинаковые товары складываем, строки сортируем по product_id:
+    # все транзакции берут блокировки строк products в одном порядке, поэтому
+    # встречные корзины [A, B] и [B, A] не дают дедлоков
+    quantities: dict[int, int] = {}
+    for item in items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    return sorted(quantities.items())
+
+
+class OrderService:
+    def __init__(self, session: AsyncSession = Depends(get_db)):
+        self.session = session
+
+    async def reserve_stock(self, product_id: int, quantity: int) -> int | None:
+        # Условный атомарный декремент: проверка остатка и списание в одном UPDATE,
+        # поэтому при конкурентных покупках оверселл невозможен
+        return await self.session.scalar(update(Product)
+                                         .where(
+                                             Product.id == product_id,
+                                             Product.is_active == True,
+                                             Product.stock >= quantity)
+                                         .values(stock=Product.stock - quantity)
+                                         .returning(Product.price)
+                                         .execution_options(synchronize_session=False))
+
+    async def checkout(self, items: list[CartItem], get_user: GetUser) -> Order:
+        lines = []
+        for product_id, quantity in merge_cart(items):
+            price = await self.reserve_stock(product_id, quantity)
+            if price is None:
+                # Откат возвращает уже зарезервированные строки корзины
+                await self.session.rollback()
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f'Not enough stock for product {product_id}'
+                )
+            lines.append({'product_id': product_id, 'quantity': quantity, 'price': price})
+
+        order_id = await self.session.scalar(insert(Order)
+                                             .values(
+                                                 user_id=get_user.id,
+                                                 status=OrderStatus.RESERVED,
+                                                 total=sum(line['price'] * line['quantity'] for line in lines),
+                                                 created_at=datetime.now(timezone.utc),
+                                                 reserved_until=datetime.now(timezone.utc)
+                                                 + timedelta(minutes=ORDER_RESERVATION_MINUTES))
+                                             .returning(Order.id))
+        await self.session.execute(insert(OrderItem), [{'order_id': order_id, **line} for line in lines])
+        await self.session.commit()
+        return await self.get_order(order_id, get_user)
+
+    async def get_order(self, order_id: int, get_user: GetUser) -> Order:
+        order = await self.session.scalar(select(Order)
+                                          .options(selectinload(Order.items))
+                                          .where(Order.id == order_id, Order.user_id == get_user.id)
+                                          .execution_options(populate_existing=True))
+        if order is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='Order not found'
+            )
+        return order
+
+    async def get_user_orders(self, get_user: GetUser) -> list[Order]:
+        orders = await self.session.scalars(select(Order)
+                                            .options(selectinload(Order.items))
+                                            .where(Order.user_id == get_user.id)
+                                            .order_by(Order.id.desc()))
+        return orders.all()
+
+    async def pay_order(self, order_id: int, get_user: GetUser) -> OutputModel:
+        paid = await self.session.scalar(update(Order)
+                                         .where(
+                                             Order.id == order_id,
+                                             Order.user_id == get_user.id,
+                                             Order.status == OrderStatus.RESERVED,
+                                             Order.reserved_until > datetime.now(timezone.utc))
+                                         .values(status=OrderStatus.PAID)
+                                         .returning(Order.id)
+                                         .execution_options(synchronize_session=False))
+        if paid is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail='Order is not reserved or reservation has expired'
+            )
+        await self.session.commit()
+        return {
+            'status_code': status.HTTP_200_OK,
+            'message': 'Order is paid'
+        }
+
+    async def cancel_order(self, order_id: int, get_user: GetUser) -> OutputModel:
+        cancelled = await self.session.scalars(update(Order)
+                                               .where(
+                                                   Order.id == order_id,
+                                                   Order.user_id == get_user.id,
+                                                   Order.status == OrderStatus.RESERVED)
+                                               .values(status=OrderStatus.CANCELLED)
+                                               .returning(Order.id)
+                                               .execution_options(synchronize_session=False))
+        cancelled = cancelled.all()
+        if not cancelled:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail='Only reserved orders can be cancelled'
+            )
+        await self.release_stock(cancelled)
+        await self.session.commit()
+        return {
+            'status_code': status.HTTP_200_OK,
+            'message': 'Order is cancelled'
+        }
+
+    async def release_stock(self, order_ids: list[int]) -> None:
+        quantities = await self.session.execute(select(OrderItem.product_id, func.sum(OrderItem.quantity))
+                                                .where(OrderItem.order_id.in_(order_ids))
+                                                .group_by(OrderItem.product_id)
+                                                .order_by(OrderItem.product_id))
+        quantities = quantities.all()
+        if not quantities:
+            return
+        # Блокируем строки в том же порядке по id, что и checkout
+        await self.session.execute(select(Product.id)
+                                   .where(Product.id.in_([product_id for product_id, _ in quantities]))
+                                   .order_by(Product.id)
+                                   .with_for_update())
+        released = values(column('product_id', Integer), column('quantity', Integer),
+                          name='released').data([tuple(row) for row in quantities])
+        await self.session.execute(update(Product)
+                                   .where(Product.id == released.c.product_id)
+                                   .values(stock=Product.stock + released.c.quantity)
+                                   .execution_options(synchronize_session=False))
+
+    async def release_expired(self, batch_size: int = SWEEP_BATCH_SIZE) -> int:
+        # SKIP LOCKED: несколько воркеров могут подметать одновременно, не мешая друг другу
+        expired = select(Order.id).where(Order.status == OrderStatus.RESERVED,
+                                         Order.reserved_until < datetime.now(timezone.utc)) \
+                                  .order_by(Order.id) \
+                                  .limit(batch_size) \
+                                  .with_for_update(skip_locked=True)
+        order_ids = await self.session.scalars(update(Order)
+                                               .where(Order.id.in_(expired.scalar_subquery()))
+                                               .values(status=OrderStatus.EXPIRED)
+                                               .returning(Order.id)
+                                               .execution_options(synchronize_session=False))
+        order_ids = order_ids.all()
+        if order_ids:
+            await self.release_stock(order_ids)
+        await self.session.commit()
+        return len(order_ids)
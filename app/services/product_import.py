@@ -0,0 +1,175 @@
+import codecs
+import csv
+import json
+from typing import BinaryIO, Iterator
+
+from fastapi import Depends, HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from slugify import slugify
+from sqlalchemy import String, any_, bindparam, select, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.backend.db_depends import get_db
+from app.models import *
+from app.routers.auth import CurrentUserDep
+from app.schemas import CreateProduct, ImportRowError, OutputImport
+
+
+IMPORT_COLUMNS = ['line', 'name', 'slug', 'description', 'price', 'image_url', 'stock', 'category_id']
+
+
+def detect_format(upload: UploadFile) -> str:
+    filename = (upload.filename or '').lower()
+    content_type = upload.content_type or ''
+    if filename.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type:
+        return 'ndjson'
+    if filename.endswith('.csv') or content_type in ('text/csv', 'application/csv'):
+        return 'csv'
+    raise HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail='Upload a .csv or .ndjson file'
+    )
+
+
+def iter_raw_rows(file: BinaryIO, file_format: str) -> Iterator[tuple[int, dict | None, str | None]]:
+    # Файл читается построчно, целиком в память не загружается
+    lines = codecs.iterdecode(file, 'utf-8-sig')
+    if file_format == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as ex:
+            yield line_no, None, f'Invalid JSON: {ex.msg}'
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, 'Row must be a JSON object'
+            continue
+        yield line_no, row, None
+
+
+def parse_upload(file: BinaryIO, file_format: str) -> tuple[list[tuple[int, CreateProduct]], list[ImportRowError]]:
+    valid, errors = [], []
+    try:
+        for line_no, row, error in iter_raw_rows(file, file_format):
+            if error is not None:
+                errors.append(ImportRowError(line=line_no, error=error))
+                continue
+            try:
+                valid.append((line_no, CreateProduct.model_validate(row)))
+            except ValidationError as ex:
+                message = '; '.join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in ex.errors())
+                errors.append(ImportRowError(line=line_no, error=message))
+    # Файл целиком нечитаем: дальше строк не разобрать, отвечаем ошибкой запроса
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='File must be UTF-8 encoded'
+        )
+    except csv.Error as ex:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'Invalid CSV: {ex}'
+        )
+    return valid, errors
+
+
+class ProductImportService:
+    def __init__(self, session: AsyncSession = Depends(get_db)):
+        self.session = session
+
+    async def resolve_categories(self, category_ids: set[int]) -> set[int]:
+        categories = await self.session.scalars(select(Category.id)
+                                                .where(
+                                                    Category.id.in_(category_ids),
+                                                    Category.is_active == True))
+        return set(categories.all())
+
+    async def assign_slugs(self, names: list[str]) -> list[str]:
+        # Слаги генерируются пачкой: занятые в базе и повторы внутри файла
+        # получают суффикс -2, -3, ...; каждая итерация — один запрос
+        bases = [slugify(name) for name in names]
+        slugs = list(bases)
+        suffixes = [1] * len(bases)
+        pending = list(range(len(slugs)))
+        taken: set[str] = set()
+        # Массив одним параметром: IN со списком упирается в лимит параметров asyncpg
+        query = select(Product.slug).where(Product.slug == any_(bindparam('slugs', type_=ARRAY(String))))
+        while pending:
+            existing = await self.session.scalars(query, {'slugs': list({slugs[i] for i in pending})})
+            existing = set(existing.all())
+            conflicts = []
+            for i in pending:
+                if slugs[i] in existing or slugs[i] in taken:
+                    suffixes[i] += 1
+                    slugs[i] = f'{bases[i]}-{suffixes[i]}'
+                    conflicts.append(i)
+                else:
+                    taken.add(slugs[i])
+            pending = conflicts
+        return slugs
+
+    async def copy_and_merge(self, records: list[tuple], supplier_id: int) -> set[str]:
+        connection = await self.session.connection()
+        await connection.execute(text('CREATE TEMP TABLE products_import ('
+                                      'line integer, name text, slug text, description text, price integer, '
+                                      'image_url text, stock integer, category_id integer) ON COMMIT DROP'))
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table('products_import',
+                                                                     records=records,
+                                                                     columns=IMPORT_COLUMNS)
+        inserted = await connection.execute(text(
+            'INSERT INTO products (name, slug, description, price, image_url, stock, '
+            'category_id, supplier_id, rating, is_active) '
+            'SELECT name, slug, description, price, image_url, stock, category_id, :supplier_id, 0.0, true '
+            'FROM products_import ORDER BY line '
+            'ON CONFLICT (slug) DO NOTHING '
+            'RETURNING slug'), {'supplier_id': supplier_id})
+        return set(inserted.scalars().all())
+
+    async def import_products(self, upload: UploadFile, get_user: CurrentUserDep) -> OutputImport:
+        if get_user.user_role == 'is_customer':
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail='You are not authorized to use this method'
+            )
+        file_format = detect_format(upload)
+        # Парсинг и валидация — CPU-работа, уводим ее из event loop
+        valid, errors = await run_in_threadpool(parse_upload, upload.file, file_format)
+
+        active_categories = await self.resolve_categories({product.category_id for _, product in valid})
+        rows = []
+        for line_no, product in valid:
+            if product.category_id in active_categories:
+                rows.append((line_no, product))
+            else:
+                errors.append(ImportRowError(line=line_no, error='There is no category found'))
+
+        imported = 0
+        if rows:
+            slugs = await self.assign_slugs([product.name for _, product in rows])
+            records = [(line_no, product.name, slug, product.description, product.price,
+                        product.image_url, product.stock, product.category_id)
+                       for (line_no, product), slug in zip(rows, slugs)]
+            inserted = await self.copy_and_merge(records, get_user.id)
+            await self.session.commit()
+            imported = len(inserted)
+            # Слаг мог занять параллельный запрос между проверкой и вставкой
+            errors.extend(ImportRowError(line=record[0], error=f'Slug {record[2]} is already taken')
+                          for record in records if record[2] not in inserted)
+
+        errors.sort(key=lambda error: error.line)
+        return {
+            'status_code': status.HTTP_201_CREATED,
+            'message': 'Import finished',
+            'imported': imported,
+            'rejected': len(errors),
+            'errors': errors
+        }
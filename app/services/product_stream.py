@@ -0,0 +1,114 @@
+import asyncio
+
+import aio_pika
+import orjson
+from loguru import logger
+
+from app.backend.metrics import metrics
+from settings import PRODUCT_EVENTS_EXCHANGE, RABBITMQ_URL, SSE_CLIENT_QUEUE_SIZE
+
+
+# Поля, которые уходят клиентам SSE; остальные изменения товара им не интересны
+STREAM_FIELDS = ('stock', 'price', 'is_active')
+# Пауза перед повторным подключением, если брокер недоступен
+RECONNECT_SECONDS = 5
+
+
+class Subscriber:
+    def __init__(self, product_ids: set[int], queue_size: int):
+        self.product_ids = product_ids
+        self.queue: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+
+def sse_message(event: str, data: dict) -> bytes:
+    return b'event: ' + event.encode() + b'\ndata: ' + orjson.dumps(data) + b'\n\n'
+
+
+class ProductStreamHub:
+    """Раздача изменений остатков и цен клиентам SSE внутри воркера.
+
+    Из брокера воркер читает одну очередь (эксклюзивную, привязанную к обменнику
+    событий товаров), а не по очереди на клиента. У каждого клиента ограниченный
+    буфер: если клиент не успевает читать, он отключается и переподключается
+    заново, а не копит память воркера.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.subscribers: dict[int, set[Subscriber]] = {}
+        self.clients = 0
+
+    def subscribe(self, product_ids: set[int]) -> Subscriber:
+        subscriber = Subscriber(product_ids, self.queue_size)
+        for product_id in product_ids:
+            self.subscribers.setdefault(product_id, set()).add(subscriber)
+        self.clients += 1
+        metrics.set('sse_clients', self.clients)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        for product_id in subscriber.product_ids:
+            subscribers = self.subscribers.get(product_id)
+            if subscribers is None or subscriber not in subscribers:
+                continue
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.subscribers[product_id]
+        self.clients -= 1
+        metrics.set('sse_clients', self.clients)
+
+    def drop(self, subscriber: Subscriber) -> None:
+        # Буфер полон: очищаем его и оставляем только сигнал конца потока
+        subscriber.dropped = True
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+        metrics.inc('sse_dropped_clients_total')
+
+    def publish(self, event: dict) -> None:
+        subscribers = self.subscribers.get(event['id'])
+        if not subscribers:
+            return
+        if event['event'] == 'deleted':
+            message = sse_message('deleted', {'id': event['id'], 'version': event['version']})
+        else:
+            data = {key: value for key, value in event['data'].items() if key in STREAM_FIELDS}
+            if not data:
+                return
+            message = sse_message('product', {'id': event['id'], 'version': event['version'], **data})
+        for subscriber in subscribers:
+            if subscriber.dropped:
+                continue
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.drop(subscriber)
+
+    async def consume(self) -> None:
+        # aio_pika сам переподключается; очередь без имени и exclusive — у каждого воркера своя
+        connection = await aio_pika.connect_robust(RABBITMQ_URL)
+        async with connection:
+            channel = await connection.channel()
+            exchange = await channel.declare_exchange(PRODUCT_EVENTS_EXCHANGE, aio_pika.ExchangeType.TOPIC,
+                                                      durable=True)
+            queue = await channel.declare_queue(exclusive=True, auto_delete=True)
+            await queue.bind(exchange, routing_key='product.updated')
+            await queue.bind(exchange, routing_key='product.deleted')
+            async with queue.iterator(no_ack=True) as messages:
+                async for message in messages:
+                    try:
+                        self.publish(orjson.loads(message.body))
+                    except Exception as ex:
+                        logger.error(f'Product stream event failed: {ex}')
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.consume()
+            except Exception as ex:
+                logger.error(f'Product stream consumer failed: {ex}')
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+
+product_stream = ProductStreamHub(SSE_CLIENT_QUEUE_SIZE)
@@ -1,12 +1,35 @@
 from fastapi import Depends, HTTPException, status
 from slugify import slugify
-from sqlalchemy import insert, select, update
+from sqlalchemy import Integer, String, case, cast, column, exists, func, insert, literal, select, true, update, values
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
+from app.backend.db import fetch_rows
 from app.backend.db_depends import get_db
 from app.models import *
+from app.models.recommendations import ProductRecommendation
 from app.routers.auth import CurrentUserDep
-from app.schemas import CreateProduct, OutputProduct, UpdateProduct
+from app.schemas import (CreateProduct, OutputBulkUpdate, OutputProduct, RejectedChange,
+                         StockPriceChange, UpdateProduct)
+
+
+# Колонки для списков товаров: совпадают с полями GetProduct
+PRODUCT_LIST_COLUMNS = (Product.name, Product.description, Product.price, Product.image_url,
+                        Product.stock, Product.category_id, Product.slug, Product.rating)
+# Размер пачки для bulk-обновления: 4 параметра на строку, с запасом до лимита asyncpg
+BULK_UPDATE_BATCH_SIZE = 1000
+
+
+def listing_filters(min_price: int | None = None, max_price: int | None = None,
+                    min_rating: float | None = None) -> list:
+    conditions = []
+    if min_price is not None:
+        conditions.append(Product.price >= min_price)
+    if max_price is not None:
+        conditions.append(Product.price <= max_price)
+    if min_rating is not None:
+        conditions.append(Product.rating >= min_rating)
+    return conditions
 
 
 class ProductService:
@@ -26,13 +49,41 @@ class ProductService:
             )
         return product
     
-    async def get_all_products(self) -> list[Product]:
-        products = await self.session.scalars(select(Product).join(Category)
-                                              .where(
-                                                  Product.is_active == True,
-                                                  Category.is_active == True,
-                                                  Product.stock > 0))
-        products = products.all()
+    async def get_related_products(self, product_slug: str) -> list[dict]:
+        # Похожие товары одним запросом: массив id из рекомендаций разворачивается
+        # с порядковым номером и соединяется с products по первичному ключу
+        source = aliased(Product)
+        related = (func.unnest(ProductRecommendation.related_ids)
+                   .table_valued('id', with_ordinality='position')
+                   .render_derived(name='related')
+                   .lateral())
+        products = await fetch_rows(self.session, select(*PRODUCT_LIST_COLUMNS)
+                                    .select_from(source)
+                                    .join(ProductRecommendation, ProductRecommendation.product_id == source.id)
+                                    .join(related, true())
+                                    .join(Product, Product.id == related.c.id)
+                                    .where(
+                                        source.slug == product_slug,
+                                        Product.is_active == True,
+                                        Product.stock > 0)
+                                    .order_by(related.c.position))
+        if not products and await self.session.scalar(select(Product.id)
+                                                      .where(Product.slug == product_slug,
+                                                             Product.is_active == True)) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='There is no product found'
+            )
+        return products
+    
+    async def get_all_products(self, *filters) -> list[dict]:
+        # Товары удаленных категорий и поставщиков деактивирует каскадная задача,
+        # поэтому join с categories не нужен
+        products = await fetch_rows(self.session, select(*PRODUCT_LIST_COLUMNS)
+                                    .where(
+                                        Product.is_active == True,
+                                        Product.stock > 0,
+                                        *filters))
         if not products:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -40,7 +91,7 @@ class ProductService:
             )
         return products
     
-    async def get_products_by_category(self, category_slug: str) -> list[Product]:
+    async def get_products_by_category(self, category_slug: str, *filters) -> list[dict]:
         category = await self.session.scalar(select(Category)
                                              .where(Category.slug == category_slug))
         if category is None:
@@ -51,31 +102,56 @@ class ProductService:
         subcategories = await self.session.scalars(select(Category)
                                                    .where(Category.parent_id == category.id))
         category_ids = [category.id] + [subcat.id for subcat in subcategories.all()]
-        products = await self.session.scalars(select(Product)
-                                              .where(
-                                                  Product.category_id.in_(category_ids),
-                                                  Product.is_active == True,
-                                                  Product.stock > 0))
-        return products.all()
+        return await fetch_rows(self.session, select(*PRODUCT_LIST_COLUMNS)
+                                .where(
+                                    Product.category_id.in_(category_ids),
+                                    Product.is_active == True,
+                                    Product.stock > 0,
+                                    *filters))
     
+    async def _raise_write_error(self, product_slug: str, get_user: CurrentUserDep) -> None:
+        # Вызывается только когда UPDATE ... RETURNING ничего не вернул:
+        # выясняем причину, чтобы ответить тем же кодом, что и раньше
+        product = await self.session.execute(select(Product.supplier_id).where(Product.slug == product_slug))
+        product = product.first()
+        if product is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='There is no product found'
+            )
+        if not (get_user.id == product.supplier_id or get_user.user_role == 'is_admin'):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail='You have not enough permission for this action'
+            )
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='There is no category found'
+        )
+
     async def create_product(self, create_product: CreateProduct, get_user: CurrentUserDep) -> OutputProduct:
         if get_user.user_role == 'is_customer':
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail='You are not authorized to use this method'
             )
-        category = await self.session.scalar(select(Category)
-                                             .where(Category.id == create_product.category_id))
-        if category is None:
+        # Проверка категории и вставка одним запросом: INSERT ... SELECT FROM categories
+        product_data = {**create_product.model_dump(exclude={'category_id'}),
+                        'slug': slugify(create_product.name),
+                        'supplier_id': get_user.id}
+        product_id = await self.session.scalar(insert(Product)
+                                               .from_select(
+                                                   [*product_data, 'category_id'],
+                                                   select(*(literal(value) for value in product_data.values()),
+                                                          Category.id)
+                                                   .where(Category.id == create_product.category_id,
+                                                          Category.is_active == True))
+                                               .returning(Product.id))
+        if product_id is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail='There is no category found'
             )
-        await self.session.execute(insert(Product)
-                                   .values(
-                                       **create_product.model_dump(),
-                                        slug=slugify(create_product.name),
-                                        supplier_id = get_user.id))
         await self.session.commit()
         return {
             'status_code': status.HTTP_201_CREATED,
@@ -91,35 +167,24 @@ class ProductService:
             detail='You are not authorized to use this method'
             )
 
-        product_update = await self.session.scalar(select(Product).where(Product.slug == product_slug))
-        if product_update is None:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail='There is no product found'
-            )
-
-        if not (get_user.id == product_update.supplier_id or get_user.user_role == 'is_admin'):
-            raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail='You have not enough permission for this action'
-            )
-        category = await self.session.scalar(select(Category).where(Category.id == update_product_model.category_id))
-        if category is None:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail='There is no category found'
-            )
-        
+        values = update_product_model.model_dump(exclude_none=True)
         if update_product_model.name:
-            await self.session.execute(update(Product)
-                            .where(Product.id == product_update.id)
-                            .values(**update_product_model.model_dump(exclude_none=True),
-                                    slug=slugify(update_product_model.name)))
-        else:
-            await self.session.execute(update(Product)
-                            .where(Product.id == product_update.id)
-                            .values(**update_product_model.model_dump(exclude_none=True)))
-        
+            values['slug'] = slugify(update_product_model.name)
+        # Существование товара, права владельца и категории проверяются в самом UPDATE
+        query = (update(Product)
+                 .where(
+                     Product.slug == product_slug,
+                     exists().where(Category.id == update_product_model.category_id,
+                                    Category.is_active == True))
+                 .values(**values)
+                 .returning(Product.id)
+                 .execution_options(synchronize_session=False))
+        if get_user.user_role != 'is_admin':
+            query = query.where(Product.supplier_id == get_user.id)
+        product_id = await self.session.scalar(query)
+        if product_id is None:
+            await self._raise_write_error(product_slug, get_user)
+
         await self.session.commit()
         return {
             'status_code': status.HTTP_201_CREATED,
@@ -134,20 +199,95 @@ class ProductService:
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail='You are not authorized to use this method'
             )
-        product_delete = await self.session.scalar(select(Product).where(Product.slug == product_slug))
-        if product_delete is None:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail='There is no product found'
-            )
-        if not (get_user.id == product_delete.supplier_id or get_user.user_role == 'is_admin'):
+        query = (update(Product)
+                 .where(Product.slug == product_slug)
+                 .values(is_active=False)
+                 .returning(Product.id)
+                 .execution_options(synchronize_session=False))
+        if get_user.user_role != 'is_admin':
+            query = query.where(Product.supplier_id == get_user.id)
+        product_id = await self.session.scalar(query)
+        if product_id is None:
+            await self._raise_write_error(product_slug, get_user)
+        await self.session.commit()
+        return {
+            'status_code': status.HTTP_200_OK,
+            'message': 'Product delete is successful'
+        }
+
+    async def _apply_stock_price_batch(self, batch: list[StockPriceChange], get_user: CurrentUserDep) -> set[str]:
+        changes = values(column('slug', String), column('stock', Integer),
+                         column('price', Integer), column('mode', String),
+                         name='changes').data([(change.slug, change.stock, change.price, change.mode)
+                                               for change in batch])
+        # Явный cast: колонка VALUES из одних NULL иначе получит тип text
+        stock, price = cast(changes.c.stock, Integer), cast(changes.c.price, Integer)
+        new_stock = case((changes.c.mode == 'delta', Product.stock + func.coalesce(stock, 0)),
+                         else_=func.coalesce(stock, Product.stock))
+        new_price = case((changes.c.mode == 'delta', Product.price + func.coalesce(price, 0)),
+                         else_=func.coalesce(price, Product.price))
+        query = (update(Product)
+                 .where(
+                     Product.slug == changes.c.slug,
+                     Product.is_active == True,
+                     new_stock >= 0,
+                     new_price >= 0)
+                 .values(stock=new_stock, price=new_price)
+                 .returning(Product.slug)
+                 .execution_options(synchronize_session=False))
+        if get_user.user_role != 'is_admin':
+            # Проверка владельца выполняется в том же UPDATE
+            query = query.where(Product.supplier_id == get_user.id)
+        updated = await self.session.scalars(query)
+        return set(updated.all())
+
+    async def _explain_rejections(self, rejected: list[StockPriceChange],
+                                  get_user: CurrentUserDep) -> list[RejectedChange]:
+        # Запрос только для отклоненных строк, чтобы вернуть понятную причину
+        products = await self.session.execute(select(Product.slug, Product.supplier_id, Product.is_active)
+                                              .where(Product.slug.in_([change.slug for change in rejected])))
+        found = {row.slug: row for row in products}
+        result = []
+        for change in rejected:
+            product = found.get(change.slug)
+            if product is None or not product.is_active:
+                reason = 'There is no product found'
+            elif not (get_user.id == product.supplier_id or get_user.user_role == 'is_admin'):
+                reason = 'You have not enough permission for this action'
+            else:
+                reason = 'Stock and price must not become negative'
+            result.append(RejectedChange(slug=change.slug, reason=reason))
+        return result
+
+    async def bulk_update_stock_price(self, changes: list[StockPriceChange],
+                                      get_user: CurrentUserDep) -> OutputBulkUpdate:
+        if get_user.user_role == 'is_customer':
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
-                detail='You have not enough permission to for this action'
+                detail='You are not authorized to use this method'
             )
-        product_delete.is_active = False
+        rejected, accepted, seen = [], [], set()
+        for change in changes:
+            if change.slug in seen:
+                rejected.append(RejectedChange(slug=change.slug, reason='Duplicate slug in request'))
+            elif change.stock is None and change.price is None:
+                rejected.append(RejectedChange(slug=change.slug, reason='Nothing to update'))
+            else:
+                seen.add(change.slug)
+                accepted.append(change)
+
+        updated = 0
+        for start in range(0, len(accepted), BULK_UPDATE_BATCH_SIZE):
+            batch = accepted[start:start + BULK_UPDATE_BATCH_SIZE]
+            updated_slugs = await self._apply_stock_price_batch(batch, get_user)
+            updated += len(updated_slugs)
+            failed = [change for change in batch if change.slug not in updated_slugs]
+            if failed:
+                rejected.extend(await self._explain_rejections(failed, get_user))
         await self.session.commit()
         return {
             'status_code': status.HTTP_200_OK,
-            'message': 'Product delete is successful'
+            'message': 'Bulk update is finished',
+            'updated': updated,
+            'rejected': rejected
         }
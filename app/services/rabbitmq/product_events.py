@@ -0,0 +1,46 @@
+import aio_pika
+import orjson
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.events import ProductEvent
+from .utils import channel_pool
+from settings import PRODUCT_EVENTS_EXCHANGE
+
+
+# Сколько событий outbox публикуем за одну транзакцию
+RELAY_BATCH_SIZE = 500
+
+
+def event_message(event: ProductEvent) -> aio_pika.Message:
+    body = {'id': event.product_id, 'version': event.version, 'event': event.event,
+            'data': event.payload, 'at': event.created_at}
+    return aio_pika.Message(body=orjson.dumps(body),
+                            content_type='application/json',
+                            # Ключ дедупликации для потребителей: доставка at-least-once
+                            message_id=f'{event.product_id}:{event.version}',
+                            delivery_mode=aio_pika.DeliveryMode.PERSISTENT)
+
+
+async def relay_product_events(session: AsyncSession, batch_size: int = RELAY_BATCH_SIZE) -> int:
+    # Публикация в порядке id outbox: изменения одного товара сериализованы блокировкой
+    # строки, поэтому их события лежат в outbox в порядке версий. FOR UPDATE без
+    # SKIP LOCKED: второй relay (смена лидера) дождется первого, а не обгонит его
+    events = await session.scalars(select(ProductEvent)
+                                   .order_by(ProductEvent.id)
+                                   .limit(batch_size)
+                                   .with_for_update())
+    events = events.all()
+    if not events:
+        return 0
+    async with channel_pool.acquire() as channel:
+        exchange = await channel.declare_exchange(PRODUCT_EVENTS_EXCHANGE, aio_pika.ExchangeType.TOPIC,
+                                                  durable=True)
+        for event in events:
+            # Канал с publisher confirms: publish ждет подтверждения брокера
+            await exchange.publish(event_message(event), routing_key=f'product.{event.event}')
+    await session.execute(delete(ProductEvent)
+                          .where(ProductEvent.id.in_([event.id for event in events]))
+                          .execution_options(synchronize_session=False))
+    await session.commit()
+    return len(events)
@@ -0,0 +1,149 @@
+import asyncio
+
+import orjson
+from loguru import logger
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.backend.db import async_session_maker
+from app.models.rankings import ProductRanking, RankingKind
+from settings import RANKING_SIZE, RANKING_MIN_REVIEWS
+
+
+# Порядок внутри списка; id в конце — стабильный порядок при равенстве
+RANKING_ORDER = {
+    RankingKind.TOP_RATED: 'rating DESC, reviews DESC, id',
+    RankingKind.MOST_RATED: 'reviews DESC, rating DESC, id',
+}
+ITEM_KEYS = ('id', 'name', 'description', 'price', 'image_url', 'stock', 'category_id', 'slug', 'rating', 'reviews')
+REVIEWS = 'h.grade_0 + h.grade_1 + h.grade_2 + h.grade_3 + h.grade_4 + h.grade_5'
+STATS_QUERY = (
+    'SELECT p.id, p.name, p.description, p.price, p.image_url, p.stock, p.category_id, p.slug, '
+    '       coalesce(p.rating, 0) AS rating, '
+    f'       {REVIEWS} AS reviews, c.parent_id '
+    'FROM products p '
+    'JOIN product_grade_histograms h ON h.product_id = p.id '
+    'LEFT JOIN categories c ON c.id = p.category_id '
+)
+
+# Товары, чьи позиции в топах нужно обновить; разбирает одна задача на воркер
+_dirty_products: set[int] = set()
+_drain_task: asyncio.Task | None = None
+
+
+def ranking_key(kind: RankingKind, item: dict) -> tuple:
+    if kind == RankingKind.TOP_RATED:
+        return -item['rating'], -item['reviews'], item['id']
+    return -item['reviews'], -item['rating'], item['id']
+
+
+async def refresh_rankings(session: AsyncSession, kind: RankingKind, scope: int | None = None) -> None:
+    # Полный пересчет: весь каталог (0), каждая категория и родительская категория
+    # вместе с прямыми подкатегориями — как в ProductService.get_products_by_category.
+    # scope — пересчитать только один список
+    json_fields = ', '.join(f"'{key}', {key}" for key in ITEM_KEYS)
+    scope_filter = '' if scope is None else 'AND (:scope = 0 OR p.category_id = :scope OR c.parent_id = :scope) '
+    params = {'kind': kind.value, 'size': RANKING_SIZE, 'min_reviews': RANKING_MIN_REVIEWS}
+    if scope is not None:
+        params['scope'] = scope
+    await session.execute(text(
+        f'WITH stats AS ({STATS_QUERY} '
+        f'    WHERE p.is_active AND p.stock > 0 AND {REVIEWS} >= :min_reviews {scope_filter}), '
+        'scoped AS ('
+        '    SELECT 0 AS scope, * FROM stats '
+        '    UNION ALL SELECT category_id, * FROM stats '
+        '    UNION ALL SELECT parent_id, * FROM stats WHERE parent_id IS NOT NULL), '
+        'ranked AS ('
+        f'    SELECT *, row_number() OVER (PARTITION BY scope ORDER BY {RANKING_ORDER[kind]}) AS position '
+        '    FROM scoped' + ('' if scope is None else ' WHERE scope = :scope') + ') '
+        'INSERT INTO product_rankings (kind, category_id, items, refreshed_at) '
+        'SELECT CAST(:kind AS ranking_kind), scope, '
+        f'       json_agg(json_build_object({json_fields}) ORDER BY position)::text, now() '
+        'FROM ranked WHERE position <= :size GROUP BY scope '
+        'ON CONFLICT (kind, category_id) DO UPDATE SET items = excluded.items, refreshed_at = excluded.refreshed_at'),
+        params)
+    # Списки, которые в этот раз не собрались (категория опустела), удаляются
+    stale = 'DELETE FROM product_rankings WHERE kind = CAST(:kind AS ranking_kind) AND refreshed_at < now()'
+    if scope is not None:
+        stale += ' AND category_id = :scope'
+    await session.execute(text(stale), {'kind': kind.value, **({'scope': scope} if scope is not None else {})})
+
+
+def merge_ranking(kind: RankingKind, items: list[dict], product_id: int, item: dict | None) -> list[dict] | None:
+    # Новое положение одного товара в готовом списке. None — без полного пересчета
+    # не обойтись: товар опустился в конец полного списка или выбыл из него, и его
+    # место может занять товар, которого в списке нет
+    rest = [entry for entry in items if entry['id'] != product_id]
+    full = len(items) >= RANKING_SIZE
+    old = next((entry for entry in items if entry['id'] == product_id), None)
+    if item is None:
+        if old is None:
+            return items
+        return None if full else rest
+    if old is not None and full and ranking_key(kind, item) > ranking_key(kind, old) \
+            and (not rest or ranking_key(kind, item) > ranking_key(kind, rest[-1])):
+        return None
+    if old is None and full and ranking_key(kind, item) > ranking_key(kind, items[-1]):
+        return items
+    return sorted([*rest, item], key=lambda entry: ranking_key(kind, entry))[:RANKING_SIZE]
+
+
+async def update_rankings_for_product(session: AsyncSession, product_id: int) -> None:
+    # Инкрементальное обновление после изменения рейтинга: затрагиваются только списки
+    # каталога, категории товара и ее родителя; полный пересчет — лишь при выбывании
+    row = await session.execute(text(f'{STATS_QUERY} WHERE p.id = :product_id'
+                                     ' AND p.is_active AND p.stock > 0'), {'product_id': product_id})
+    row = row.mappings().first()
+    if row is None:
+        category = await session.execute(text('SELECT p.category_id, c.parent_id FROM products p '
+                                              'LEFT JOIN categories c ON c.id = p.category_id '
+                                              'WHERE p.id = :product_id'), {'product_id': product_id})
+        category = category.mappings().first()
+        if category is None:
+            return
+        item = None
+    else:
+        category = row
+        item = {key: row[key] for key in ITEM_KEYS} if row['reviews'] >= RANKING_MIN_REVIEWS else None
+    scopes = {0, category['category_id'], category['parent_id']} - {None}
+    for kind in RankingKind:
+        for scope in sorted(scopes):
+            current = await session.scalar(select(ProductRanking.items)
+                                           .where(ProductRanking.kind == kind, ProductRanking.category_id == scope)
+                                           .with_for_update())
+            items = orjson.loads(current) if current else []
+            merged = merge_ranking(kind, items, product_id, item)
+            if merged is None:
+                await refresh_rankings(session, kind, scope)
+            elif merged != items:
+                query = pg_insert(ProductRanking).values(kind=kind, category_id=scope,
+                                                         items=orjson.dumps(merged).decode())
+                await session.execute(query.on_conflict_do_update(
+                    index_elements=[ProductRanking.kind, ProductRanking.category_id],
+                    set_={'items': query.excluded.items, 'refreshed_at': query.excluded.refreshed_at}))
+    await session.commit()
+
+
+async def run_rankings_update(product_id: int) -> None:
+    try:
+        async with async_session_maker() as session:
+            await update_rankings_for_product(session, product_id)
+    except Exception as ex:
+        # Не страшно: периодический пересчет все равно приведет списки в порядок
+        logger.error(f'Ranking update for product {product_id} failed: {ex}')
+
+
+async def drain_rankings_updates() -> None:
+    # Обновления по одному: все они блокируют одни и те же строки общего топа (kind, 0),
+    # параллельные задачи только ждали бы друг друга, занимая соединения пула
+    while _dirty_products:
+        await run_rankings_update(_dirty_products.pop())
+
+
+def start_rankings_update(product_id: int) -> None:
+    # Повторные изменения одного товара до обработки схлопываются в одно обновление
+    global _drain_task
+    _dirty_products.add(product_id)
+    if _drain_task is None or _drain_task.done():
+        _drain_task = asyncio.create_task(drain_rankings_updates())
@@ -0,0 +1,134 @@
+import asyncio
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING
+
+from sqlalchemy import select, text
+
+from app.backend.db import engine
+from app.models import *
+from app.models.comments import Comment
+from settings import RECOMMENDATIONS_TOP_K, RECOMMENDATIONS_CHUNK_SIZE, RECOMMENDATIONS_SHRINK
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+STREAM_CHUNK = 50_000
+
+
+def top_k_similar(product_ids: 'np.ndarray', user_index: 'np.ndarray', product_index: 'np.ndarray',
+                  grades: 'np.ndarray', top_k: int, chunk_size: int,
+                  shrink: float) -> tuple['np.ndarray', 'np.ndarray']:
+    """Top-K похожих товаров по косинусу между столбцами матрицы пользователь × товар.
+
+    Вес оценки — grade + 1, чтобы оценка 0 тоже считалась взаимодействием. Сходство
+    умножается на n / (n + shrink), где n — число общих оценивших: пары, которые
+    совпали у одного-двух покупателей, не вытесняют устойчивые. Матрица сходства
+    строится блоками по chunk_size товаров, поэтому память ограничена блоком
+    chunk_size × товары, а не полной матрицей товары × товары.
+    Возвращает матрицы (товары × top_k) id похожих товаров (-1 — пусто) и оценок сходства.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    shape = (int(user_index.max()) + 1, len(product_ids))
+    ratings = sparse.csr_matrix((grades.astype(np.float32) + 1, (user_index, product_index)), shape=shape)
+    norms = np.sqrt(np.asarray(ratings.multiply(ratings).sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    ratings = (ratings @ sparse.diags(1 / norms).astype(np.float32)).tocsr()
+    rated = ratings.copy()
+    rated.data[:] = 1
+    ratings_t, rated_t = ratings.T.tocsr(), rated.T.tocsr()
+
+    related = np.full((len(product_ids), top_k), -1, dtype=np.int32)
+    scores = np.zeros((len(product_ids), top_k), dtype=np.float32)
+    for start in range(0, len(product_ids), chunk_size):
+        end = min(start + chunk_size, len(product_ids))
+        similarity = (ratings_t[start:end] @ ratings).tocsr()
+        common = (rated_t[start:end] @ rated).tocsr()
+        similarity.sort_indices()
+        common.sort_indices()
+        # Обе матрицы с одинаковой структурой: ненулевые там, где есть общие оценившие
+        similarity.data *= common.data / (common.data + shrink)
+        for row in range(end - start):
+            lo, hi = similarity.indptr[row], similarity.indptr[row + 1]
+            columns, values = similarity.indices[lo:hi], similarity.data[lo:hi]
+            keep = columns != start + row
+            columns, values = columns[keep], values[keep]
+            if len(values) > top_k:
+                best = np.argpartition(-values, top_k)[:top_k]
+                columns, values = columns[best], values[best]
+            order = np.argsort(-values, kind='stable')
+            related[start + row, :len(order)] = product_ids[columns[order]]
+            scores[start + row, :len(order)] = values[order]
+    return related, scores
+
+
+def compute_recommendations(user_ids: array, product_ids: array, grades: array,
+                            top_k: int, chunk_size: int, shrink: float) -> list[tuple[int, list[int], list[float]]]:
+    # Выполняется в отдельном процессе: numpy/scipy не держат event loop воркера.
+    # Импорт здесь, а не в модуле: веб-воркеру эти ~200 мс на старте не нужны
+    import numpy as np
+
+    users = np.frombuffer(user_ids, dtype=np.int32)
+    products = np.frombuffer(product_ids, dtype=np.int32)
+    _, user_index = np.unique(users, return_inverse=True)
+    unique_products, product_index = np.unique(products, return_inverse=True)
+    related, scores = top_k_similar(unique_products, user_index, product_index,
+                                    np.frombuffer(grades, dtype=np.int32), top_k, chunk_size, shrink)
+    records = []
+    for product_id, row_related, row_scores in zip(unique_products.tolist(), related, scores):
+        found = row_related >= 0
+        if found.any():
+            records.append((product_id, row_related[found].tolist(), row_scores[found].astype(float).tolist()))
+    return records
+
+
+async def load_ratings() -> tuple[array, array, array]:
+    user_ids, product_ids, grades = array('i'), array('i'), array('i')
+    async with engine.connect() as connection:
+        result = await connection.stream(select(Comment.user_id, Comment.product_id, Comment.grade)
+                                         .join(Product, Product.id == Comment.product_id)
+                                         .where(Comment.is_active == True, Product.is_active == True))
+        async for rows in result.partitions(STREAM_CHUNK):
+            for user_id, product_id, grade in rows:
+                user_ids.append(user_id)
+                product_ids.append(product_id)
+                grades.append(grade)
+    return user_ids, product_ids, grades
+
+
+async def save_recommendations(records: list[tuple[int, list[int], list[float]]]) -> None:
+    # Массовая запись: COPY во временную таблицу и один upsert; рекомендации товаров,
+    # выпавших из расчета, удаляются в той же транзакции.
+    # Первый запрос — через SQLAlchemy: адаптер asyncpg открывает транзакцию только на нем,
+    # иначе CREATE TEMP TABLE ... ON COMMIT DROP выполнился бы в автокоммите и таблица сразу исчезла
+    async with engine.begin() as connection:
+        await connection.execute(text('CREATE TEMP TABLE recommendations_stage '
+                                      '(product_id integer, related_ids integer[], scores double precision[]) '
+                                      'ON COMMIT DROP'))
+        raw = (await connection.get_raw_connection()).driver_connection
+        await raw.copy_records_to_table('recommendations_stage', records=records,
+                                        columns=['product_id', 'related_ids', 'scores'])
+        await connection.execute(text(
+            'INSERT INTO product_recommendations (product_id, related_ids, scores, computed_at) '
+            'SELECT s.product_id, s.related_ids, s.scores, now() FROM recommendations_stage s '
+            'JOIN products p ON p.id = s.product_id '
+            'ON CONFLICT (product_id) DO UPDATE SET related_ids = excluded.related_ids, '
+            '    scores = excluded.scores, computed_at = excluded.computed_at'))
+        await connection.execute(text('DELETE FROM product_recommendations WHERE computed_at < now()'))
+
+
+async def rebuild_recommendations() -> int:
+    user_ids, product_ids, grades = await load_ratings()
+    if not grades:
+        return 0
+    # Процесс на время расчета: память матриц возвращается системе сразу после него
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        records = await asyncio.get_running_loop().run_in_executor(
+            executor, compute_recommendations, user_ids, product_ids, grades,
+            RECOMMENDATIONS_TOP_K, RECOMMENDATIONS_CHUNK_SIZE, RECOMMENDATIONS_SHRINK)
+    await save_recommendations(records)
+    return len(records)
@@ -0,0 +1,84 @@
+import hashlib
+import secrets
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.tokens import RefreshToken
+from app.models.user import User
+from settings import REFRESH_TOKEN_DAYS
+
+
+def hash_refresh_token(token: str) -> str:
+    # Токен — 256 бит случайности, медленный хэш (bcrypt) тут ничего не добавляет
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def issue_refresh_token(session: AsyncSession, user_id: int, family_id: str | None = None) -> str:
+    token = secrets.token_urlsafe(32)
+    await session.execute(insert(RefreshToken).values(
+        user_id=user_id,
+        token_hash=hash_refresh_token(token),
+        family_id=family_id or uuid4().hex,
+        expires_at=datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_DAYS)))
+    return token
+
+
+async def rotate_refresh_token(session: AsyncSession, token: str):
+    # Старый токен гасится и новый выдается в одной транзакции; пароль не проверяется
+    token_hash = hash_refresh_token(token)
+    now = datetime.now(timezone.utc)
+    used = await session.execute(update(RefreshToken)
+                                 .where(
+                                     RefreshToken.token_hash == token_hash,
+                                     RefreshToken.revoked_at.is_(None),
+                                     RefreshToken.expires_at > now,
+                                     User.id == RefreshToken.user_id,
+                                     User.is_active == True)
+                                 .values(revoked_at=now)
+                                 .returning(RefreshToken.family_id, User.id, User.username, User.user_role)
+                                 .execution_options(synchronize_session=False))
+    used = used.first()
+    if used is None:
+        # Повторное предъявление уже ротированного токена — признак утечки:
+        # гасим всю цепочку
+        family_id = await session.scalar(select(RefreshToken.family_id)
+                                         .where(RefreshToken.token_hash == token_hash,
+                                                RefreshToken.revoked_at.is_not(None)))
+        if family_id is not None:
+            await revoke_refresh_family(session, family_id)
+            await session.commit()
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail='Invalid refresh token',
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    new_token = await issue_refresh_token(session, used.id, used.family_id)
+    await session.commit()
+    return used, new_token
+
+
+async def revoke_refresh_family(session: AsyncSession, family_id: str) -> None:
+    await session.execute(update(RefreshToken)
+                          .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+                          .values(revoked_at=datetime.now(timezone.utc))
+                          .execution_options(synchronize_session=False))
+
+
+async def revoke_refresh_token(session: AsyncSession, token: str) -> bool:
+    family_id = await session.scalar(select(RefreshToken.family_id)
+                                     .where(RefreshToken.token_hash == hash_refresh_token(token)))
+    if family_id is None:
+        return False
+    await revoke_refresh_family(session, family_id)
+    await session.commit()
+    return True
+
+
+async def purge_expired_refresh_tokens(session: AsyncSession) -> int:
+    deleted = await session.execute(delete(RefreshToken).where(RefreshToken.expires_at < datetime.now(timezone.utc)))
+    await session.commit()
+    return deleted.rowcount
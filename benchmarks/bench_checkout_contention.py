@@ -0,0 +1,120 @@
+"""Конкурентные checkout'ы: проверка отсутствия оверселла и дедлоков.
+
+Запускается против настроенной в .env базы (с примененными миграциями):
+
+    python -m benchmarks.bench_checkout_contention --concurrency 500 --stock 100
+
+Сценарий 1: N покупателей одновременно берут по 1 шт. одного SKU с остатком stock.
+Сценарий 2: многострочные корзины [A, B] и [B, A] вперемешку — проверка порядка блокировок.
+Созданные данные удаляются в конце.
+"""
+import argparse
+import asyncio
+import time
+from uuid import uuid4
+
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.backend.db import DATABASE_URL
+from app.models import Category, Product
+from app.models.orders import Order, OrderItem
+from app.models.user import User
+from app.schemas import CartItem, GetUser
+from app.services.orders import OrderService
+
+
+async def create_fixtures(session_maker, stock: int) -> tuple[GetUser, int, list[int]]:
+    suffix = uuid4().hex[:8]
+    async with session_maker() as session:
+        user_id = await session.scalar(insert(User)
+                                       .values(username=f'bench-{suffix}', email=f'bench-{suffix}@example.com',
+                                               first_name='Bench', last_name='User', hashed_password='-')
+                                       .returning(User.id))
+        category_id = await session.scalar(insert(Category)
+                                           .values(name=f'Bench {suffix}', slug=f'bench-{suffix}')
+                                           .returning(Category.id))
+        product_ids = []
+        for i in range(3):
+            product_ids.append(await session.scalar(insert(Product)
+                                                    .values(name=f'Bench {suffix} {i}', slug=f'bench-{suffix}-{i}',
+                                                            description='', price=100, image_url='', stock=stock,
+                                                            category_id=category_id, rating=0.0, is_active=True)
+                                                    .returning(Product.id)))
+        await session.commit()
+    return GetUser(username=f'bench-{suffix}', id=user_id, user_role='is_customer'), category_id, product_ids
+
+
+async def drop_fixtures(session_maker, user: GetUser, category_id: int, product_ids: list[int]) -> None:
+    async with session_maker() as session:
+        await session.execute(delete(OrderItem).where(OrderItem.product_id.in_(product_ids)))
+        await session.execute(delete(Order).where(Order.user_id == user.id))
+        await session.execute(delete(Product).where(Product.id.in_(product_ids)))
+        await session.execute(delete(Category).where(Category.id == category_id))
+        await session.execute(delete(User).where(User.id == user.id))
+        await session.commit()
+
+
+async def run_checkouts(session_maker, user: GetUser, carts: list[list[CartItem]]) -> dict:
+    outcome = {'ok': 0, 'conflict': 0, 'deadlock': 0, 'error': 0}
+
+    async def one(cart: list[CartItem]) -> None:
+        async with session_maker() as session:
+            try:
+                await OrderService(session).checkout(cart, user)
+                outcome['ok'] += 1
+            except HTTPException:
+                outcome['conflict'] += 1
+            except DBAPIError as ex:
+                outcome['deadlock' if 'deadlock' in str(ex) else 'error'] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(cart) for cart in carts))
+    outcome['seconds'] = round(time.perf_counter() - started, 3)
+    return outcome
+
+
+async def stock_of(session_maker, product_ids: list[int]) -> list[int]:
+    async with session_maker() as session:
+        stocks = await session.scalars(select(Product.stock).where(Product.id.in_(product_ids)).order_by(Product.id))
+        return stocks.all()
+
+
+async def main(concurrency: int, stock: int) -> None:
+    engine = create_async_engine(DATABASE_URL, pool_size=min(concurrency, 90), max_overflow=0, pool_timeout=120)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    user, category_id, product_ids = await create_fixtures(session_maker, stock)
+    failed = False
+    try:
+        single = await run_checkouts(session_maker, user,
+                                     [[CartItem(product_id=product_ids[0], quantity=1)]] * concurrency)
+        remaining = (await stock_of(session_maker, product_ids[:1]))[0]
+        print(f'single SKU: {single}, stock left: {remaining}')
+        if single['ok'] != min(stock, concurrency) or remaining != stock - single['ok'] or single['deadlock']:
+            failed = True
+
+        a, b = product_ids[1], product_ids[2]
+        carts = [[CartItem(product_id=a, quantity=1), CartItem(product_id=b, quantity=1)] if i % 2 else
+                 [CartItem(product_id=b, quantity=1), CartItem(product_id=a, quantity=1)]
+                 for i in range(concurrency)]
+        crossed = await run_checkouts(session_maker, user, carts)
+        remaining = await stock_of(session_maker, [a, b])
+        print(f'crossed carts: {crossed}, stock left: {remaining}')
+        if crossed['deadlock'] or any(left != stock - crossed['ok'] for left in remaining):
+            failed = True
+    finally:
+        await drop_fixtures(session_maker, user, category_id, product_ids)
+        await engine.dispose()
+    print('FAILED: oversell or deadlock detected' if failed else 'OK: no oversell, no deadlocks')
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', type=int, default=500)
+    parser.add_argument('--stock', type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency, args.stock))
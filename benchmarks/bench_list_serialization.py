@@ -0,0 +1,69 @@
+"""Сравнение сериализации списка товаров: ORM -> Pydantic -> JSON против строк Core -> orjson.
+
+Запуск из корня проекта (нужен .env, как и для самого приложения):
+
+    python -m benchmarks.bench_list_serialization --rows 10000 --repeat 5
+"""
+import argparse
+import json
+import time
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.models import Product
+from app.schemas import GetProduct
+from app.services.products import PRODUCT_LIST_COLUMNS
+
+
+COLUMN_NAMES = [column.key for column in PRODUCT_LIST_COLUMNS]
+
+
+def make_rows(count: int) -> list[tuple]:
+    return [
+        (f'Product {i}', f'Description of product {i}', 100 + i % 1000,
+         f'https://cdn.example.com/{i}.jpg', i % 50 + 1, i % 40 + 1, f'product-{i}', (i % 50) / 10)
+        for i in range(count)
+    ]
+
+
+def orm_path(rows: list[tuple]) -> bytes:
+    # Так работал старый путь: ORM-объекты, затем валидация в list[GetProduct] и json.dumps
+    products = [Product(**dict(zip(COLUMN_NAMES, row))) for row in rows]
+    validated = TypeAdapter(list[GetProduct]).validate_python(products, from_attributes=True)
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def fast_path(rows: list[tuple]) -> bytes:
+    return orjson.dumps([dict(zip(COLUMN_NAMES, row)) for row in rows])
+
+
+def measure(func, rows: list[tuple], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(rows)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    assert orjson.loads(orm_path(rows)) == orjson.loads(fast_path(rows))
+
+    orm_time = measure(orm_path, rows, args.repeat)
+    fast_time = measure(fast_path, rows, args.repeat)
+    print(f'rows: {args.rows}')
+    print(f'ORM -> Pydantic -> json: {orm_time * 1000:.1f} ms')
+    print(f'Core rows -> orjson:     {fast_time * 1000:.1f} ms')
+    print(f'speedup: x{orm_time / fast_time:.1f}')
+
+
+if __name__ == '__main__':
+    main()
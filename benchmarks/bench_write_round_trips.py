@@ -0,0 +1,97 @@
+"""Количество SQL-запросов на write-путях, посчитанное через count_queries.
+
+Запускается против настроенной в .env базы (с примененными миграциями):
+
+    python -m benchmarks.bench_write_round_trips
+
+BEFORE — число запросов в версии до перехода на UPDATE/INSERT ... RETURNING
+(SELECT-проверки + запись), без учета COMMIT.
+"""
+import asyncio
+from uuid import uuid4
+
+from sqlalchemy import delete, insert, select
+
+from app.backend.db import async_session_maker, count_queries
+from app.models import Category, Product
+from app.models.user import User
+from app.routers import auth, category, permission
+from app.schemas import CreateProduct, CreateUser, GetUser, UpdateCategory, UpdateProduct
+from app.services.products import ProductService
+
+
+BEFORE = {
+    'ProductService.create_product': 2,
+    'ProductService.update_product': 3,
+    'ProductService.delete_product': 2,
+    'auth.create_user': 2,
+    'permission.supplier_permission': 2,
+    'permission.delete_user': 2,
+    'category.update_category': 2,
+    'category.delete_category': 2,
+}
+
+
+async def no_welcome_email(email: str, username: str) -> None:
+    return None
+
+
+async def measure(results: dict, name: str, call) -> None:
+    async with async_session_maker() as session:
+        with count_queries() as counter:
+            await call(session)
+        results[name] = counter.count
+
+
+async def main() -> None:
+    suffix = uuid4().hex[:8]
+    admin = GetUser(username='bench-admin', id=0, user_role='is_admin')
+    auth.send_welcome_email = no_welcome_email
+
+    async with async_session_maker() as session:
+        category_id = await session.scalar(insert(Category)
+                                           .values(name=f'Bench {suffix}', slug=f'bench-{suffix}')
+                                           .returning(Category.id))
+        await session.commit()
+
+    product = CreateProduct(name=f'Bench {suffix}', description='', price=100, image_url='',
+                            stock=10, category_id=category_id)
+    new_user = CreateUser(first_name='Bench', last_name='User', username=f'bench-{suffix}',
+                          email=f'bench-{suffix}@example.com', password='bench-password')
+    results = {}
+    try:
+        await measure(results, 'ProductService.create_product',
+                      lambda db: ProductService(db).create_product(product, admin))
+        await measure(results, 'ProductService.update_product',
+                      lambda db: ProductService(db).update_product(f'bench-{suffix}',
+                                                                   UpdateProduct(stock=5, category_id=category_id),
+                                                                   admin))
+        await measure(results, 'ProductService.delete_product',
+                      lambda db: ProductService(db).delete_product(f'bench-{suffix}', admin))
+        await measure(results, 'auth.create_user', lambda db: auth.create_user(db, new_user))
+
+        async with async_session_maker() as session:
+            user_id = await session.scalar(select(User.id).where(User.username == new_user.username))
+        await measure(results, 'permission.supplier_permission',
+                      lambda db: permission.supplier_permission(db, admin, user_id))
+        await measure(results, 'permission.delete_user',
+                      lambda db: permission.delete_user(db, admin, user_id))
+        await measure(results, 'category.update_category',
+                      lambda db: category.update_category(db, category_id,
+                                                          UpdateCategory(name=f'Bench {suffix}'), admin))
+        await measure(results, 'category.delete_category',
+                      lambda db: category.delete_category(db, category_id, admin))
+    finally:
+        async with async_session_maker() as session:
+            await session.execute(delete(Product).where(Product.category_id == category_id))
+            await session.execute(delete(Category).where(Category.id == category_id))
+            await session.execute(delete(User).where(User.username == new_user.username))
+            await session.commit()
+
+    print(f'{"path":<34}{"before":>8}{"after":>8}')
+    for name, count in results.items():
+        print(f'{name:<34}{BEFORE[name]:>8}{count:>8}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,340 @@
+"""Проверка планов горячих запросов: форма плана и бюджет буферов.
+
+Работает против базы, засеянной benchmarks.seed_catalog (нужен ее манифест):
+
+    python -m benchmarks.check_query_plans --manifest loadtest_manifest.json
+
+Каждый случай вызывает настоящий код (ProductService, импорт, роутеры category/comments,
+auth) внутри транзакции, которая в конце откатывается. Все SQL-запросы, ушедшие в драйвер,
+перехватываются и повторяются как EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) с теми же
+параметрами; изменения самого случая перед этим откатываются до savepoint, поэтому
+INSERT с уникальными полями повторяется без конфликта. Фоновые задачи, которые код
+запускает после коммита (каскад, топы, письма), на время случая отключены.
+Проверяется, что:
+- по products и comments (включая секции) нет Seq Scan, кроме явно разрешенных случаев;
+- используются ожидаемые индексы;
+- суммарные shared-буферы случая не выходят за бюджет.
+Нарушение любого правила — ненулевой код выхода. --verbose печатает планы.
+"""
+import argparse
+import asyncio
+import io
+import json
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Awaitable, Callable
+from uuid import uuid4
+
+from fastapi import UploadFile
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import Headers
+
+from app.backend.db import engine
+from app.backend.revocation import TokenRevocations
+from app.models.user import UserRole
+from app.routers import auth, category, comments
+from app.schemas import (CreateCategory, CreateComment, CreateProduct, CreateUser, GetUser, StockPriceChange,
+                         UpdateCategory, UpdateProduct)
+from app.services.comments import encode_cursor, fetch_comment_page
+from app.services.product_import import ProductImportService
+from app.services.products import ProductService
+from app.services.tokens import issue_refresh_token, rotate_refresh_token
+
+
+# Таблицы, по которым Seq Scan недопустим; секции comments приводятся к родителю
+GUARDED_TABLES = {'products', 'comments'}
+
+
+@dataclass
+class Case:
+    name: str
+    call: Callable[[AsyncSession, dict], Awaitable]
+    # Максимум shared hit + read по всем запросам случая
+    buffer_budget: int
+    expected_indexes: set[str] = field(default_factory=set)
+    allowed_seq_scans: set[str] = field(default_factory=set)
+    setup: Callable[[AsyncSession, dict], Awaitable] | None = None
+    # False — изменения случая остаются до EXPLAIN: запросы ссылаются на временные
+    # таблицы, созданные самим случаем (импорт)
+    rollback_before_explain: bool = True
+
+
+def table_of(relation: str) -> str:
+    if relation.startswith('comments_y') or relation == 'comments_default':
+        return 'comments'
+    return relation
+
+
+def walk(plan: dict):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from walk(child)
+
+
+def customer(manifest: dict) -> GetUser:
+    return GetUser(username=f'{manifest["prefix"]}-user-{manifest["suppliers"]}',
+                   id=manifest['customer_id'], user_role='is_customer')
+
+
+def supplier(manifest: dict) -> GetUser:
+    # Первые --suppliers пользователей сидера — поставщики
+    return GetUser(username=f'{manifest["prefix"]}-user-0', id=manifest['supplier_id'], user_role='is_supplier')
+
+
+def admin(manifest: dict) -> GetUser:
+    return GetUser(username='plan-check-admin', id=manifest['customer_id'], user_role='is_admin')
+
+
+def unique_name(kind: str) -> str:
+    return f'plan check {kind} {uuid4().hex[:12]}'
+
+
+async def remember_refresh_token(session: AsyncSession, manifest: dict) -> None:
+    manifest['refresh_token'] = await issue_refresh_token(session, manifest['customer_id'])
+
+
+async def remember_access_token(session: AsyncSession, manifest: dict) -> None:
+    manifest['access_token'] = await auth.create_access_token(customer(manifest).username, manifest['customer_id'],
+                                                              UserRole.IS_CUSTOMER, timedelta(minutes=5))
+
+
+def import_upload(manifest: dict, rows: int = 100) -> UploadFile:
+    lines = ['name,description,price,image_url,stock,category_id']
+    lines += [f'{unique_name("import")},imported,{100 + i},https://cdn.example.com/{i}.jpg,{i % 50},'
+              f'{manifest["leaf_category_id"]}' for i in range(rows)]
+    return UploadFile(io.BytesIO('\n'.join(lines).encode()), filename='plan-check.csv',
+                      headers=Headers({'content-type': 'text/csv'}))
+
+
+async def _no_background_task(*args, **kwargs) -> None:
+    pass
+
+
+@contextmanager
+def no_background_tasks():
+    # Задачи после коммита работают в своих сессиях и увидели бы (или изменили) реальные данные
+    patched = [(category, 'start_cascade_job', lambda job_id: None),
+               (comments, 'start_rankings_update', lambda product_id: None),
+               (auth, 'send_welcome_email', _no_background_task)]
+    originals = [(module, name, getattr(module, name)) for module, name, _ in patched]
+    for module, name, replacement in patched:
+        setattr(module, name, replacement)
+    try:
+        yield
+    finally:
+        for module, name, original in originals:
+            setattr(module, name, original)
+
+
+CASES = [
+    # Полный каталог: чтение всей таблицы — осознанный Seq Scan
+    Case('ProductService.get_all_products',
+         lambda session, m: ProductService(session).get_all_products(),
+         buffer_budget=2_000_000, allowed_seq_scans={'products'}),
+    Case('ProductService.get_products_by_category (leaf)',
+         lambda session, m: ProductService(session).get_products_by_category(m['category_slugs'][-1]),
+         buffer_budget=20_000, expected_indexes={'ix_products_category_active'}),
+    # Категория, у прямых подкатегорий которой есть товары: сервис берет только один уровень
+    Case('ProductService.get_products_by_category (parent)',
+         lambda session, m: ProductService(session).get_products_by_category(m['parent_category_slug']),
+         buffer_budget=50_000, expected_indexes={'ix_products_category_active'}),
+    Case('ProductService.get_product_details',
+         lambda session, m: ProductService(session).get_product_details(f'{m["prefix"]}-p{m["products"] // 2}'),
+         buffer_budget=50, expected_indexes={'ix_products_slug'}),
+    Case('ProductService.create_product',
+         lambda session, m: ProductService(session).create_product(
+             CreateProduct(name=unique_name('product'), description='plan check', price=100,
+                           image_url='https://cdn.example.com/plan.jpg', stock=10,
+                           category_id=m['leaf_category_id']),
+             supplier(m)),
+         buffer_budget=200),
+    Case('ProductService.update_product',
+         lambda session, m: ProductService(session).update_product(
+             m['supplier_product_slugs'][0], UpdateProduct(price=123, category_id=m['leaf_category_id']),
+             supplier(m)),
+         buffer_budget=200, expected_indexes={'ix_products_slug'}),
+    Case('ProductService.delete_product',
+         lambda session, m: ProductService(session).delete_product(m['supplier_product_slugs'][0], supplier(m)),
+         buffer_budget=100, expected_indexes={'ix_products_slug'}),
+    Case('ProductService.bulk_update_stock_price',
+         lambda session, m: ProductService(session).bulk_update_stock_price(
+             [StockPriceChange(slug=slug, stock=1, mode='delta') for slug in m['supplier_product_slugs']],
+             supplier(m)),
+         buffer_budget=3_000, expected_indexes={'ix_products_slug'}),
+    Case('ProductImportService.import_products',
+         lambda session, m: ProductImportService(session).import_products(import_upload(m), supplier(m)),
+         buffer_budget=5_000, rollback_before_explain=False),
+    Case('category.get_all_categories',
+         lambda session, m: category.get_all_categories(session),
+         buffer_budget=500),
+    Case('comments.all_comments (first page)',
+         lambda session, m: fetch_comment_page(session, 20, None),
+         buffer_budget=500, expected_indexes={'ix_comments_active_dt'}),
+    Case('comments.all_comments (deep page)',
+         lambda session, m: fetch_comment_page(session, 20, m['deep_cursor']),
+         buffer_budget=500, expected_indexes={'ix_comments_active_dt'}),
+    Case('category.create_category',
+         lambda session, m: category.create_category(session, CreateCategory(name=unique_name('category')),
+                                                     admin(m)),
+         buffer_budget=100),
+    Case('category.update_category',
+         lambda session, m: category.update_category(session, m['leaf_category_id'],
+                                                     UpdateCategory(name=unique_name('category')), admin(m)),
+         buffer_budget=100),
+    Case('category.delete_category',
+         lambda session, m: category.delete_category(session, m['leaf_category_id'], admin(m)),
+         buffer_budget=100),
+    Case('comments.comment_detail',
+         lambda session, m: comments.comment_detail(session, m['popular_product_id'], 20, None),
+         buffer_budget=1_000, expected_indexes={'ix_comments_product_active_dt'}),
+    Case('comments.add_comment',
+         lambda session, m: comments.add_comment(
+             session, CreateComment(comment='plan check', grade=5, product_id=m['popular_product_id']),
+             customer(m)),
+         buffer_budget=2_000),
+    Case('comments.delete_comment',
+         lambda session, m: comments.delete_comment(session, m['popular_comment_id'], admin(m)),
+         buffer_budget=500),
+    Case('auth.create_user',
+         lambda session, m: auth.create_user(session, CreateUser(
+             first_name='Plan', last_name='Check', username=unique_name('user').replace(' ', '-'),
+             email=f'plan-check-{uuid4().hex[:12]}@example.com', password='plan-check')),
+         buffer_budget=100),
+    Case('auth.logout',
+         lambda session, m: auth.logout(session, customer(m), m['access_token']),
+         buffer_budget=50, setup=remember_access_token),
+    Case('auth.authenticate_user',
+         lambda session, m: auth.authenticate_user(session, customer(m).username, m['password']),
+         buffer_budget=50),
+    Case('auth.refresh',
+         lambda session, m: rotate_refresh_token(session, m['refresh_token']),
+         buffer_budget=100, setup=remember_refresh_token),
+    Case('auth.sync_token_revocations',
+         lambda session, m: TokenRevocations().sync(session),
+         buffer_budget=500),
+]
+
+
+async def prepare(connection, manifest: dict) -> None:
+    raw = (await connection.get_raw_connection()).driver_connection
+    first, last = manifest['product_id_range']
+    # Самый комментируемый товар — худший случай для деталки
+    manifest['popular_product_id'] = await raw.fetchval(
+        'SELECT product_id FROM comments WHERE product_id BETWEEN $1 AND $2 AND is_active '
+        'GROUP BY product_id ORDER BY count(*) DESC LIMIT 1', first, last)
+    manifest['customer_id'] = await raw.fetchval('SELECT id FROM users WHERE username = $1',
+                                                 f'{manifest["prefix"]}-user-{manifest["suppliers"]}')
+    manifest['popular_comment_id'] = await raw.fetchval(
+        'SELECT id FROM comments WHERE product_id = $1 AND is_active LIMIT 1', manifest['popular_product_id'])
+    manifest['supplier_id'] = await raw.fetchval('SELECT id FROM users WHERE username = $1',
+                                                 f'{manifest["prefix"]}-user-0')
+    manifest['supplier_product_slugs'] = [row['slug'] for row in await raw.fetch(
+        'SELECT slug FROM products WHERE supplier_id = $1 AND is_active ORDER BY id LIMIT 100',
+        manifest['supplier_id'])]
+    manifest['leaf_category_id'] = await raw.fetchval('SELECT id FROM categories WHERE slug = $1',
+                                                      manifest['category_slugs'][-1])
+    manifest['parent_category_slug'] = await raw.fetchval(
+        'SELECT c.slug FROM categories c WHERE c.slug = ANY($1::text[]) AND EXISTS ('
+        '    SELECT 1 FROM categories child JOIN products p ON p.category_id = child.id '
+        '    WHERE child.parent_id = c.id AND p.is_active) '
+        'LIMIT 1', manifest['category_slugs'])
+    deep = await raw.fetchrow('SELECT comment_dt, id FROM comments WHERE is_active '
+                              'ORDER BY comment_dt DESC, id DESC OFFSET 100000 LIMIT 1')
+    manifest['deep_cursor'] = encode_cursor(deep['comment_dt'], deep['id']) if deep else None
+
+
+async def run_case(case: Case, manifest: dict, verbose: bool) -> list[str]:
+    failures = []
+    captured: list[tuple[str, object]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().split(None, 1)[0].upper() in ('SELECT', 'INSERT', 'UPDATE',
+                                                                                 'DELETE', 'WITH'):
+            captured.append((statement, parameters))
+
+    async with engine.connect() as connection:
+        transaction = await connection.begin()
+        # Коммиты внутри кода превращаются в savepoint'ы, все откатывается в конце
+        session = AsyncSession(bind=connection, join_transaction_mode='create_savepoint', expire_on_commit=False)
+        try:
+            if case.setup is not None:
+                await case.setup(session, manifest)
+            case_savepoint = await connection.begin_nested()
+            event.listen(engine.sync_engine, 'before_cursor_execute', capture)
+            try:
+                with no_background_tasks():
+                    await case.call(session, manifest)
+            finally:
+                event.remove(engine.sync_engine, 'before_cursor_execute', capture)
+            await session.close()
+            if case.rollback_before_explain:
+                await case_savepoint.rollback()
+
+            buffers = 0
+            indexes = set()
+            for statement, parameters in captured:
+                nested = await connection.begin_nested()
+                try:
+                    result = await connection.exec_driver_sql(
+                        'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + statement, parameters)
+                    plan = result.scalar()
+                finally:
+                    await nested.rollback()
+                plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]['Plan']
+                buffers += plan.get('Shared Hit Blocks', 0) + plan.get('Shared Read Blocks', 0)
+                for node in walk(plan):
+                    if 'Index Name' in node:
+                        indexes.add(node['Index Name'])
+                    relation = table_of(node.get('Relation Name', ''))
+                    if node['Node Type'] == 'Seq Scan' and relation in GUARDED_TABLES \
+                            and relation not in case.allowed_seq_scans:
+                        failures.append(f'Seq Scan on {node["Relation Name"]}: {" ".join(statement.split())[:120]}')
+                if verbose:
+                    print(' '.join(statement.split()))
+                    print(json.dumps(plan, indent=2))
+            missing = case.expected_indexes - indexes
+            if missing:
+                failures.append(f'expected index not used: {", ".join(sorted(missing))}')
+            if buffers > case.buffer_budget:
+                failures.append(f'buffers {buffers} over budget {case.buffer_budget}')
+            print(f'{"FAIL" if failures else "ok":<5}{case.name:<52}{len(captured):>3} queries {buffers:>9} buffers')
+        finally:
+            await session.close()
+            await transaction.rollback()
+    return failures
+
+
+async def main(args) -> None:
+    with open(args.manifest) as file:
+        manifest = json.load(file)
+    async with engine.connect() as connection:
+        await prepare(connection, manifest)
+    failed = {}
+    for case in CASES:
+        if args.case and args.case not in case.name:
+            continue
+        try:
+            failures = await run_case(case, manifest, args.verbose)
+        except Exception as ex:
+            failures = [f'case raised {ex!r}']
+            print(f'{"FAIL":<5}{case.name}')
+        if failures:
+            failed[case.name] = failures
+    await engine.dispose()
+    for name, failures in failed.items():
+        print(f'\n{name}:')
+        for failure in failures:
+            print(f'  - {failure}')
+    if failed:
+        raise SystemExit(1)
+    print('\nall query plans within limits')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--manifest', default='loadtest_manifest.json')
+    parser.add_argument('--case', help='проверить только случаи, в имени которых есть эта строка')
+    parser.add_argument('--verbose', action='store_true')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,92 @@
+"""Отчет о времени импорта приложения по данным python -X importtime.
+
+Каждый прогон — отдельный интерпретатор, поэтому измеряется холодный старт
+воркера (байткод уже в __pycache__ после первого прогона). Отчет показывает
+модули с наибольшим накопленным временем и сумму собственного времени по
+пакетам верхнего уровня. --budget-ms проверяет медиану общего времени, а
+--forbid — что тяжелые необязательные пакеты не загружаются при старте.
+
+Запуск из корня проекта (нужен .env, как и для самого приложения):
+
+    python -m benchmarks.import_profile --repeat 5 --budget-ms 1500
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+
+# Нужны только задачам в отдельных процессах, веб-воркер их импортировать не должен
+DEFAULT_FORBIDDEN = ('numpy', 'scipy', 'PIL')
+
+
+def parse_importtime(output: str) -> list[tuple[str, int, int, int]]:
+    # Строки вида "import time:   self [us] | cumulative | imported package";
+    # отступ имени — глубина вложенности импорта
+    records = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        records.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return records
+
+
+def profile_once(module: str) -> list[tuple[str, int, int, int]]:
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f'import {module} failed:\n{result.stderr[-2000:]}')
+    return parse_importtime(result.stderr)
+
+
+def total_us(records: list[tuple[str, int, int, int]]) -> int:
+    # Модули верхнего уровня (с наименьшим отступом) не пересекаются
+    return sum(cumulative for _, depth, _, cumulative in records if depth == 0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--module', default='app.main')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=25)
+    parser.add_argument('--budget-ms', type=float, default=None)
+    parser.add_argument('--forbid', nargs='*', default=list(DEFAULT_FORBIDDEN))
+    args = parser.parse_args()
+
+    # Первый прогон прогревает __pycache__ и в расчет не идет
+    profile_once(args.module)
+    runs = [profile_once(args.module) for _ in range(args.repeat)]
+    totals = [total_us(records) / 1000 for records in runs]
+    # Для разбивки берется прогон с медианным временем
+    records = sorted(runs, key=total_us)[len(runs) // 2]
+
+    print(f'import {args.module}: median {statistics.median(totals):.0f} ms, '
+          f'min {min(totals):.0f} ms, max {max(totals):.0f} ms over {args.repeat} runs')
+
+    print(f'\nTop {args.top} modules by cumulative time:')
+    for name, _, _, cumulative in sorted(records, key=lambda record: -record[3])[:args.top]:
+        print(f'{cumulative / 1000:>10.1f} ms  {name}')
+
+    packages = defaultdict(int)
+    for name, _, self_us, _ in records:
+        packages[name.split('.')[0]] += self_us
+    print(f'\nTop {args.top} packages by own time:')
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f'{self_us / 1000:>10.1f} ms  {package}')
+
+    failed = False
+    loaded = sorted({name.split('.')[0] for name, *_ in records} & set(args.forbid))
+    if loaded:
+        print(f'\nFAIL: loaded at startup: {", ".join(loaded)}')
+        failed = True
+    if args.budget_ms is not None and statistics.median(totals) > args.budget_ms:
+        print(f'\nFAIL: median {statistics.median(totals):.0f} ms exceeds budget {args.budget_ms:.0f} ms')
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Нагрузочный тест HTTP API по сценариям с отчетом по каждому эндпоинту.
+
+Сначала каталог засевается benchmarks.seed_catalog (он пишет манифест), затем, например,
+против локального docker-compose:
+
+    python -m benchmarks.load_run --base-url http://localhost:8000 --users 50 --duration 60
+
+Сценарии и их веса: --scenario browse=60 --scenario detail=25 --scenario login=5 --scenario comment=10.
+catalog (GET /products/ целиком) по умолчанию выключен: на миллионе товаров это сотни мегабайт.
+Для сценария login поднимите LOGIN_IP_* в .env стенда, иначе все виртуальные пользователи
+упрутся в лимит одного IP (такие ответы учитываются отдельно как 429).
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+
+import httpx
+
+
+DEFAULT_SCENARIOS = {'browse': 60, 'detail': 25, 'login': 5, 'comment': 10, 'catalog': 0}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.statuses: dict[str, dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.recording = False
+
+    async def request(self, client: httpx.AsyncClient, label: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError:
+            response, status = None, 0
+        if self.recording:
+            self.latencies[label].append((time.perf_counter() - started) * 1000)
+            self.statuses[label][status] += 1
+        return response
+
+
+def percentile(values: list[float], share: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))] if values else 0.0
+
+
+class VirtualUser:
+    def __init__(self, index: int, manifest: dict, recorder: Recorder, client: httpx.AsyncClient, rng: random.Random):
+        self.manifest = manifest
+        self.recorder = recorder
+        self.client = client
+        self.rng = rng
+        self.username = f'{manifest["prefix"]}-user-{manifest["suppliers"] + index % (manifest["users"] - manifest["suppliers"])}'
+        self.access_token: str | None = None
+        self.refresh_token: str | None = None
+
+    def product_index(self) -> int:
+        # Популярные товары запрашиваются чаще
+        return min(self.manifest['products'] - 1, int(self.rng.paretovariate(1.2)) - 1) \
+            if self.rng.random() < 0.5 else self.rng.randrange(self.manifest['products'])
+
+    async def login(self) -> None:
+        response = await self.recorder.request(self.client, 'POST /auth/token', 'POST', '/auth/token',
+                                               data={'username': self.username, 'password': self.manifest['password']})
+        if response is not None and response.status_code == 200:
+            tokens = response.json()
+            self.access_token, self.refresh_token = tokens['access_token'], tokens.get('refresh_token')
+
+    async def browse(self) -> None:
+        await self.recorder.request(self.client, 'GET /category/', 'GET', '/category/')
+        slug = self.rng.choice(self.manifest['category_slugs'])
+        await self.recorder.request(self.client, 'GET /products/{category_slug}', 'GET', f'/products/{slug}')
+        await self.recorder.request(self.client, 'GET /comments/', 'GET', '/comments/', params={'limit': 20})
+
+    async def detail(self) -> None:
+        index = self.product_index()
+        await self.recorder.request(self.client, 'GET /products/detail/{product_slug}', 'GET',
+                                    f'/products/detail/{self.manifest["prefix"]}-p{index}')
+        product_id = self.manifest['product_id_range'][0] + index
+        response = await self.recorder.request(self.client, 'GET /comments/detail/{product_id}', 'GET',
+                                               f'/comments/detail/{product_id}', params={'limit': 20})
+        if response is not None and response.status_code == 200 and response.json().get('next_cursor'):
+            await self.recorder.request(self.client, 'GET /comments/detail/{product_id} (page 2)', 'GET',
+                                        f'/comments/detail/{product_id}',
+                                        params={'limit': 20, 'cursor': response.json()['next_cursor']})
+
+    async def login_flow(self) -> None:
+        await self.login()
+        if self.refresh_token:
+            response = await self.recorder.request(self.client, 'POST /auth/refresh', 'POST', '/auth/refresh',
+                                                   json={'refresh_token': self.refresh_token})
+            if response is not None and response.status_code == 200:
+                self.access_token = response.json()['access_token']
+                self.refresh_token = response.json()['refresh_token']
+
+    async def comment(self) -> None:
+        if self.access_token is None:
+            await self.login()
+            if self.access_token is None:
+                return
+        product_id = self.manifest['product_id_range'][0] + self.product_index()
+        response = await self.recorder.request(self.client, 'POST /comments/', 'POST', '/comments/',
+                                               headers={'Authorization': f'Bearer {self.access_token}'},
+                                               json={'comment': 'load test', 'grade': self.rng.randint(0, 5),
+                                                     'product_id': product_id})
+        if response is not None and response.status_code == 401:
+            self.access_token = None
+
+    async def catalog(self) -> None:
+        await self.recorder.request(self.client, 'GET /products/', 'GET', '/products/')
+
+
+async def run_user(user: VirtualUser, scenarios: dict[str, int], deadline: float, think_ms: float) -> None:
+    names = [name for name, weight in scenarios.items() if weight > 0]
+    weights = [scenarios[name] for name in names]
+    actions = {'browse': user.browse, 'detail': user.detail, 'login': user.login_flow,
+               'comment': user.comment, 'catalog': user.catalog}
+    while time.perf_counter() < deadline:
+        await actions[user.rng.choices(names, weights)[0]]()
+        if think_ms:
+            await asyncio.sleep(user.rng.expovariate(1000 / think_ms))
+
+
+def report(recorder: Recorder, seconds: float) -> list[dict]:
+    rows = []
+    for label in sorted(recorder.latencies):
+        latencies = recorder.latencies[label]
+        statuses = recorder.statuses[label]
+        rows.append({
+            'endpoint': label,
+            'requests': len(latencies),
+            'rps': round(len(latencies) / seconds, 1),
+            'p50_ms': round(percentile(latencies, 0.50), 1),
+            'p95_ms': round(percentile(latencies, 0.95), 1),
+            'p99_ms': round(percentile(latencies, 0.99), 1),
+            'max_ms': round(max(latencies), 1),
+            'throttled': statuses.get(429, 0),
+            'errors': sum(count for status, count in statuses.items() if status >= 500 or status == 0),
+            'statuses': dict(statuses),
+        })
+    header = f'{"endpoint":<48}{"req":>8}{"rps":>9}{"p50":>9}{"p95":>9}{"p99":>9}{"max":>9}{"429":>7}{"err":>6}'
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(f'{row["endpoint"]:<48}{row["requests"]:>8}{row["rps"]:>9}{row["p50_ms"]:>9}{row["p95_ms"]:>9}'
+              f'{row["p99_ms"]:>9}{row["max_ms"]:>9}{row["throttled"]:>7}{row["errors"]:>6}')
+    total = sum(row['requests'] for row in rows)
+    print(f'total: {total} requests in {seconds:.1f}s, {total / seconds:.1f} rps')
+    return rows
+
+
+async def main(args) -> None:
+    with open(args.manifest) as file:
+        manifest = json.load(file)
+    scenarios = dict(DEFAULT_SCENARIOS)
+    for item in args.scenario:
+        name, weight = item.split('=')
+        if name not in scenarios:
+            raise SystemExit(f'unknown scenario {name}, expected one of {", ".join(scenarios)}')
+        scenarios[name] = int(weight)
+
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        users = [VirtualUser(i, manifest, recorder, client, random.Random(args.seed + i)) for i in range(args.users)]
+        # Прогрев не попадает в отчет: соединения, кэши, JIT планов
+        await asyncio.gather(*(run_user(user, scenarios, time.perf_counter() + args.warmup, args.think_ms)
+                               for user in users))
+        recorder.recording = True
+        started = time.perf_counter()
+        await asyncio.gather(*(run_user(user, scenarios, started + args.duration, args.think_ms) for user in users))
+        seconds = time.perf_counter() - started
+    rows = report(recorder, seconds)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({'seconds': seconds, 'users': args.users, 'scenarios': scenarios, 'endpoints': rows},
+                      file, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--manifest', default='loadtest_manifest.json')
+    parser.add_argument('--users', type=int, default=50, help='число виртуальных пользователей')
+    parser.add_argument('--duration', type=float, default=60)
+    parser.add_argument('--warmup', type=float, default=5)
+    parser.add_argument('--think-ms', type=float, default=0, help='средняя пауза между сценариями')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--scenario', action='append', default=[], help='name=weight')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='куда сохранить отчет в JSON')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,202 @@
+"""Генерация синтетического каталога для нагрузочных тестов.
+
+Запускается против настроенной в .env базы (с примененными миграциями):
+
+    python -m benchmarks.seed_catalog --products 1000000 --comments 10000000 --users 10000
+
+Категории строятся деревом (--roots x --fanout ^ --depth), товары раскладываются по листьям
+с перекосом (немногие категории и товары популярнее остальных), комментарии распределены
+по последним --months месяцам. Все записи помечаются префиксом lt-, --reset удаляет
+предыдущий прогон. В конце пишется манифест для benchmarks.load_run.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from passlib.context import CryptContext
+from sqlalchemy import text
+
+from app.backend.db import engine
+from app.services.comments_maintenance import add_months, partition_name
+
+
+PREFIX = 'lt'
+PASSWORD = 'loadtest-password'
+CHUNK_SIZE = 50_000
+# Доли оценок 0..5: отзывы в основном положительные
+GRADE_WEIGHTS = (2, 3, 5, 12, 30, 48)
+WORDS = ('fast', 'reliable', 'cheap', 'great', 'broken', 'quality', 'delivery', 'size', 'color', 'battery')
+
+
+def skewed_index(rng: random.Random, count: int, alpha: float = 1.2) -> int:
+    # Степенное распределение: малая доля индексов получает большую часть обращений
+    return min(count - 1, int(rng.paretovariate(alpha)) - 1) if rng.random() < 0.5 else rng.randrange(count)
+
+
+async def copy(raw, table: str, columns: list[str], records) -> None:
+    await raw.copy_records_to_table(table, records=records, columns=columns)
+
+
+async def reset(raw) -> None:
+    like = f'{PREFIX}-%'
+    await raw.execute('DELETE FROM product_grade_histograms WHERE product_id IN '
+                      '(SELECT id FROM products WHERE slug LIKE $1)', like)
+    await raw.execute('DELETE FROM comments WHERE product_id IN (SELECT id FROM products WHERE slug LIKE $1)', like)
+    await raw.execute('DELETE FROM comments_archive WHERE product_id IN '
+                      '(SELECT id FROM products WHERE slug LIKE $1)', like)
+    await raw.execute('DELETE FROM order_items WHERE product_id IN (SELECT id FROM products WHERE slug LIKE $1)', like)
+    await raw.execute('DELETE FROM products WHERE slug LIKE $1', like)
+    # Сначала листья, потом родители
+    while await raw.fetchval('WITH deleted AS (DELETE FROM categories c WHERE slug LIKE $1 AND NOT EXISTS '
+                             '(SELECT 1 FROM categories child WHERE child.parent_id = c.id) RETURNING 1) '
+                             'SELECT count(*) FROM deleted', like):
+        pass
+    await raw.execute('DELETE FROM users WHERE username LIKE $1', like)
+
+
+async def seed_users(raw, count: int, suppliers: int) -> tuple[list[int], list[int]]:
+    # Один bcrypt-хэш на всех: пароль общий, а хэшировать 10k раз долго
+    hashed = CryptContext(schemes=['bcrypt']).hash(PASSWORD)
+    records = [(f'User{i}', 'Loadtest', f'{PREFIX}-user-{i}', f'{PREFIX}-user-{i}@example.com', hashed,
+                'is_supplier' if i < suppliers else 'is_customer', True)
+               for i in range(count)]
+    await copy(raw, 'users', ['first_name', 'last_name', 'username', 'email', 'hashed_password',
+                              'user_role', 'is_active'], records)
+    rows = await raw.fetch('SELECT id, user_role::text AS role FROM users WHERE username LIKE $1 ORDER BY id',
+                           f'{PREFIX}-user-%')
+    return [row['id'] for row in rows if row['role'] == 'is_supplier'], [row['id'] for row in rows]
+
+
+async def seed_categories(raw, roots: int, fanout: int, depth: int) -> tuple[list[int], list[str]]:
+    level = [(f'Root {i}', f'{PREFIX}-c{i}', None) for i in range(roots)]
+    leaves, slugs = [], []
+    for current_depth in range(depth + 1):
+        ids = await raw.fetch('INSERT INTO categories (name, slug, parent_id, is_active) '
+                              'SELECT name, slug, parent_id, true FROM unnest($1::text[], $2::text[], $3::int[]) '
+                              'AS t(name, slug, parent_id) RETURNING id, slug',
+                              [c[0] for c in level], [c[1] for c in level], [c[2] for c in level])
+        slugs.extend(row['slug'] for row in ids)
+        if current_depth == depth:
+            leaves = [row['id'] for row in ids]
+            break
+        level = [(f'Category {row["slug"]}-{j}', f'{row["slug"]}-{j}', row['id'])
+                 for row in ids for j in range(fanout)]
+    return leaves, slugs
+
+
+async def seed_products(raw, rng: random.Random, count: int, leaves: list[int], suppliers: list[int]) -> tuple[int, int]:
+    columns = ['name', 'slug', 'description', 'price', 'image_url', 'stock', 'supplier_id',
+               'category_id', 'rating', 'is_active']
+    for start in range(0, count, CHUNK_SIZE):
+        records = []
+        for i in range(start, min(start + CHUNK_SIZE, count)):
+            records.append((f'Product {i}', f'{PREFIX}-p{i}',
+                            ' '.join(rng.choices(WORDS, k=12)),
+                            rng.randint(100, 100_000), f'https://cdn.example.com/{PREFIX}/{i}.jpg',
+                            rng.randint(0, 500) if rng.random() > 0.05 else 0,
+                            suppliers[skewed_index(rng, len(suppliers))] if suppliers else None,
+                            leaves[skewed_index(rng, len(leaves))], 0.0, True))
+        await copy(raw, 'products', columns, records)
+        print(f'  products: {min(start + CHUNK_SIZE, count)}/{count}')
+    row = await raw.fetchrow('SELECT min(id) AS first, max(id) AS last FROM products WHERE slug LIKE $1', f'{PREFIX}-p%')
+    return row['first'], row['last']
+
+
+async def ensure_partitions(raw, months: int) -> None:
+    # Секции под исторические месяцы: иначе старые комментарии уйдут в comments_default
+    today = datetime.now(timezone.utc).date()
+    current = date(today.year, today.month, 1)
+    for offset in range(-months, 1):
+        month = add_months(current, offset)
+        name = partition_name(month)
+        if await raw.fetchval('SELECT to_regclass($1) IS NOT NULL', name):
+            continue
+        await raw.execute(f"CREATE TABLE {name} PARTITION OF comments "
+                          f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')")
+
+
+async def seed_comments(raw, rng: random.Random, count: int, product_range: tuple[int, int],
+                        users: list[int], months: int) -> None:
+    first, last = product_range
+    products = last - first + 1
+    now = datetime.now(timezone.utc)
+    window = timedelta(days=30 * months).total_seconds()
+    columns = ['user_id', 'product_id', 'comment', 'comment_dt', 'grade', 'is_active']
+    for start in range(0, count, CHUNK_SIZE * 2):
+        records = [(users[rng.randrange(len(users))], first + skewed_index(rng, products),
+                    ' '.join(rng.choices(WORDS, k=8)), now - timedelta(seconds=rng.random() * window),
+                    rng.choices(range(6), GRADE_WEIGHTS)[0], rng.random() > 0.02)
+                   for _ in range(min(CHUNK_SIZE * 2, count - start))]
+        await copy(raw, 'comments', columns, records)
+        print(f'  comments: {min(start + CHUNK_SIZE * 2, count)}/{count}')
+
+
+async def rebuild_histograms(raw, product_range: tuple[int, int]) -> None:
+    grades = ', '.join(f'count(*) FILTER (WHERE grade = {grade})' for grade in range(6))
+    columns = ', '.join(f'grade_{grade}' for grade in range(6))
+    updates = ', '.join(f'grade_{grade} = excluded.grade_{grade}' for grade in range(6))
+    await raw.execute(f'INSERT INTO product_grade_histograms (product_id, {columns}) '
+                      f'SELECT product_id, {grades} FROM comments '
+                      f'WHERE product_id BETWEEN $1 AND $2 AND is_active GROUP BY product_id '
+                      f'ON CONFLICT (product_id) DO UPDATE SET {updates}', *product_range)
+    weighted = ' + '.join(f'{grade} * h.grade_{grade}' for grade in range(6))
+    total = ' + '.join(f'h.grade_{grade}' for grade in range(6))
+    await raw.execute(f'UPDATE products p SET rating = ({weighted})::float / nullif({total}, 0) '
+                      f'FROM product_grade_histograms h WHERE h.product_id = p.id AND p.id BETWEEN $1 AND $2',
+                      *product_range)
+
+
+async def main(args) -> None:
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    async with engine.connect() as connection:
+        raw = (await connection.get_raw_connection()).driver_connection
+        if args.reset:
+            print('reset previous run')
+            await reset(raw)
+        print('users')
+        suppliers, users = await seed_users(raw, args.users, args.suppliers)
+        print('categories')
+        leaves, category_slugs = await seed_categories(raw, args.roots, args.fanout, args.depth)
+        print('products')
+        product_range = await seed_products(raw, rng, args.products, leaves, suppliers)
+        print('comments')
+        await ensure_partitions(raw, args.months)
+        await seed_comments(raw, rng, args.comments, product_range, users, args.months)
+        print('histograms and ratings')
+        await rebuild_histograms(raw, product_range)
+        for table in ('users', 'categories', 'products', 'comments', 'product_grade_histograms'):
+            await raw.execute(f'ANALYZE {table}')
+    await engine.dispose()
+
+    manifest = {
+        'prefix': PREFIX,
+        'password': PASSWORD,
+        'users': args.users,
+        'suppliers': args.suppliers,
+        'category_slugs': category_slugs,
+        'products': args.products,
+        'product_id_range': list(product_range),
+    }
+    with open(args.manifest, 'w') as file:
+        json.dump(manifest, file)
+    print(f'done in {time.perf_counter() - started:.1f}s, manifest: {args.manifest}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--roots', type=int, default=10)
+    parser.add_argument('--fanout', type=int, default=4)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--products', type=int, default=1_000_000)
+    parser.add_argument('--comments', type=int, default=10_000_000)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--suppliers', type=int, default=200)
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true')
+    parser.add_argument('--manifest', default='loadtest_manifest.json')
+    asyncio.run(main(parser.parse_args()))
@@ -13,6 +13,72 @@ class Settings(BaseSettings):
     smtp_user: str
     smtp_password: str
     rabbitmq_url: str
+    order_reservation_minutes: int = 15
+    reservation_sweep_seconds: int = 30
+    comment_maintenance_seconds: int = 3600
+    cascade_batch_size: int = 500
+    access_token_minutes: int = 20
+    refresh_token_days: int = 30
+    revocation_sync_seconds: int = 5
+    revocation_bloom_capacity: int = 100000
+    # memory — корзины в памяти воркера, postgres — общие в таблице rate_limit_buckets
+    rate_limit_backend: str = 'memory'
+    login_ip_rate_per_minute: float = 30
+    login_ip_burst: int = 20
+    login_user_rate_per_minute: float = 5
+    login_user_burst: int = 5
+    trusted_proxy_hops: int = 1
+    bcrypt_max_concurrency: int = 4
+    log_file: str = 'info.log'
+    # Доля успешных запросов, попадающих в лог; ошибки и медленные пишутся всегда
+    log_sample_rate: float = 0.05
+    log_slow_ms: float = 500
+    log_max_bytes: int = 50 * 1024 * 1024
+    log_backup_count: int = 5
+    log_queue_size: int = 10000
+    # Снапшот каталога общий для воркеров хоста; пустой путь отключает его
+    catalog_snapshot_path: str = 'catalog.snapshot'
+    catalog_snapshot_seconds: int = 60
+    catalog_snapshot_check_seconds: int = 5
+    scheduler_election_seconds: int = 10
+    rating_recompute_cron: str = '30 3 * * *'
+    product_events_exchange: str = 'products'
+    product_events_relay_seconds: float = 1
+    # SSE: буфер событий на клиента (переполнение — отключение), лимит клиентов на воркер
+    sse_client_queue_size: int = 64
+    sse_max_clients: int = 1000
+    sse_keepalive_seconds: int = 15
+    ranking_size: int = 20
+    # Товары с меньшим числом оценок в топы не попадают
+    ranking_min_reviews: int = 3
+    ranking_refresh_seconds: int = 600
+    recommendations_cron: str = '0 4 * * *'
+    recommendations_top_k: int = 20
+    # Сколько товаров в одном блоке матрицы сходства: память задачи ~ блок × все товары
+    recommendations_chunk_size: int = 2000
+    recommendations_shrink: float = 5
+    # Загруженные изображения: каталог на диске (его же раздает nginx) и URL-префикс
+    media_root: str = 'media'
+    media_url: str = '/media'
+    image_max_bytes: int = 10 * 1024 * 1024
+    image_max_pixels: int = 40_000_000
+    image_process_workers: int = 2
+    # Сколько изображений воркер обрабатывает одновременно; лишние получают 429
+    image_max_pending: int = 8
+    # Прогрев воркера на старте: сколько соединений пула открыть заранее, предел на шаг
+    warmup_db_connections: int = 5
+    warmup_timeout_seconds: float = 10
+    # Недоступная БД: ожидание соединения из пула и подключения, после скольких отказов
+    # подряд цепь размыкается и через сколько секунд пробуем снова
+    db_pool_timeout_seconds: float = 10
+    db_connect_timeout_seconds: float = 5
+    db_breaker_failures: int = 5
+    db_breaker_reset_seconds: float = 10
+    # Пробный запрос дольше этого считается отказом
+    db_breaker_probe_seconds: float = 5
+    # Последние удачные ответы каталога и категорий, которые отдаются при недоступной БД
+    stale_cache_entries: int = 1024
+    stale_cache_bytes: int = 64 * 1024 * 1024
     
     class Config:
         env_file = '.env'
@@ -24,9 +90,44 @@ settings = Settings()
 POSTGRES_DB = settings.postgres_db
 POSTGRES_USER = settings.postgres_user
 POSTGRES_PASSWORD = settings.postgres_password
+DB_POOL_TIMEOUT_SECONDS = settings.db_pool_timeout_seconds
+DB_CONNECT_TIMEOUT_SECONDS = settings.db_connect_timeout_seconds
+DB_BREAKER_FAILURES = settings.db_breaker_failures
+DB_BREAKER_RESET_SECONDS = settings.db_breaker_reset_seconds
+DB_BREAKER_PROBE_SECONDS = settings.db_breaker_probe_seconds
+STALE_CACHE_ENTRIES = settings.stale_cache_entries
+STALE_CACHE_BYTES = settings.stale_cache_bytes
 # JWT
 SECRET_KEY = settings.secret_key
 ALGORITHM = settings.algorithm
+ACCESS_TOKEN_MINUTES = settings.access_token_minutes
+REFRESH_TOKEN_DAYS = settings.refresh_token_days
+REVOCATION_SYNC_SECONDS = settings.revocation_sync_seconds
+REVOCATION_BLOOM_CAPACITY = settings.revocation_bloom_capacity
+# Login rate limiting
+RATE_LIMIT_BACKEND = settings.rate_limit_backend
+LOGIN_IP_RATE_PER_MINUTE = settings.login_ip_rate_per_minute
+LOGIN_IP_BURST = settings.login_ip_burst
+LOGIN_USER_RATE_PER_MINUTE = settings.login_user_rate_per_minute
+LOGIN_USER_BURST = settings.login_user_burst
+TRUSTED_PROXY_HOPS = settings.trusted_proxy_hops
+BCRYPT_MAX_CONCURRENCY = settings.bcrypt_max_concurrency
+# Logging
+LOG_FILE = settings.log_file
+LOG_SAMPLE_RATE = settings.log_sample_rate
+LOG_SLOW_MS = settings.log_slow_ms
+LOG_MAX_BYTES = settings.log_max_bytes
+LOG_BACKUP_COUNT = settings.log_backup_count
+LOG_QUEUE_SIZE = settings.log_queue_size
+# Catalog snapshot
+CATALOG_SNAPSHOT_PATH = settings.catalog_snapshot_path
+CATALOG_SNAPSHOT_SECONDS = settings.catalog_snapshot_seconds
+CATALOG_SNAPSHOT_CHECK_SECONDS = settings.catalog_snapshot_check_seconds
+# Scheduler
+SCHEDULER_ELECTION_SECONDS = settings.scheduler_election_seconds
+# Startup
+WARMUP_DB_CONNECTIONS = settings.warmup_db_connections
+WARMUP_TIMEOUT_SECONDS = settings.warmup_timeout_seconds
 # Email
 EMAIL_FROM = settings.email_from
 SMTP_HOST = settings.smtp_host
@@ -35,3 +136,33 @@ SMTP_USER = settings.smtp_user
 SMTP_PASSWORD = settings.smtp_password
 # RabbitMQ
 RABBITMQ_URL = settings.rabbitmq_url
+PRODUCT_EVENTS_EXCHANGE = settings.product_events_exchange
+PRODUCT_EVENTS_RELAY_SECONDS = settings.product_events_relay_seconds
+# Product stream (SSE)
+SSE_CLIENT_QUEUE_SIZE = settings.sse_client_queue_size
+SSE_MAX_CLIENTS = settings.sse_max_clients
+SSE_KEEPALIVE_SECONDS = settings.sse_keepalive_seconds
+# Rankings
+RANKING_SIZE = settings.ranking_size
+RANKING_MIN_REVIEWS = settings.ranking_min_reviews
+RANKING_REFRESH_SECONDS = settings.ranking_refresh_seconds
+# Recommendations
+RECOMMENDATIONS_CRON = settings.recommendations_cron
+RECOMMENDATIONS_TOP_K = settings.recommendations_top_k
+RECOMMENDATIONS_CHUNK_SIZE = settings.recommendations_chunk_size
+RECOMMENDATIONS_SHRINK = settings.recommendations_shrink
+# Media
+MEDIA_ROOT = settings.media_root
+MEDIA_URL = settings.media_url
+IMAGE_MAX_BYTES = settings.image_max_bytes
+IMAGE_MAX_PIXELS = settings.image_max_pixels
+IMAGE_PROCESS_WORKERS = settings.image_process_workers
+IMAGE_MAX_PENDING = settings.image_max_pending
+# Orders
+ORDER_RESERVATION_MINUTES = settings.order_reservation_minutes
+RESERVATION_SWEEP_SECONDS = settings.reservation_sweep_seconds
+# Comments
+COMMENT_MAINTENANCE_SECONDS = settings.comment_maintenance_seconds
+RATING_RECOMPUTE_CRON = settings.rating_recompute_cron
+# Cascade jobs
+CASCADE_BATCH_SIZE = settings.cascade_batch_size
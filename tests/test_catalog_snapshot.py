@@ -0,0 +1,33 @@
+import json
+from array import array
+
+from app.services.catalog_snapshot import COLUMNS, CatalogSnapshot, append_rows, assemble
+
+
+def build_snapshot(path, products: list[dict]) -> CatalogSnapshot:
+    columns = {name: array(typecode) for name, typecode in COLUMNS}
+    offsets = array('Q', [0])
+    rows_path = f'{path}.rows.tmp'
+    with open(rows_path, 'wb') as rows_file:
+        append_rows(products, columns, offsets, rows_file)
+    categories = [{'id': 1, 'slug': 'phones', 'parent_id': None}, {'id': 2, 'slug': 'cases', 'parent_id': 1},
+                  {'id': 3, 'slug': 'laptops', 'parent_id': None}]
+    assemble(str(path), categories, columns, offsets, rows_path)
+    return CatalogSnapshot(str(path))
+
+
+def test_filtered_listing_matches_columns(tmp_path):
+    products = [{'id': index, 'name': f'Product {index}', 'slug': f'product-{index}', 'description': '',
+                 'price': index * 10 % 170, 'image_url': '', 'stock': 1, 'category_id': index % 3 + 1,
+                 'rating': index % 5 + 0.5} for index in range(1, 61)]
+    products.sort(key=lambda product: (product['category_id'], product['id']))
+    snapshot = build_snapshot(tmp_path / 'catalog.snapshot', products)
+
+    listing = json.loads(snapshot.listing('phones', min_price=30, max_price=120, min_rating=2).body)
+    assert [product['slug'] for product in listing] == [
+        product['slug'] for product in products
+        if product['category_id'] in (1, 2) and 30 <= product['price'] <= 120 and product['rating'] >= 2]
+
+    listing = json.loads(snapshot.listing(None, min_price=0).body)
+    assert [product['slug'] for product in listing] == [product['slug'] for product in products]
+    assert json.loads(snapshot.listing('laptops', min_rating=10).body) == []
@@ -0,0 +1,39 @@
+import asyncio
+
+from app.backend.compression import CachedBody, CompressionMiddleware, CompressionRule
+from app.backend.stale_cache import StaleCacheMiddleware
+
+
+async def noop_app(scope, receive, send):
+    pass
+
+
+def test_compression_cache_tracks_size_of_added_variants():
+    middleware = CompressionMiddleware(noop_app, cache_entries=2, cache_bytes=10 ** 9)
+    first = middleware.cached_body(b'a' * 4096)
+    asyncio.run(first.encode('gzip', CompressionRule()))
+    second = middleware.cached_body(b'b' * 4096)
+    assert middleware.cached_size == first.size + second.size
+
+    middleware.cached_body(b'c' * 4096)
+    middleware.evict()
+    assert list(middleware.cache.values())[0] is second
+    assert middleware.cached_size == sum(entry.size for entry in middleware.cache.values())
+    # Вытесненная запись больше не меняет размер кэша
+    asyncio.run(first.encode('gzip', CompressionRule(gzip_level=9)))
+    assert middleware.cached_size == sum(entry.size for entry in middleware.cache.values())
+
+
+def test_stale_cache_tracks_size_of_shared_entries():
+    middleware = StaleCacheMiddleware(noop_app, prefixes=('/products',), max_bytes=10_000)
+    entry = CachedBody(b'x' * 3000)
+    middleware.store('/products?', entry)
+    middleware.store('/products?', entry)
+    middleware.store('/products?page=2', CachedBody(b'y' * 3000))
+    asyncio.run(entry.encode('gzip', CompressionRule()))
+    assert middleware.cached_size == sum(cached.size for cached, _ in middleware.cache.values())
+
+    middleware.store('/products?page=3', CachedBody(b'z' * 5000))
+    assert '/products?' not in middleware.cache
+    assert middleware.cached_size == sum(cached.size for cached, _ in middleware.cache.values()) <= 10_000
+    assert entry.listeners == []
@@ -0,0 +1,73 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import text
+
+from app.backend.db import engine
+from app.services.recommendations import save_recommendations
+
+
+# Нужна база с примененными миграциями (параметры подключения — из .env); без нее тест пропускается
+
+
+async def database_ready() -> bool:
+    try:
+        async with engine.connect() as connection:
+            await connection.execute(text('SELECT 1 FROM product_recommendations LIMIT 1'))
+        return True
+    except Exception:
+        return False
+
+
+async def create_products(count: int) -> list[int]:
+    async with engine.begin() as connection:
+        rows = await connection.execute(text(
+            "INSERT INTO products (name, slug, description, price, image_url, stock, rating, is_active) "
+            "SELECT 'Test product', :prefix || '-' || i, 'test', 100, '', 1, 0, true "
+            "FROM generate_series(1, :count) i RETURNING id"),
+            {'prefix': f'test-recommendations-{uuid4().hex[:12]}', 'count': count})
+        return list(rows.scalars().all())
+
+
+async def drop_products(product_ids: list[int]) -> None:
+    async with engine.begin() as connection:
+        await connection.execute(text('DELETE FROM products WHERE id = ANY(:ids)'), {'ids': product_ids})
+        await connection.execute(text('DELETE FROM product_events WHERE product_id = ANY(:ids)'),
+                                 {'ids': product_ids})
+
+
+async def fetch_recommendations(product_ids: list[int]) -> dict[int, tuple[list[int], list[float]]]:
+    async with engine.connect() as connection:
+        rows = await connection.execute(text('SELECT product_id, related_ids, scores FROM product_recommendations '
+                                             'WHERE product_id = ANY(:ids)'), {'ids': product_ids})
+        return {row.product_id: (row.related_ids, row.scores) for row in rows}
+
+
+async def check_save_recommendations() -> None:
+    first, second, third = await create_products(3)
+    try:
+        await save_recommendations([(first, [second, third], [0.9, 0.5]), (second, [first], [0.9])])
+        assert await fetch_recommendations([first, second, third]) == {
+            first: ([second, third], [0.9, 0.5]),
+            second: ([first], [0.9]),
+        }
+        # Повторный расчет заменяет списки и удаляет рекомендации товаров, выпавших из него
+        await save_recommendations([(first, [third], [0.7])])
+        assert await fetch_recommendations([first, second, third]) == {first: ([third], [0.7])}
+    finally:
+        await drop_products([first, second, third])
+
+
+def test_save_recommendations():
+    async def run():
+        try:
+            if not await database_ready():
+                return False
+            await check_save_recommendations()
+            return True
+        finally:
+            await engine.dispose()
+
+    if not asyncio.run(run()):
+        pytest.skip('database is not available')
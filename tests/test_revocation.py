@@ -0,0 +1,35 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from app.backend.revocation import TokenRevocations
+from app.models.user import UserRole
+from app.routers.auth import create_access_token, get_current_user, token_revocations
+
+
+def test_revocation_compares_sub_second_issue_time():
+    revocations = TokenRevocations(capacity=100)
+    valid_after = datetime(2026, 1, 1, 12, 0, 0, 500_000, tzinfo=timezone.utc)
+    revocations.revoke_user(1, valid_after)
+    assert revocations.is_revoked(1, valid_after.timestamp() - 0.2, None)
+    assert not revocations.is_revoked(1, valid_after.timestamp() + 0.2, None)
+    assert not revocations.is_revoked(2, valid_after.timestamp() - 0.2, None)
+
+
+def test_login_right_after_revocation():
+    # Смена роли (now() из БД с микросекундами) и сразу повторный вход в ту же секунду
+    token_revocations.revoke_user(42, datetime.now(timezone.utc) - timedelta(milliseconds=5))
+    token = asyncio.run(create_access_token('customer', 42, UserRole.IS_CUSTOMER, timedelta(minutes=5)))
+    user = asyncio.run(get_current_user(token))
+    assert user.id == 42
+
+
+def test_token_issued_before_revocation_in_same_second_is_rejected():
+    token = asyncio.run(create_access_token('admin', 43, UserRole.IS_ADMIN, timedelta(minutes=5)))
+    # Понижение роли через несколько миллисекунд — обычно в ту же секунду, что и выпуск
+    token_revocations.revoke_user(43, datetime.now(timezone.utc) + timedelta(milliseconds=5))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(get_current_user(token))
+    assert error.value.detail == 'Token revoked'